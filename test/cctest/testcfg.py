@@ -52,15 +52,20 @@ class CcTestSuite(testsuite.TestSuite):
     shell = os.path.abspath(os.path.join(context.shell_dir, self.shell()))
     if utils.IsWindows():
       shell += ".exe"
-    output = commands.Execute(context.command_prefix +
-                              [shell, "--list"] +
-                              context.extra_flags)
-    if output.exit_code != 0:
-      print output.stdout
-      print output.stderr
+    command = context.command_prefix + [shell, "--list"] + context.extra_flags
+    def ListTestDescs():
+      output = commands.Execute(command)
+      if output.exit_code != 0:
+        print output.stdout
+        print output.stderr
+        return None
+      return output.stdout.strip().split()
+    # The list only changes with the cctest binary.
+    test_descs = self.GetCachedListing(command, [shell], ListTestDescs)
+    if test_descs is None:
       return []
     tests = []
-    for test_desc in output.stdout.strip().split():
+    for test_desc in test_descs:
       if test_desc.find('<') < 0:
         # Native Client output can contain a few non-test arguments
         # before the tests. Skip these.
@@ -76,8 +81,13 @@ class CcTestSuite(testsuite.TestSuite):
     return tests
 
   def GetFlagsForTestCase(self, testcase, context):
-    testname = testcase.path.split(os.path.sep)[-1]
-    serialization_file = os.path.join(self.serdes_dir, "serdes_" + testname)
+    # Dependent tests share the serialization file of their dependency, which
+    # only runs once for all of them. Configurations run together get their
+    # own files.
+    testname = (testcase.dependency or testcase.path).split(os.path.sep)[-1]
+    serialization_file = os.path.join(
+        self.serdes_dir,
+        "serdes_%s_%s_%s" % (context.arch, context.mode, testname))
     serialization_file += ''.join(testcase.flags).replace('-', '_')
     return (testcase.flags + [testcase.path] + context.mode_flags +
             ["--testing_serialization_file=" + serialization_file])
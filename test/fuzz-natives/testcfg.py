@@ -18,19 +18,21 @@ class FuzzNativesTestSuite(testsuite.TestSuite):
     shell = os.path.abspath(os.path.join(context.shell_dir, self.shell()))
     if utils.IsWindows():
       shell += ".exe"
-    output = commands.Execute(
-        context.command_prefix +
-        [shell, "--allow-natives-syntax", "-e",
-         "try { var natives = %ListNatives();"
-         "  for (var n in natives) { print(natives[n]); }"
-         "} catch(e) {}"] +
-        context.extra_flags)
-    if output.exit_code != 0:
-      print output.stdout
-      print output.stderr
-      assert False, "Failed to get natives list."
+    command = (context.command_prefix +
+               [shell, "--allow-natives-syntax", "-e",
+                "try { var natives = %ListNatives();"
+                "  for (var n in natives) { print(natives[n]); }"
+                "} catch(e) {}"] +
+               context.extra_flags)
+    def ListNatives():
+      output = commands.Execute(command)
+      if output.exit_code != 0:
+        print output.stdout
+        print output.stderr
+        assert False, "Failed to get natives list."
+      return output.stdout.strip().split()
     tests = []
-    for line in output.stdout.strip().split():
+    for line in self.GetCachedListing(command, [shell], ListNatives):
       (name, argc) = line.split(",")
       flags = ["--allow-natives-syntax",
                "-e", "var NAME = '%s', ARGC = %s;" % (name, argc)]
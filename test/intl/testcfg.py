@@ -38,7 +38,7 @@ class IntlTestSuite(testsuite.TestSuite):
 
   def ListTests(self, context):
     tests = []
-    for dirname, dirs, files in os.walk(self.root):
+    for dirname, dirs, files in self.Walk(self.root):
       for dotted in [x for x in dirs if x.startswith('.')]:
         dirs.remove(dotted)
       dirs.sort()
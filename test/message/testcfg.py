@@ -25,16 +25,14 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-import itertools
 import os
-import re
 
+from testrunner.local import expectation
 from testrunner.local import testsuite
 from testrunner.local import utils
 from testrunner.objects import testcase
 
 
-FLAGS_PATTERN = re.compile(r"//\s+Flags:(.*)")
 INVALID_FLAGS = ["--enable-slow-asserts"]
 
 
@@ -44,7 +42,7 @@ class MessageTestSuite(testsuite.TestSuite):
 
   def ListTests(self, context):
     tests = []
-    for dirname, dirs, files in os.walk(self.root):
+    for dirname, dirs, files in self.Walk(self.root):
       for dotted in [x for x in dirs if x.startswith('.')]:
         dirs.remove(dotted)
       dirs.sort()
@@ -57,12 +55,7 @@ class MessageTestSuite(testsuite.TestSuite):
     return tests
 
   def GetFlagsForTestCase(self, testcase, context):
-    source = self.GetSourceForTest(testcase)
-    result = []
-    flags_match = re.findall(FLAGS_PATTERN, source)
-    for match in flags_match:
-      result += match.strip().split()
-    result += context.mode_flags
+    result = self.GetSourceMetadata(testcase).flags + context.mode_flags
     result = [x for x in result if x not in INVALID_FLAGS]
     result.append(os.path.join(self.root, testcase.path + ".js"))
     return testcase.flags + result
@@ -72,39 +65,26 @@ class MessageTestSuite(testsuite.TestSuite):
     with open(filename) as f:
       return f.read()
 
-  def _IgnoreLine(self, string):
-    """Ignore empty lines, valgrind output, Android output."""
-    if not string: return True
-    return (string.startswith("==") or string.startswith("**") or
-            string.startswith("ANDROID") or
-            # These five patterns appear in normal Native Client output.
-            string.startswith("DEBUG MODE ENABLED") or
-            string.startswith("tools/nacl-run.py") or
-            string.find("BYPASSING ALL ACL CHECKS") > 0 or
-            string.find("Native Client module will be loaded") > 0 or
-            string.find("NaClHostDescOpen:") > 0)
+  def GetInputFilesForTestCase(self, testcase):
+    return [os.path.join(self.root, testcase.path + ".out")]
 
-  def IsFailureOutput(self, output, testpath):
-    expected_path = os.path.join(self.root, testpath + ".out")
+  def _ReadExpectation(self, path, testpath):
+    env = { "basename": os.path.basename(testpath + ".js") }
     expected_lines = []
     # Can't use utils.ReadLinesFrom() here because it strips whitespace.
-    with open(expected_path) as f:
+    with open(path) as f:
       for line in f:
         if line.startswith("#") or not line.strip(): continue
-        expected_lines.append(line)
-    raw_lines = output.stdout.splitlines()
-    actual_lines = [ s for s in raw_lines if not self._IgnoreLine(s) ]
-    env = { "basename": os.path.basename(testpath + ".js") }
-    if len(expected_lines) != len(actual_lines):
-      return True
-    for (expected, actual) in itertools.izip_longest(
-        expected_lines, actual_lines, fillvalue=''):
-      pattern = re.escape(expected.rstrip() % env)
-      pattern = pattern.replace("\\*", ".*")
-      pattern = "^%s$" % pattern
-      if not re.match(pattern, actual):
-        return True
-    return False
+        expected_lines.append(line.rstrip() % env)
+    return expectation.Expectation(expected_lines, wildcard="*")
+
+  def IsFailureOutput(self, output, testpath):
+    expected_path = os.path.join(self.root, testpath + ".out")
+    expected = expectation.GetExpectation(
+        expected_path, lambda path: self._ReadExpectation(path, testpath))
+    actual_lines = (s for s in output.stdout.splitlines()
+                    if not expectation.IgnoreLine(s))
+    return not expected.Matches(actual_lines)
 
   def StripOutputForTransmit(self, testcase):
     pass
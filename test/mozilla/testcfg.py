@@ -71,7 +71,7 @@ class MozillaTestSuite(testsuite.TestSuite):
     tests = []
     for testdir in TEST_DIRS:
       current_root = os.path.join(self.testroot, testdir)
-      for dirname, dirs, files in os.walk(current_root):
+      for dirname, dirs, files in self.Walk(current_root):
         for dotted in [x for x in dirs if x.startswith(".")]:
           dirs.remove(dotted)
         for excluded in EXCLUDED:
@@ -59,31 +59,40 @@ class PreparserTestSuite(testsuite.TestSuite):
 
   def _ParsePythonTestTemplates(self, result, filename):
     pathname = os.path.join(self.root, filename + ".pyt")
-    def Test(name, source, expectation):
-      source = source.replace("\n", " ")
-      testname = os.path.join(filename, name)
-      flags = ["-e", source]
-      if expectation:
-        flags += ["--throws"]
-      test = testcase.TestCase(self, testname, flags=flags)
+    def ListTemplateTests():
+      tests = []  # (name, flags) of the generated tests.
+      def Test(name, source, expectation):
+        source = source.replace("\n", " ")
+        testname = os.path.join(filename, name)
+        flags = ["-e", source]
+        if expectation:
+          flags += ["--throws"]
+        tests.append((testname, flags))
+      def Template(name, source):
+        def MkTest(replacement, expectation):
+          testname = name
+          testsource = source
+          for key in replacement.keys():
+            testname = testname.replace("$" + key, replacement[key]);
+            testsource = testsource.replace("$" + key, replacement[key]);
+          Test(testname, testsource, expectation)
+        return MkTest
+      execfile(pathname, {"Test": Test, "Template": Template})
+      return tests
+    # The generated tests only change with the template file.
+    for (testname, flags) in self.GetCachedListing(["pyt", filename],
+                                                   [pathname],
+                                                   ListTemplateTests):
+      test = testcase.TestCase(self, testname, flags=list(flags))
       result.append(test)
-    def Template(name, source):
-      def MkTest(replacement, expectation):
-        testname = name
-        testsource = source
-        for key in replacement.keys():
-          testname = testname.replace("$" + key, replacement[key]);
-          testsource = testsource.replace("$" + key, replacement[key]);
-        Test(testname, testsource, expectation)
-      return MkTest
-    execfile(pathname, {"Test": Test, "Template": Template})
 
   def ListTests(self, context):
     expectations = self._GetExpectations()
     result = []
+    (_, _, files) = next(iter(self.Walk(self.root)))
 
     # Find all .js files in this directory.
-    filenames = [f[:-3] for f in os.listdir(self.root) if f.endswith(".js")]
+    filenames = [f[:-3] for f in files if f.endswith(".js")]
     filenames.sort()
     for f in filenames:
       throws = expectations.get(f, None)
@@ -94,7 +103,7 @@ class PreparserTestSuite(testsuite.TestSuite):
       result.append(test)
 
     # Find all .pyt files in this directory.
-    filenames = [f[:-4] for f in os.listdir(self.root) if f.endswith(".pyt")]
+    filenames = [f[:-4] for f in files if f.endswith(".pyt")]
     filenames.sort()
     for f in filenames:
       self._ParsePythonTestTemplates(result, f)
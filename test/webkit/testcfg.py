@@ -25,17 +25,12 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-import itertools
 import os
-import re
 
+from testrunner.local import expectation
 from testrunner.local import testsuite
 from testrunner.objects import testcase
 
-FLAGS_PATTERN = re.compile(r"//\s+Flags:(.*)")
-FILES_PATTERN = re.compile(r"//\s+Files:(.*)")
-SELF_SCRIPT_PATTERN = re.compile(r"//\s+Env: TEST_FILE_NAME")
-
 
 # TODO (machenbach): Share commonalities with mjstest.
 class WebkitTestSuite(testsuite.TestSuite):
@@ -45,7 +40,7 @@ class WebkitTestSuite(testsuite.TestSuite):
 
   def ListTests(self, context):
     tests = []
-    for dirname, dirs, files in os.walk(self.root):
+    for dirname, dirs, files in self.Walk(self.root):
       for dotted in [x for x in dirs if x.startswith('.')]:
         dirs.remove(dotted)
       if 'resources' in dirs:
@@ -61,25 +56,13 @@ class WebkitTestSuite(testsuite.TestSuite):
     return tests
 
   def GetFlagsForTestCase(self, testcase, context):
-    source = self.GetSourceForTest(testcase)
-    flags = [] + context.mode_flags
-    flags_match = re.findall(FLAGS_PATTERN, source)
-    for match in flags_match:
-      flags += match.strip().split()
-
-    files_list = []  # List of file names to append to command arguments.
-    files_match = FILES_PATTERN.search(source);
-    # Accept several lines of 'Files:'.
-    while True:
-      if files_match:
-        files_list += files_match.group(1).strip().split()
-        files_match = FILES_PATTERN.search(source, files_match.end())
-      else:
-        break
+    metadata = self.GetSourceMetadata(testcase)
+    flags = context.mode_flags + metadata.flags
+
     files = [ os.path.normpath(os.path.join(self.root, '..', '..', f))
-              for f in files_list ]
+              for f in metadata.files ]
     testfilename = os.path.join(self.root, testcase.path + self.suffix())
-    if SELF_SCRIPT_PATTERN.search(source):
+    if metadata.self_script:
       env = ["-e", "TEST_FILE_NAME=\"%s\"" % testfilename.replace("\\", "\\\\")]
       files = env + files
     files.append(os.path.join(self.root, "resources/standalone-pre.js"))
@@ -98,62 +81,48 @@ class WebkitTestSuite(testsuite.TestSuite):
     with open(filename) as f:
       return f.read()
 
-  # TODO(machenbach): Share with test/message/testcfg.py
-  def _IgnoreLine(self, string):
-    """Ignore empty lines, valgrind output and Android output."""
-    if not string: return True
-    return (string.startswith("==") or string.startswith("**") or
-            string.startswith("ANDROID") or
-            # These five patterns appear in normal Native Client output.
-            string.startswith("DEBUG MODE ENABLED") or
-            string.startswith("tools/nacl-run.py") or
-            string.find("BYPASSING ALL ACL CHECKS") > 0 or
-            string.find("Native Client module will be loaded") > 0 or
-            string.find("NaClHostDescOpen:") > 0)
+  def GetInputFilesForTestCase(self, testcase):
+    return [os.path.join(self.root, testcase.path) + "-expected.txt"]
+
+  def _ReadExpectation(self, path):
+    expected_lines = []
+    with open(path) as f:
+      for line in f:
+        if line.startswith("#") or not line.strip(): continue
+        expected_lines.append(line.strip())
+    return expectation.Expectation(expected_lines)
+
+  def _FirstOutputBlock(self, output):
+    """Returns the lines of the first block of actual output, or None. With
+    stress test separators, that is the block after the first separator."""
+    lines = output.stdout.splitlines()
+    start_index = 0
+    found_eqeq = False
+    for index, line in enumerate(lines):
+      # If a stress test separator is found:
+      if line.startswith("=="):
+        if found_eqeq:
+          return lines[start_index:index]
+        found_eqeq = True
+        # The next block of ouput lines starts after the separator.
+        start_index = index + 1
+    # Use the complete output if no separator was found.
+    if not found_eqeq:
+      return lines
+    return None
 
   def IsFailureOutput(self, output, testpath):
     if super(WebkitTestSuite, self).IsFailureOutput(output, testpath):
       return True
-    file_name = os.path.join(self.root, testpath) + "-expected.txt"
-    with file(file_name, "r") as expected:
-      expected_lines = expected.readlines()
-
-    def ExpIterator():
-      for line in expected_lines:
-        if line.startswith("#") or not line.strip(): continue
-        yield line.strip()
-
-    def ActIterator(lines):
-      for line in lines:
-        if self._IgnoreLine(line.strip()): continue
-        yield line.strip()
-
-    def ActBlockIterator():
-      """Iterates over blocks of actual output lines."""
-      lines = output.stdout.splitlines()
-      start_index = 0
-      found_eqeq = False
-      for index, line in enumerate(lines):
-        # If a stress test separator is found:
-        if line.startswith("=="):
-          # Iterate over all lines before a separator except the first.
-          if not found_eqeq:
-            found_eqeq = True
-          else:
-            yield ActIterator(lines[start_index:index])
-          # The next block of ouput lines starts after the separator.
-          start_index = index + 1
-      # Iterate over complete output if no separator was found.
-      if not found_eqeq:
-        yield ActIterator(lines)
-
-    for act_iterator in ActBlockIterator():
-      for (expected, actual) in itertools.izip_longest(
-          ExpIterator(), act_iterator, fillvalue=''):
-        if expected != actual:
-          return True
+    lines = self._FirstOutputBlock(output)
+    if lines is None:
       return False
-
+    expected = expectation.GetExpectation(
+        os.path.join(self.root, testpath) + "-expected.txt",
+        self._ReadExpectation)
+    actual_lines = (line for line in (l.strip() for l in lines)
+                    if not expectation.IgnoreLine(line))
+    return not expected.Matches(actual_lines)
 
 def GetSuite(name, root):
   return WebkitTestSuite(name, root)
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Merges files written by run-tests.py --json-test-results into one file in
+the JSON format, e.g. to convert results streamed as JSON lines (*.jsonl)
+for tools that expect the JSON list.
+
+Usage: merge-test-results.py OUTPUT INPUT...
+"""
+
+import json
+import sys
+
+from testrunner.local import jsonlines
+
+
+def Main(args):
+  if len(args) < 2:
+    print __doc__
+    return 1
+  sections = []
+  for filename in args[1:]:
+    sections += jsonlines.LoadResults(filename)
+  with open(args[0], "w") as f:
+    f.write(json.dumps(sections))
+  print "Wrote %d sections to %s." % (len(sections), args[0])
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(Main(sys.argv[1:]))
@@ -40,9 +40,14 @@ import subprocess
 import sys
 import time
 
+from testrunner.local import commands
+from testrunner.local import discovery
 from testrunner.local import execution
+from testrunner.local import perfdata
 from testrunner.local import progress
+from testrunner.local import sharding
 from testrunner.local import testsuite
+from testrunner.local import tracing
 from testrunner.local import utils
 from testrunner.local import verbose
 from testrunner.objects import context
@@ -205,12 +210,23 @@ def BuildOptions():
   result.add_option("--shard-run",
                     help="Run this shard from the split up tests.",
                     default=1, type="int")
+  result.add_option("--shard-dry-run",
+                    help=("Print the predicted duration of each shard "
+                          "instead of running tests"),
+                    default=False, action="store_true")
+  result.add_option("--shard-perf-data",
+                    help=("Balance the shards by the test durations in the "
+                          "perf data in this directory. All shards have to "
+                          "use the same copy"))
   result.add_option("--shell-dir", help="Directory containing executables",
                     default="")
   result.add_option("--seed", help="The seed for the random distribution",
                     type="int")
   result.add_option("-t", "--timeout", help="Timeout in seconds",
                     default= -1, type="int")
+  result.add_option("--trace-file",
+                    help=("Path to a file for a timeline of the run in the "
+                          "trace event format of about:tracing"))
   result.add_option("-v", "--verbose", help="Verbose output",
                     default=False, action="store_true")
   result.add_option("--random-seed", default=0, dest="random_seed",
@@ -265,23 +281,41 @@ def ProcessOptions(options):
     print ("Coverage lift %s is out of range. Defaulting to 0"
         % options.coverage_lift)
     options.coverage_lift = 0
+  if options.shard_perf_data and not os.path.isdir(options.shard_perf_data):
+    print "--shard-perf-data must be a directory with perf data."
+    return False
+  # Records nothing without --trace-file.
+  options.tracer = tracing.TraceWriter(options.trace_file, "run-deopt-fuzzer")
   return True
 
 
-def ShardTests(tests, shard_count, shard_run):
-  if shard_count < 2:
-    return tests
-  if shard_run < 1 or shard_run > shard_count:
+def ShardTests(suites, options, arch, mode):
+  """Keeps only the tests of the current shard in |suites|. Each shard gets
+  every shard_count-th test of each suite. With --shard-perf-data, shards are
+  balanced by the durations in that perf data instead."""
+  if options.shard_count < 2 and not options.shard_dry_run:
+    return
+  if options.shard_run < 1 or options.shard_run > options.shard_count:
     print "shard-run not a valid number, should be in [1:shard-count]"
     print "defaulting back to running all tests"
-    return tests
-  count = 0
-  shard = []
-  for test in tests:
-    if count % shard_count == shard_run - 1:
-      shard.append(test)
-    count += 1
-  return shard
+    return
+  if options.shard_perf_data:
+    tests = [ t for s in suites for t in s.tests ]
+    perf_data_manager = perfdata.PerfDataManager(options.shard_perf_data)
+    try:
+      shards = sharding.DistributeTests(
+          tests, options.shard_count,
+          perf_data_manager.GetStore(arch, mode).FetchPerfData)
+    finally:
+      perf_data_manager.close()
+  else:
+    shards = sharding.SplitTests([ s.tests for s in suites ],
+                                 options.shard_count)
+  if options.shard_dry_run:
+    sharding.PrintShards(shards)
+  shard = set(id(t) for t in shards[options.shard_run - 1].tests)
+  for s in suites:
+    s.tests = [ t for t in s.tests if id(t) in shard ]
 
 
 def Main():
@@ -306,12 +340,14 @@ def Main():
         args_suites.add(suite)
     suite_paths = [ s for s in suite_paths if s in args_suites ]
 
+  index = discovery.DiscoveryIndex(execution.DATA_DIR)
   suites = []
-  for root in suite_paths:
-    suite = testsuite.TestSuite.LoadTestSuite(
-        os.path.join(workspace, "test", root))
-    if suite:
-      suites.append(suite)
+  with options.tracer.Phase("load suites"):
+    for root in suite_paths:
+      suite = testsuite.TestSuite.LoadTestSuite(
+          os.path.join(workspace, "test", root), index=index)
+      if suite:
+        suites.append(suite)
 
   if options.download_data:
     for s in suites:
@@ -324,6 +360,9 @@ def Main():
         exit_code = exit_code or code
       except KeyboardInterrupt:
         return 2
+  # Keep the source metadata parsed while running.
+  index.Save()
+  options.tracer.Close()
   return exit_code
 
 
@@ -373,7 +412,14 @@ def Execute(arch, mode, args, options, suites, workspace):
                         options.random_seed,
                         True,  # No sorting of test cases.
                         0,  # Don't rerun failing tests.
-                        0)  # No use of a rerun-failing-tests maximum.
+                        0,  # No use of a rerun-failing-tests maximum.
+                        commands.MAX_OUTPUT_SIZE,
+                        "process",
+                        False,  # Don't replay cached results.
+                        None,  # No memory budget.
+                        False,  # Use the full timeout for all tests.
+                        0,  # Don't stop after failures.
+                        0)  # No time budget.
 
   # Find available test suites and read test cases from them.
   variables = {
@@ -395,17 +441,34 @@ def Execute(arch, mode, args, options, suites, workspace):
   # Remember test case prototypes for the fuzzing phase.
   test_backup = dict((s, []) for s in suites)
 
+  tracer = options.tracer
   for s in suites:
-    s.ReadStatusFile(variables)
-    s.ReadTestCases(ctx)
-    if len(args) > 0:
-      s.FilterTestCasesByArgs(args)
+    with tracer.Phase("read status file", suite=s.name):
+      s.ReadStatusFile(variables)
+    with tracer.Phase("discovery", suite=s.name):
+      s.ReadTestCases(ctx)
+      if len(args) > 0:
+        s.FilterTestCasesByArgs(args)
     all_tests += s.tests
-    s.FilterTestCasesByStatus(False)
+    with tracer.Phase("status filtering", suite=s.name):
+      s.FilterTestCasesByStatus(False)
     test_backup[s] = s.tests
     analysis_flags = ["--deopt-every-n-times", "%d" % MAX_DEOPT,
                       "--print-deopt-stress"]
     s.tests = [ t.CopyAddingFlags(analysis_flags) for t in s.tests ]
+
+  # All suites share one index.
+  if suites and suites[0].index:
+    suites[0].index.Save()
+
+  ShardTests(suites, options, ctx.arch, ctx.mode)
+  if options.shard_dry_run:
+    return 0
+
+  for s in suites:
+    # Only fuzz the tests of this shard.
+    paths = set(t.path for t in s.tests)
+    test_backup[s] = [ t for t in test_backup[s] if t.path in paths ]
     num_tests += len(s.tests)
     for t in s.tests:
       t.id = test_id
@@ -418,8 +481,11 @@ def Execute(arch, mode, args, options, suites, workspace):
   print(">>> Collection phase")
   progress_indicator = progress.PROGRESS_INDICATORS[options.progress]()
   runner = execution.Runner(suites, progress_indicator, ctx)
+  if options.trace_file:
+    tracing.JobTimeline(tracer, options.j, [runner])
 
-  exit_code = runner.Run(options.j)
+  with tracer.Phase("collection phase"):
+    exit_code = runner.Run(options.j)
 
   print(">>> Analysis phase")
   num_tests = 0
@@ -465,8 +531,11 @@ def Execute(arch, mode, args, options, suites, workspace):
   print(">>> Deopt fuzzing phase (%d test cases)" % num_tests)
   progress_indicator = progress.PROGRESS_INDICATORS[options.progress]()
   runner = execution.Runner(suites, progress_indicator, ctx)
+  if options.trace_file:
+    tracing.JobTimeline(tracer, options.j, [runner])
 
-  code = runner.Run(options.j)
+  with tracer.Phase("deopt fuzzing phase"):
+    code = runner.Run(options.j)
   return exit_code or code
 
 
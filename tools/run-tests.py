@@ -40,13 +40,24 @@ import subprocess
 import sys
 import time
 
+from testrunner.local import admission
+from testrunner.local import commands
+from testrunner.local import discovery
 from testrunner.local import execution
+from testrunner.local import junit_output
+from testrunner.local import perfdata
 from testrunner.local import progress
+from testrunner.local import rerun
+from testrunner.local import sharding
+from testrunner.local import stress
+from testrunner.local import telemetry
 from testrunner.local import testsuite
+from testrunner.local import tracing
 from testrunner.local import utils
 from testrunner.local import verbose
 from testrunner.network import network_execution
 from testrunner.objects import context
+from testrunner.objects import testcase
 
 
 ARCH_GUESS = utils.DefaultArch()
@@ -103,10 +114,15 @@ SLOW_ARCHS = ["android_arm",
 
 def BuildOptions():
   result = optparse.OptionParser()
+  result.add_option("--adaptive-timeouts",
+                    help=("Time out tests after a multiple of their usual "
+                          "duration according to the perf data; tests that "
+                          "time out are rerun with the full timeout"),
+                    default=False, action="store_true")
   result.add_option("--arch",
                     help=("The architecture to run tests for, "
-                          "'auto' or 'native' for auto-detect"),
-                    default="ia32,x64,arm")
+                          "'auto' or 'native' for auto-detect, default "
+                          "ia32,x64,arm"))
   result.add_option("--arch-and-mode",
                     help="Architecture and mode in the format 'arch.mode'",
                     default=None)
@@ -135,16 +151,39 @@ def BuildOptions():
                     default="")
   result.add_option("--download-data", help="Download missing test suite data",
                     default=False, action="store_true")
+  result.add_option("--executor",
+                    help=("How to run tests in parallel: 'process' uses a "
+                          "pool of worker processes, 'thread' supervises the "
+                          "tests from threads of the main process, 'event' "
+                          "from an event loop in the main process (POSIX "
+                          "only)"),
+                    choices=execution.EXECUTORS.keys(), default="process")
   result.add_option("--extra-flags",
                     help="Additional flags to pass to each test command",
                     default="")
+  result.add_option("--fail-fast",
+                    help=("Stop running tests after this many unexpected "
+                          "failures (0 runs all tests)"),
+                    default=0, type="int")
   result.add_option("--isolates", help="Whether to test isolates",
                     default=False, action="store_true")
   result.add_option("-j", help="The number of parallel tasks to run",
                     default=0, type="int")
   result.add_option("-m", "--mode",
-                    help="The test modes in which to run (comma-separated)",
-                    default="release,debug")
+                    help=("The test modes in which to run (comma-separated), "
+                          "default release,debug"))
+  result.add_option("--max-output-size",
+                    help=("Maximum number of bytes kept of a test's stdout "
+                          "and stderr each, half from the beginning and half "
+                          "from the end"),
+                    default=commands.MAX_OUTPUT_SIZE, type="int")
+  result.add_option("--memory-budget",
+                    help=("Memory in MB that the tests running in parallel "
+                          "may use according to the peak RSS in the perf "
+                          "data, or 'auto' for %d%% of the available memory. "
+                          "No limit by default" %
+                          (admission.MEMORY_BUDGET_FRACTION * 100)),
+                    default=None)
   result.add_option("--no-i18n", "--noi18n",
                     help="Skip internationalization tests",
                     default=False, action="store_true")
@@ -155,6 +194,10 @@ def BuildOptions():
   result.add_option("--no-presubmit", "--nopresubmit",
                     help='Skip presubmit checks',
                     default=False, dest="no_presubmit", action="store_true")
+  result.add_option("--no-result-cache",
+                    help=("Run tests even if they passed before with the same "
+                          "shell, sources and status file outcomes"),
+                    default=False, dest="no_result_cache", action="store_true")
   result.add_option("--no-snap", "--nosnap",
                     help='Test a build compiled without snapshot.',
                     default=False, dest="no_snap", action="store_true")
@@ -180,7 +223,9 @@ def BuildOptions():
   result.add_option("--report", help="Print a summary of the tests to be run",
                     default=False, action="store_true")
   result.add_option("--json-test-results",
-                    help="Path to a file for storing json results.")
+                    help=("Path to a file for storing json results. Results "
+                          "are streamed as JSON lines if it ends in .jsonl, "
+                          "see merge-test-results.py"))
   result.add_option("--rerun-failures-count",
                     help=("Number of times to rerun each failing test case. "
                           "Very slow tests will be rerun only once."),
@@ -188,12 +233,32 @@ def BuildOptions():
   result.add_option("--rerun-failures-max",
                     help="Maximum number of failing test cases to rerun.",
                     default=100, type="int")
+  result.add_option("--rerun-from",
+                    help=("Only run the tests that failed in the run that "
+                          "wrote this --json-test-results file, with the same "
+                          "flags"))
+  result.add_option("--stress-flaky",
+                    help=("Run each test up to this many times in parallel, "
+                          "each time with a different random seed, and report "
+                          "how likely it is to fail"),
+                    default=0, type="int")
+  result.add_option("--rerun-repeat",
+                    help="With --rerun-from, run each test this many times",
+                    default=1, type="int")
   result.add_option("--shard-count",
                     help="Split testsuites into this number of shards",
                     default=1, type="int")
   result.add_option("--shard-run",
                     help="Run this shard from the split up tests.",
                     default=1, type="int")
+  result.add_option("--shard-dry-run",
+                    help=("Print the predicted duration of each shard "
+                          "instead of running tests"),
+                    default=False, action="store_true")
+  result.add_option("--shard-perf-data",
+                    help=("Balance the shards by the test durations in the "
+                          "perf data in this directory. All shards have to "
+                          "use the same copy"))
   result.add_option("--shell", help="DEPRECATED! use --shell-dir", default="")
   result.add_option("--shell-dir", help="Directory containing executables",
                     default="")
@@ -201,17 +266,34 @@ def BuildOptions():
                     help="Don't skip more slow tests when using a simulator.",
                     default=False, action="store_true",
                     dest="dont_skip_simulator_slow_tests")
+  result.add_option("--status-file",
+                    help=("Path to a JSON file with the live state of the "
+                          "run, rewritten every %d seconds" %
+                          telemetry.STATUS_INTERVAL))
+  result.add_option("--status-server",
+                    help=("Serve the live state of the run as JSON over HTTP "
+                          "on this port on localhost, or on the Unix socket "
+                          "at this path"))
   result.add_option("--stress-only",
                     help="Only run tests with --always-opt --stress-opt",
                     default=False, action="store_true")
   result.add_option("--time", help="Print timing information after running",
                     default=False, action="store_true")
+  result.add_option("--time-budget",
+                    help=("Seconds to run tests for. Tests that failed or "
+                          "changed recently run first, then the fastest "
+                          "ones. Tests still running at the end are "
+                          "stopped"),
+                    default=0, type="int")
   result.add_option("-t", "--timeout", help="Timeout in seconds",
                     default= -1, type="int")
   result.add_option("-v", "--verbose", help="Verbose output",
                     default=False, action="store_true")
   result.add_option("--valgrind", help="Run tests through valgrind",
                     default=False, action="store_true")
+  result.add_option("--trace-file",
+                    help=("Path to a file for a timeline of the run in the "
+                          "trace event format of about:tracing"))
   result.add_option("--warn-unused", help="Report unused rules",
                     default=False, action="store_true")
   result.add_option("--junitout", help="File name of the JUnit output")
@@ -227,7 +309,12 @@ def ProcessOptions(options):
   global VARIANT_FLAGS
   global VARIANTS
 
-  # Architecture and mode related stuff.
+  # Architecture and mode related stuff. Without any, --rerun-from takes the
+  # configurations from its file.
+  configurations_given = (options.arch or options.mode or
+                          options.arch_and_mode)
+  options.arch = options.arch or "ia32,x64,arm"
+  options.mode = options.mode or "release,debug"
   if options.arch_and_mode:
     options.arch_and_mode = [arch_and_mode.split(".")
         for arch_and_mode in options.arch_and_mode.split(",")]
@@ -249,7 +336,8 @@ def ProcessOptions(options):
   # Store the final configuration in arch_and_mode list. Don't overwrite
   # predefined arch_and_mode since it is more expressive than arch and mode.
   if not options.arch_and_mode:
-    options.arch_and_mode = itertools.product(options.arch, options.mode)
+    options.arch_and_mode = list(itertools.product(options.arch,
+                                                   options.mode))
 
   # Special processing of other options, sorted alphabetically.
 
@@ -257,6 +345,7 @@ def ProcessOptions(options):
     # Buildbots run presubmit tests as a separate step.
     options.no_presubmit = True
     options.no_network = True
+    options.no_result_cache = True
   if options.command_prefix:
     print("Specifying --command-prefix disables network distribution, "
           "running tests locally.")
@@ -273,6 +362,51 @@ def ProcessOptions(options):
   if options.j == 0:
     options.j = multiprocessing.cpu_count()
 
+  # The memory budget is kept in kilobytes like the peak RSS.
+  if options.memory_budget == "auto":
+    available = utils.GetAvailableMemory()
+    if not available:
+      print "The available memory is not known, pass --memory-budget in MB."
+      return False
+    options.memory_budget = int(available * admission.MEMORY_BUDGET_FRACTION)
+  elif options.memory_budget is not None:
+    if not options.memory_budget.isdigit():
+      print "--memory-budget must be a number of MB or 'auto'."
+      return False
+    options.memory_budget = int(options.memory_budget) * 1024
+  options.memory_budget = options.memory_budget or None
+
+  if options.executor == "event" and utils.IsWindows():
+    print "The event executor is not supported on Windows."
+    return False
+
+  options.rerun_failures = None
+  if options.rerun_from:
+    try:
+      options.rerun_failures = rerun.ReadFailures(options.rerun_from)
+    except (IOError, ValueError, KeyError), e:
+      print "Can't read %s: %s" % (options.rerun_from, e)
+      return False
+    if options.random_seed == 0:
+      options.random_seed = rerun.GetSeed(options.rerun_failures) or 0
+    if not configurations_given:
+      options.arch_and_mode = sorted(options.rerun_failures.keys())
+    # The failures have to be reproduced, not replayed.
+    options.no_result_cache = True
+  if options.stress_flaky:
+    if options.time_budget:
+      print "--time-budget can't be combined with --stress-flaky."
+      return False
+    # Every run is a sample, runs are neither replayed nor distributed.
+    options.no_result_cache = True
+    options.no_network = True
+  if options.rerun_repeat < 1:
+    print "--rerun-repeat must be at least 1"
+    return False
+
+  if options.random_seed != 0:
+    # Reproducing a run requires its tests to actually run with the seed.
+    options.no_result_cache = True
   while options.random_seed == 0:
     options.random_seed = random.SystemRandom().randint(-2147483648, 2147483647)
 
@@ -324,23 +458,46 @@ def ProcessOptions(options):
     return False
   if not options.no_i18n:
     DEFAULT_TESTS.append("intl")
+  if options.shard_perf_data and not os.path.isdir(options.shard_perf_data):
+    print "--shard-perf-data must be a directory with perf data."
+    return False
+  # Records nothing without --trace-file.
+  options.tracer = tracing.TraceWriter(options.trace_file, "run-tests")
+  # All configurations write to one JUnit document.
+  options.junit_output = None
+  if options.junitout:
+    options.junit_output = junit_output.JUnitTestOutput(
+        open(options.junitout, "w"))
   return True
 
 
-def ShardTests(tests, shard_count, shard_run):
-  if shard_count < 2:
-    return tests
-  if shard_run < 1 or shard_run > shard_count:
+def ShardTests(suites, options, arch, mode):
+  """Keeps only the tests of the current shard in |suites|. Each shard gets
+  every shard_count-th test of each suite. With --shard-perf-data, shards are
+  balanced by the durations in that perf data instead."""
+  if options.shard_count < 2 and not options.shard_dry_run:
+    return
+  if options.shard_run < 1 or options.shard_run > options.shard_count:
     print "shard-run not a valid number, should be in [1:shard-count]"
     print "defaulting back to running all tests"
-    return tests
-  count = 0
-  shard = []
-  for test in tests:
-    if count % shard_count == shard_run - 1:
-      shard.append(test)
-    count += 1
-  return shard
+    return
+  if options.shard_perf_data:
+    tests = [ t for s in suites for t in s.tests ]
+    perf_data_manager = perfdata.PerfDataManager(options.shard_perf_data)
+    try:
+      shards = sharding.DistributeTests(
+          tests, options.shard_count,
+          perf_data_manager.GetStore(arch, mode).FetchPerfData)
+    finally:
+      perf_data_manager.close()
+  else:
+    shards = sharding.SplitTests([ s.tests for s in suites ],
+                                 options.shard_count)
+  if options.shard_dry_run:
+    sharding.PrintShards(shards)
+  shard = set(id(t) for t in shards[options.shard_run - 1].tests)
+  for s in suites:
+    s.tests = [ t for t in s.tests if id(t) in shard ]
 
 
 def Main():
@@ -359,7 +516,12 @@ def Main():
 
   suite_paths = utils.GetSuitePaths(join(workspace, "test"))
 
-  if len(args) == 0:
+  if len(args) == 0 and options.rerun_failures is not None:
+    # Only the suites with failures need to list their tests.
+    rerun_suites = set(f.suitename() for tests in
+                       options.rerun_failures.itervalues() for f in tests)
+    suite_paths = [ s for s in suite_paths if s in rerun_suites ]
+  elif len(args) == 0:
     suite_paths = [ s for s in DEFAULT_TESTS if s in suite_paths ]
   else:
     args_suites = set()
@@ -369,27 +531,88 @@ def Main():
         args_suites.add(suite)
     suite_paths = [ s for s in args_suites if s in suite_paths ]
 
-  suites = []
-  for root in suite_paths:
-    suite = testsuite.TestSuite.LoadTestSuite(
-        os.path.join(workspace, "test", root))
-    if suite:
-      suites.append(suite)
+  index = discovery.DiscoveryIndex(execution.DATA_DIR)
+  with options.tracer.Phase("load suites"):
+    suites = LoadSuites(suite_paths, workspace, index)
 
   if options.download_data:
     for s in suites:
       s.DownloadData()
 
+  # With several configurations, the local runs are collected and share one
+  # pool at the end.
+  scheduled = None
+  if len(options.arch_and_mode) > 1:
+    scheduled = []
   for (arch, mode) in options.arch_and_mode:
+    if scheduled:
+      # The test cases of the previous configuration are still needed.
+      with options.tracer.Phase("load suites"):
+        suites = LoadSuites(suite_paths, workspace, index)
     try:
-      code = Execute(arch, mode, args, options, suites, workspace)
+      code = Execute(arch, mode, args, options, suites, workspace, scheduled)
     except KeyboardInterrupt:
       return 2
     exit_code = exit_code or code
+  if scheduled:
+    try:
+      code = RunScheduled(scheduled, options)
+    except KeyboardInterrupt:
+      return 2
+    exit_code = exit_code or code
+  # Keep the source metadata parsed while running.
+  index.Save()
+  options.tracer.Close()
+  if options.junit_output:
+    options.junit_output.Finish()
   return exit_code
 
 
-def Execute(arch, mode, args, options, suites, workspace):
+def LoadSuites(suite_paths, workspace, index):
+  suites = []
+  for root in suite_paths:
+    suite = testsuite.TestSuite.LoadTestSuite(
+        os.path.join(workspace, "test", root), index=index)
+    if suite:
+      suites.append(suite)
+  return suites
+
+
+def RebuildFailedTests(suite, failures):
+  """Replaces the tests of |suite| with the ones in |failures|, a list of
+  rerun.Failure objects, with the flags they failed with."""
+  listed = dict((suite.CommonTestName(t), t) for t in suite.tests)
+  tests = []
+  for failure in failures:
+    (suitename, name) = failure.name.split("/", 1)
+    if suitename != suite.name:
+      continue
+    test = listed.get(name)
+    if test is None:
+      print "Test %s doesn't exist anymore." % failure.name
+      continue
+    tests.append(testcase.TestCase(suite, test.path, list(failure.flags),
+                                   test.dependency))
+  suite.tests = tests
+
+
+def RunScheduled(scheduled, options):
+  """Runs the (runner, suites) pairs in |scheduled| on one pool."""
+  start_time = time.time()
+  runners = [ r for (r, _) in scheduled ]
+  exit_code = RunMonitored(execution.CombinedRunner(runners), runners,
+                           options)
+  overall_duration = time.time() - start_time
+
+  if options.time:
+    for (_, suites) in scheduled:
+      verbose.PrintTestDurations(suites, overall_duration)
+  return exit_code
+
+
+def Execute(arch, mode, args, options, suites, workspace, scheduled=None):
+  """Runs the tests for |arch| and |mode|. If |scheduled| is a list, a local
+  run is appended to it as a (runner, suites) pair instead."""
   print(">>> Running tests for %s.%s" % (arch, mode))
 
   shell_dir = options.shell_dir
@@ -425,7 +648,14 @@ def Execute(arch, mode, args, options, suites, workspace):
                         options.random_seed,
                         options.no_sorting,
                         options.rerun_failures_count,
-                        options.rerun_failures_max)
+                        options.rerun_failures_max,
+                        options.max_output_size,
+                        options.executor,
+                        not options.no_result_cache,
+                        options.memory_budget,
+                        options.adaptive_timeouts,
+                        options.fail_fast,
+                        options.time_budget)
 
   # TODO(all): Combine "simulator" and "simulator_run".
   simulator_run = not options.dont_skip_simulator_slow_tests and \
@@ -444,33 +674,61 @@ def Execute(arch, mode, args, options, suites, workspace):
     "simulator": utils.UseSimulator(arch),
     "system": utils.GuessOS(),
   }
+  failures = None
+  if options.rerun_failures is not None:
+    failures = options.rerun_failures.get((arch, mode), [])
+    # Allow as many runs as the failures had before. The runner reruns a
+    # test up to rerun_failures_count + 1 times.
+    ctx.rerun_failures_count = max([ctx.rerun_failures_count] +
+                                   [ f.runs - 2 for f in failures ])
   all_tests = []
   num_tests = 0
   test_id = 0
+  tracer = options.tracer
   for s in suites:
-    s.ReadStatusFile(variables)
-    s.ReadTestCases(ctx)
-    if len(args) > 0:
-      s.FilterTestCasesByArgs(args)
+    with tracer.Phase("read status file", suite=s.name):
+      s.ReadStatusFile(variables)
+    with tracer.Phase("discovery", suite=s.name):
+      s.ReadTestCases(ctx)
+      if failures is not None:
+        RebuildFailedTests(s, failures)
+      if len(args) > 0:
+        s.FilterTestCasesByArgs(args)
     all_tests += s.tests
-    s.FilterTestCasesByStatus(options.warn_unused, options.flaky_tests,
-                              options.slow_tests, options.pass_fail_tests)
+    with tracer.Phase("status filtering", suite=s.name):
+      s.FilterTestCasesByStatus(options.warn_unused, options.flaky_tests,
+                                options.slow_tests, options.pass_fail_tests)
     if options.cat:
       verbose.PrintTestSource(s.tests)
       continue
+    if failures is not None:
+      # The flags of the failures include their variant flags.
+      s.tests = [ t.CopyAddingFlags([])
+                  for t in s.tests
+                  for _ in range(options.rerun_repeat) ]
+      continue
     variant_flags = [VARIANT_FLAGS[var] for var in VARIANTS]
     s.tests = [ t.CopyAddingFlags(v)
                 for t in s.tests
                 for v in s.VariantFlags(t, variant_flags) ]
-    s.tests = ShardTests(s.tests, options.shard_count, options.shard_run)
+
+  # All suites share one index.
+  if suites and suites[0].index:
+    suites[0].index.Save()
+
+  if options.cat:
+    return 0  # We're done here.
+
+  ShardTests(suites, options, ctx.arch, ctx.mode)
+  if options.shard_dry_run:
+    return 0
+
+  for s in suites:
     num_tests += len(s.tests)
     for t in s.tests:
       t.id = test_id
       test_id += 1
 
-  if options.cat:
-    return 0  # We're done here.
-
   if options.report:
     verbose.PrintReport(all_tests)
 
@@ -480,14 +738,6 @@ def Execute(arch, mode, args, options, suites, workspace):
 
   # Run the tests, either locally or distributed on the network.
   start_time = time.time()
-  progress_indicator = progress.PROGRESS_INDICATORS[options.progress]()
-  if options.junitout:
-    progress_indicator = progress.JUnitTestProgressIndicator(
-        progress_indicator, options.junitout, options.junittestsuite)
-  if options.json_test_results:
-    progress_indicator = progress.JsonTestProgressIndicator(
-        progress_indicator, options.json_test_results, arch, mode)
-
   run_networked = not options.no_network
   if not run_networked:
     print("Network distribution disabled, running tests locally.")
@@ -507,13 +757,38 @@ def Execute(arch, mode, args, options, suites, workspace):
       print("Less than 100 tests, running them locally.")
       run_networked = False
 
+  combined = (scheduled is not None and not run_networked and
+              not options.stress_flaky)
+  progress_class = progress.PROGRESS_INDICATORS[options.progress]
+  if (combined and
+      issubclass(progress_class, progress.CompactProgressIndicator)):
+    # The configurations run together would overwrite each other's status
+    # line.
+    progress_class = progress.DotsProgressIndicator
+  progress_indicator = progress_class()
+  if options.junit_output:
+    suite_name = options.junittestsuite
+    if len(options.arch_and_mode) > 1:
+      suite_name += " %s.%s" % (arch, mode)
+    progress_indicator = progress.JUnitTestProgressIndicator(
+        progress_indicator, options.junit_output, suite_name)
+  if options.json_test_results:
+    progress_indicator = progress.JsonTestProgressIndicator(
+        progress_indicator, options.json_test_results, arch, mode)
+
   if run_networked:
     runner = network_execution.NetworkedRunner(suites, progress_indicator,
                                                ctx, peers, workspace)
+  elif options.stress_flaky:
+    runner = stress.StressRunner(suites, progress_indicator, ctx,
+                                 options.stress_flaky)
   else:
     runner = execution.Runner(suites, progress_indicator, ctx)
+    if combined:
+      scheduled.append((runner, suites))
+      return 0
 
-  exit_code = runner.Run(options.j)
+  exit_code = RunMonitored(runner, [runner], options)
   overall_duration = time.time() - start_time
 
   if options.time:
@@ -521,5 +796,24 @@ def Execute(arch, mode, args, options, suites, workspace):
   return exit_code
 
 
+def RunMonitored(runner, runners, options):
+  """Runs |runner|, publishing the state of |runners| with --status-file and
+  --status-server and recording their jobs with --trace-file."""
+  if options.trace_file:
+    tracing.JobTimeline(options.tracer, options.j, runners)
+  if not options.status_file and not options.status_server:
+    with options.tracer.Phase("run tests"):
+      return runner.Run(options.j)
+  status = telemetry.RunStatus(options.j, runners)
+  reporter = telemetry.StatusReporter(status, options.status_file,
+                                      options.status_server)
+  reporter.Start()
+  try:
+    with options.tracer.Phase("run tests"):
+      return runner.Run(options.j)
+  finally:
+    reporter.Stop()
+
+
 if __name__ == "__main__":
   sys.exit(Main())
@@ -96,8 +96,10 @@ import optparse
 import os
 import re
 import sys
+import time
 
 from testrunner.local import commands
+from testrunner.local import tracing
 from testrunner.local import utils
 
 ARCH_GUESS = utils.DefaultArch()
@@ -334,6 +336,9 @@ def Main(args):
                     help="Path to a file for storing json results.")
   parser.add_option("--outdir", help="Base directory with compile output",
                     default="out")
+  parser.add_option("--trace-file",
+                    help=("Path to a file for a timeline of the runs in the "
+                          "trace event format of about:tracing"))
   (options, args) = parser.parse_args(args)
 
   if len(args) == 0:  # pragma: no cover
@@ -355,6 +360,10 @@ def Main(args):
     shell_dir = os.path.join(workspace, options.outdir,
                              "%s.release" % options.arch)
 
+  # Records nothing without --trace-file.
+  tracer = tracing.TraceWriter(options.trace_file, "run_benchmarks")
+  # The benchmarks run one after the other on a lane of their own.
+  tracer.NameLane(tracing.MAIN_LANE + 1, "benchmarks")
   results = Results()
   for path in args:
     path = os.path.abspath(path)
@@ -363,8 +372,9 @@ def Main(args):
       results.errors.append("Benchmark file %s does not exist." % path)
       continue
 
-    with open(path) as f:
-      suite = json.loads(f.read())
+    with tracer.Phase("load suite", path=path):
+      with open(path) as f:
+        suite = json.loads(f.read())
 
     # If no name is given, default to the file name without .json.
     suite.setdefault("name", os.path.splitext(os.path.basename(path))[0])
@@ -378,18 +388,26 @@ def Main(args):
         for i in xrange(0, max(1, runnable.run_count)):
           # TODO(machenbach): Make timeout configurable in the suite definition.
           # Allow timeout per arch like with run_count per arch.
+          start = time.time()
           output = commands.Execute(runnable.GetCommand(shell_dir), timeout=60)
+          tracer.Complete("/".join(runnable.graphs), "benchmark", start,
+                          time.time() - start, tracing.MAIN_LANE + 1,
+                          {"run": i + 1})
           print ">>> Stdout (#%d):" % (i + 1)
           print output.stdout
           if output.stderr:  # pragma: no cover
             # Print stderr for debugging.
             print ">>> Stderr (#%d):" % (i + 1)
             print output.stderr
+          start = time.time()
           yield output.stdout
+          tracer.Complete("process output", "phase", start,
+                          time.time() - start, tracing.MAIN_LANE)
 
       # Let runnable iterate over all runs and handle output.
       results += runnable.Run(Runner)
 
+  tracer.Close()
   if options.json_test_results:
     results.WriteToFile(options.json_test_results)
   else:  # pragma: no cover
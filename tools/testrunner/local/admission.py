@@ -0,0 +1,123 @@
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import collections
+import time
+
+
+# Fraction of the available memory the tests may use by default.
+MEMORY_BUDGET_FRACTION = 0.75
+
+# Tests predicted to use more than this fraction of the budget are heavy. At
+# most one heavy test runs at a time.
+HEAVY_FRACTION = 0.25
+
+# Peak RSS in kilobytes assumed for tests without perf data.
+DEFAULT_MAX_RSS = 64 * 1024
+
+
+class AdmissionControl(object):
+  """Decides when jobs may be handed to the pool, based on the memory they
+  are predicted to use.
+
+  A job is admitted if one of the |slots| workers is free and the predicted
+  memory of all jobs in flight, including the new one, stays within the
+  budget. Otherwise it is held, together with all jobs after it, until
+  enough jobs have finished. A job that exceeds the budget on its own is
+  admitted once nothing else is in flight. Pools queue the jobs they get
+  ahead of time, so without the limit on the slots, queued jobs would count
+  as in flight."""
+
+  def __init__(self, budget, slots):
+    self.budget = budget  # Kilobytes.
+    self.slots = slots
+    self.memory = 0  # Predicted memory of the jobs in flight.
+    self.in_flight = {}  # Maps job ids to their predicted memory.
+    self.heavy = 0  # Number of heavy jobs in flight.
+    # Of (job, memory, time held back for lack of memory or None).
+    self.held = collections.deque()
+
+    # Statistics for the summary.
+    self.admitted = 0
+    self.delayed = 0
+    self.serialized = 0  # Heavy jobs delayed because of another heavy one.
+    self.wait_time = 0.0
+    self.max_wait_time = 0.0
+    self.peak_memory = 0
+
+  def _IsHeavy(self, memory):
+    return memory > self.budget * HEAVY_FRACTION
+
+  def _FitsMemory(self, memory):
+    if not self.in_flight:
+      return True
+    if self._IsHeavy(memory) and self.heavy:
+      return False
+    return self.memory + memory <= self.budget
+
+  def _Fits(self, memory):
+    return (not self.in_flight or
+            (len(self.in_flight) < self.slots and self._FitsMemory(memory)))
+
+  def _Start(self, job, memory):
+    self.in_flight[job.id] = memory
+    self.memory += memory
+    self.peak_memory = max(self.peak_memory, self.memory)
+    if self._IsHeavy(memory):
+      self.heavy += 1
+    self.admitted += 1
+
+  def Admit(self, job, memory):
+    """Returns whether |job| may start now. If not, it is returned by Release
+    later."""
+    if not self.held and self._Fits(memory):
+      self._Start(job, memory)
+      return True
+    held_since = None
+    if not self._FitsMemory(memory) or (self.held and self.held[-1][2]):
+      # Held back for lack of memory, not only until a worker is free.
+      if self._IsHeavy(memory) and self.heavy:
+        self.serialized += 1
+      self.delayed += 1
+      held_since = time.time()
+    self.held.append((job, memory, held_since))
+    return False
+
+  def Finished(self, job_id):
+    memory = self.in_flight.pop(job_id, None)
+    if memory is None:
+      return
+    self.memory -= memory
+    if self._IsHeavy(memory):
+      self.heavy -= 1
+
+  def ForgetInFlight(self):
+    """Forgets the jobs in flight, for when the pool is idle although not
+    all of them finished. Pools drop the results of jobs that raised."""
+    self.in_flight.clear()
+    self.memory = 0
+    self.heavy = 0
+
+  def Release(self):
+    """Returns the held jobs that may start now, in the order they came."""
+    released = []
+    while self.held and self._Fits(self.held[0][1]):
+      (job, memory, held_since) = self.held.popleft()
+      if held_since is not None:
+        wait_time = time.time() - held_since
+        self.wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+      self._Start(job, memory)
+      released.append(job)
+    return released
+
+  def PrintSummary(self):
+    print("Memory admission: budget %dMB, predicted peak %dMB" %
+          (self.budget / 1024, self.peak_memory / 1024))
+    print("  %d of %d jobs delayed (%d heavy ones serialized), waited %.1fs "
+          "in total, %.1fs at most" %
+          (self.delayed, self.admitted + len(self.held), self.serialized,
+           self.wait_time, self.max_wait_time))
+    if self.held:
+      print("  %d jobs were never admitted" % len(self.held))
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest
+
+from admission import AdmissionControl
+
+class FakeJob(object):
+  def __init__(self, job_id):
+    self.id = job_id
+
+class AdmissionControlTest(unittest.TestCase):
+  def testBudget(self):
+    control = AdmissionControl(100, 10)
+    jobs = [ FakeJob(i) for i in range(4) ]
+    self.assertTrue(control.Admit(jobs[0], 20))
+    self.assertTrue(control.Admit(jobs[1], 20))
+    self.assertFalse(control.Admit(jobs[2], 90))
+    # Jobs after a held one are held as well.
+    self.assertFalse(control.Admit(jobs[3], 10))
+    control.Finished(0)
+    self.assertEquals([], control.Release())
+    control.Finished(1)
+    self.assertEquals([jobs[2], jobs[3]], control.Release())
+    self.assertEquals(2, control.delayed)
+    self.assertEquals(100, control.peak_memory)
+
+  def testHeavyJobsAreSerialized(self):
+    control = AdmissionControl(100, 10)
+    self.assertTrue(control.Admit(FakeJob(0), 30))
+    self.assertFalse(control.Admit(FakeJob(1), 30))
+    self.assertEquals(1, control.serialized)
+    control.Finished(0)
+    self.assertEquals([1], [ job.id for job in control.Release() ])
+
+  def testJobAboveBudgetRunsAlone(self):
+    control = AdmissionControl(100, 10)
+    self.assertTrue(control.Admit(FakeJob(0), 10))
+    self.assertFalse(control.Admit(FakeJob(1), 500))
+    control.Finished(0)
+    self.assertEquals([1], [ job.id for job in control.Release() ])
+    self.assertFalse(control.Admit(FakeJob(2), 10))
+
+  def testSlots(self):
+    control = AdmissionControl(100, 2)
+    self.assertTrue(control.Admit(FakeJob(0), 10))
+    self.assertTrue(control.Admit(FakeJob(1), 10))
+    # Waiting for a free worker is not a delay.
+    self.assertFalse(control.Admit(FakeJob(2), 10))
+    self.assertEquals(0, control.delayed)
+    self.assertEquals([], control.Release())
+    control.Finished(0)
+    self.assertEquals([2], [ job.id for job in control.Release() ])
@@ -26,11 +26,17 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
+import atexit
+import collections
+import errno
+import heapq
+import itertools
 import os
+import select
 import signal
 import subprocess
 import sys
-import tempfile
+import threading
 import time
 
 from ..local import utils
@@ -44,10 +50,6 @@ def KillProcessWithID(pid):
     os.kill(pid, signal.SIGTERM)
 
 
-MAX_SLEEP_TIME = 0.1
-INITIAL_SLEEP_TIME = 0.0001
-SLEEP_TIME_FACTOR = 1.25
-
 SEM_INVALID_VALUE = -1
 SEM_NOGPFAULTERRORBOX = 0x0002  # Microsoft Platform SDK WinBase.h
 
@@ -63,7 +65,122 @@ def Win32SetErrorMode(mode):
   return prev_error_mode
 
 
-def RunProcess(verbose, timeout, args, **rest):
+class WatchedProcess(object):
+  def __init__(self, process, deadline):
+    self.process = process
+    self.deadline = deadline
+    self.timed_out = False
+    self.finished = False
+
+
+class ProcessWatcher(object):
+  """Enforces timeouts of running processes without polling them.
+
+  Deadlines are kept in a heap that is served by a single daemon thread. The
+  thread sleeps until the earliest deadline expires and kills the process if
+  it is still running. Processes that exit in time are never touched, their
+  owners simply block on the process until it exits."""
+
+  def __init__(self):
+    self.pid = os.getpid()
+    self.condition = threading.Condition()
+    self.deadlines = []  # Heap of (deadline, sequence number, WatchedProcess).
+    self.watches = set()  # All unfinished WatchedProcesses.
+    self.sequence = itertools.count()
+    self.stopped = False
+    self.thread = threading.Thread(target=self._Run)
+    self.thread.daemon = True
+    self.thread.start()
+    # A daemon thread that wakes up while the interpreter shuts down fails
+    # with spurious errors.
+    atexit.register(self.Stop)
+
+  def Stop(self):
+    if self.pid != os.getpid():
+      return  # The thread belongs to the parent process.
+    with self.condition:
+      self.stopped = True
+      self.condition.notify()
+    self.thread.join()
+
+  def Watch(self, process, timeout):
+    deadline = None
+    if timeout is not None:
+      deadline = time.time() + timeout
+    watch = WatchedProcess(process, deadline)
+    with self.condition:
+      self.watches.add(watch)
+      if deadline is None:
+        return watch
+      heapq.heappush(self.deadlines,
+                     (watch.deadline, self.sequence.next(), watch))
+      if self.deadlines[0][2] is watch:
+        # The new deadline is the earliest one, the thread needs to wake up
+        # earlier than planned.
+        self.condition.notify()
+    return watch
+
+  def Unwatch(self, watch):
+    # Finished entries are dropped lazily when their deadline comes up.
+    with self.condition:
+      watch.finished = True
+      self.watches.discard(watch)
+
+  def KillAll(self):
+    """Kills all watched processes that are still running."""
+    with self.condition:
+      for watch in self.watches:
+        try:
+          KillProcessWithID(watch.process.pid)
+        except OSError:
+          pass  # The process exited in the meantime.
+
+  def _Run(self):
+    with self.condition:
+      while not self.stopped:
+        if not self.deadlines:
+          self.condition.wait()
+          continue
+        (deadline, _, watch) = self.deadlines[0]
+        now = time.time()
+        if deadline > now:
+          self.condition.wait(deadline - now)
+          continue
+        heapq.heappop(self.deadlines)
+        if watch.finished:
+          continue
+        watch.timed_out = True
+        try:
+          KillProcessWithID(watch.process.pid)
+        except OSError:
+          pass  # The process exited in the meantime.
+
+
+process_watcher = None
+process_watcher_lock = threading.Lock()
+
+
+def GetProcessWatcher():
+  """Returns the watcher of the current process. Worker processes that were
+  forked from a process with a watcher need their own watcher thread."""
+  global process_watcher
+  with process_watcher_lock:
+    if process_watcher is None or process_watcher.pid != os.getpid():
+      process_watcher = ProcessWatcher()
+    return process_watcher
+
+
+def KillRunningProcesses():
+  """Kills the processes started by Execute or RunProcess in the current
+  process that are still running."""
+  if process_watcher is not None and process_watcher.pid == os.getpid():
+    process_watcher.KillAll()
+
+
+start_lock = threading.Lock()
+
+
+def StartProcess(verbose, args, **rest):
   if verbose: print "#", " ".join(args)
   popen_args = args
   prev_error_mode = SEM_INVALID_VALUE
@@ -75,77 +192,214 @@ def RunProcess(verbose, timeout, args, **rest):
     error_mode = SEM_NOGPFAULTERRORBOX
     prev_error_mode = Win32SetErrorMode(error_mode)
     Win32SetErrorMode(error_mode | prev_error_mode)
-  process = subprocess.Popen(
-    shell=utils.IsWindows(),
-    args=popen_args,
-    **rest
-  )
+  # The pipes of a new process are inherited by processes started from other
+  # threads while Popen sets them up. Those would keep the pipes open, so the
+  # output of this process would not end before theirs.
+  with start_lock:
+    inherited_rss = utils.GetResidentMemory()
+    process = subprocess.Popen(
+      shell=utils.IsWindows(),
+      args=popen_args,
+      **rest
+    )
+  # See output.ResourceUsage.FromRusage.
+  process.inherited_rss = inherited_rss
   if (utils.IsWindows() and prev_error_mode != SEM_INVALID_VALUE):
     Win32SetErrorMode(prev_error_mode)
-  # Compute the end time - if the process crosses this limit we
-  # consider it timed out.
-  if timeout is None: end_time = None
-  else: end_time = time.time() + timeout
-  timed_out = False
-  # Repeatedly check the exit code from the process in a
-  # loop and keep track of whether or not it times out.
-  exit_code = None
-  sleep_time = INITIAL_SLEEP_TIME
-  while exit_code is None:
-    if (not end_time is None) and (time.time() >= end_time):
-      # Kill the process and wait for it to exit.
-      KillProcessWithID(process.pid)
-      exit_code = process.wait()
-      timed_out = True
-    else:
-      exit_code = process.poll()
-      time.sleep(sleep_time)
-      sleep_time = sleep_time * SLEEP_TIME_FACTOR
-      if sleep_time > MAX_SLEEP_TIME:
-        sleep_time = MAX_SLEEP_TIME
-  return (exit_code, timed_out)
+  return process
 
 
-def PrintError(string):
-  sys.stderr.write(string)
-  sys.stderr.write("\n")
+def GetExitCode(status):
+  """Converts a status from os.wait* to an exit code like Popen.returncode."""
+  if os.WIFSIGNALED(status):
+    return -os.WTERMSIG(status)
+  return os.WEXITSTATUS(status)
 
 
-def CheckedUnlink(name):
-  # On Windows, when run with -jN in parallel processes,
-  # OS often fails to unlink the temp file. Not sure why.
-  # Need to retry.
-  # Idea from https://bugs.webkit.org/attachment.cgi?id=75982&action=prettypatch
-  retry_count = 0
-  while retry_count < 30:
+def WaitForProcess(process):
+  """Waits for |process| to exit. Returns the exit code and the resources it
+  used as output.ResourceUsage, or None where wait4 is not available."""
+  if not hasattr(os, "wait4"):
+    return (process.wait(), None)
+  while True:
     try:
-      os.unlink(name)
-      return
+      (_, status, rusage) = os.wait4(process.pid, 0)
+      break
     except OSError, e:
-      retry_count += 1
-      time.sleep(retry_count * 0.1)
-  PrintError("os.unlink() " + str(e))
+      if e.errno != errno.EINTR:
+        raise
+  # Keep Popen from waiting for the process again.
+  process.returncode = GetExitCode(status)
+  return (process.returncode,
+          output.ResourceUsage.FromRusage(rusage, process.inherited_rss))
 
 
-def Execute(args, verbose=False, timeout=None):
+def RunProcess(verbose, timeout, args, **rest):
+  process = StartProcess(verbose, args, **rest)
+  # The watcher kills the process once it crosses the timeout, which makes
+  # the blocking wait below return.
+  watcher = GetProcessWatcher()
+  watch = watcher.Watch(process, timeout)
   try:
-    args = [ c for c in args if c != "" ]
-    (fd_out, outname) = tempfile.mkstemp()
-    (fd_err, errname) = tempfile.mkstemp()
-    (exit_code, timed_out) = RunProcess(
-      verbose,
-      timeout,
-      args=args,
-      stdout=fd_out,
-      stderr=fd_err
-    )
+    exit_code = process.wait()
+  finally:
+    watcher.Unwatch(watch)
+  return (exit_code, watch.timed_out)
+
+
+# Maximum number of bytes kept per output stream of a test.
+MAX_OUTPUT_SIZE = 10 * 1024 * 1024
+TRUNCATION_MARKER = "\n--- OUTPUT TRUNCATED (%d bytes dropped) ---\n"
+READ_SIZE = 64 * 1024
+# Time to wait for the pipes to close after a process was killed. Grand
+# children (e.g. when running through --command-prefix) might keep them open.
+KILL_GRACE_TIME = 1.0
+
+
+class StreamBuffer(object):
+  """Accumulates the output of a stream up to a maximum size. The first and
+  the last half of that are kept, so the end of the output (e.g. the stack
+  trace of a crash) survives. Everything in between is counted and dropped."""
+
+  def __init__(self, max_size):
+    self.head_size = max_size - max_size / 2
+    self.tail_size = max_size / 2
+    self.head = []
+    self.size = 0  # Bytes in self.head.
+    self.tail = collections.deque()
+    self.tail_length = 0  # Bytes in self.tail.
+    self.dropped = 0
+
+  def Add(self, data):
+    keep = max(0, min(len(data), self.head_size - self.size))
+    if keep:
+      self.head.append(data[:keep])
+      self.size += keep
+      data = data[keep:]
+    if not data:
+      return
+    self.tail.append(data)
+    self.tail_length += len(data)
+    # Only the oldest chunk is cut, the others are dropped as a whole.
+    while self.tail_length > self.tail_size:
+      excess = self.tail_length - self.tail_size
+      chunk = self.tail[0]
+      if len(chunk) <= excess:
+        self.tail.popleft()
+        self.tail_length -= len(chunk)
+        self.dropped += len(chunk)
+      else:
+        self.tail[0] = chunk[excess:]
+        self.tail_length -= excess
+        self.dropped += excess
+
+  def GetValue(self):
+    value = "".join(self.head)
+    if self.dropped:
+      value += TRUNCATION_MARKER % self.dropped
+    return value + "".join(self.tail)
+
+
+def _ReadPipesSelect(buffers, watch):
+  pipes = list(buffers)
+  while pipes:
+    timeout = None
+    if watch.deadline is not None:
+      timeout = max(0, watch.deadline + KILL_GRACE_TIME - time.time())
+    try:
+      ready = select.select(pipes, [], [], timeout)[0]
+    except select.error, e:
+      if e.args[0] == errno.EINTR:
+        continue
+      raise
+    if not ready:
+      # The process timed out but something still holds on to the pipes.
+      break
+    for pipe in ready:
+      data = os.read(pipe.fileno(), READ_SIZE)
+      if data:
+        buffers[pipe].Add(data)
+      else:
+        pipes.remove(pipe)
+
+
+def _ReadPipesThreaded(buffers, watch):
+  # select() doesn't support pipes on Windows.
+  def Drain(pipe, buf):
+    for data in iter(lambda: pipe.read(READ_SIZE), ""):
+      buf.Add(data)
+  threads = []
+  for pipe in buffers:
+    thread = threading.Thread(target=Drain, args=(pipe, buffers[pipe]))
+    thread.daemon = True
+    thread.start()
+    threads.append(thread)
+  for thread in threads:
+    if watch.deadline is None:
+      thread.join()
+    else:
+      thread.join(max(0, watch.deadline + KILL_GRACE_TIME - time.time()))
+
+
+def ReadOutput(process, watch, max_output_size):
+  """Drains stdout and stderr of |process| until both are closed and returns
+  their contents."""
+  buffers = {
+    process.stdout: StreamBuffer(max_output_size),
+    process.stderr: StreamBuffer(max_output_size),
+  }
+  if utils.IsWindows():
+    _ReadPipesThreaded(buffers, watch)
+  else:
+    _ReadPipesSelect(buffers, watch)
+  process.stdout.close()
+  process.stderr.close()
+  return (buffers[process.stdout].GetValue(),
+          buffers[process.stderr].GetValue())
+
+
+def PrintError(string):
+  sys.stderr.write(string)
+  sys.stderr.write("\n")
+
+
+def Execute(args, verbose=False, timeout=None,
+            max_output_size=MAX_OUTPUT_SIZE):
+  args = [ c for c in args if c != "" ]
+  process = StartProcess(verbose, args,
+                         stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE)
+  watcher = GetProcessWatcher()
+  watch = watcher.Watch(process, timeout)
+  try:
+    (out, errors) = ReadOutput(process, watch, max_output_size)
+    (exit_code, usage) = WaitForProcess(process)
   finally:
-    # TODO(machenbach): A keyboard interrupt before the assignment to
-    # fd_out|err can lead to reference errors here.
-    os.close(fd_out)
-    os.close(fd_err)
-    out = file(outname).read()
-    errors = file(errname).read()
-    CheckedUnlink(outname)
-    CheckedUnlink(errname)
-  return output.Output(exit_code, timed_out, out, errors)
+    watcher.Unwatch(watch)
+  return output.Output(exit_code, watch.timed_out, out, errors, usage)
+
+
+class Command(object):
+  """A process to run. Yielded by step functions to have the caller execute
+  the process, see RunSteps and eventloop.EventLoopPool."""
+
+  def __init__(self, args, verbose=False, timeout=None,
+               max_output_size=MAX_OUTPUT_SIZE):
+    self.args = [ c for c in args if c != "" ]
+    self.verbose = verbose
+    self.timeout = timeout
+    self.max_output_size = max_output_size
+
+  def Execute(self):
+    return Execute(self.args, self.verbose, self.timeout, self.max_output_size)
+
+
+def RunSteps(steps):
+  """Runs the generator |steps| synchronously. Every Command it yields is
+  executed and its output is sent back. Returns the first item that is not a
+  Command."""
+  item = steps.next()
+  while isinstance(item, Command):
+    item = steps.send(item.Execute())
+  steps.close()
+  return item
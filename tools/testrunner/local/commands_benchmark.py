@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Measures the per-test overhead of commands.Execute.
+
+Compares the former poll/sleep loop against the process watcher by running
+short-lived commands sequentially. Run from the tools directory:
+
+  python -m testrunner.local.commands_benchmark
+"""
+
+import optparse
+import subprocess
+import time
+
+from . import commands
+
+
+# The former implementation of commands.RunProcess, kept as a reference.
+MAX_SLEEP_TIME = 0.1
+INITIAL_SLEEP_TIME = 0.0001
+SLEEP_TIME_FACTOR = 1.25
+
+
+def PollingRunProcess(timeout, args):
+  process = subprocess.Popen(args=args)
+  end_time = time.time() + timeout
+  exit_code = None
+  sleep_time = INITIAL_SLEEP_TIME
+  while exit_code is None:
+    if time.time() >= end_time:
+      commands.KillProcessWithID(process.pid)
+      exit_code = process.wait()
+    else:
+      exit_code = process.poll()
+      time.sleep(sleep_time)
+      sleep_time = min(sleep_time * SLEEP_TIME_FACTOR, MAX_SLEEP_TIME)
+  return exit_code
+
+
+def WatchedRunProcess(timeout, args):
+  return commands.RunProcess(False, timeout, args)
+
+
+def Measure(run, args, count):
+  start_time = time.time()
+  for _ in xrange(count):
+    run(60, args)
+  return (time.time() - start_time) / count
+
+
+def Main():
+  parser = optparse.OptionParser()
+  parser.add_option("-n", "--count", help="Number of runs per command",
+                    default=50, type="int")
+  (options, _) = parser.parse_args()
+
+  print "%-20s %12s %12s %12s" % ("command", "polling", "watcher", "saved")
+  for sleep in ["0", "0.01", "0.05", "0.2"]:
+    args = ["sleep", sleep]
+    polling = Measure(PollingRunProcess, args, options.count)
+    watched = Measure(WatchedRunProcess, args, options.count)
+    print "%-20s %10.2fms %10.2fms %10.2fms" % (
+        " ".join(args), polling * 1000, watched * 1000,
+        (polling - watched) * 1000)
+
+
+if __name__ == "__main__":
+  Main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import subprocess
+import time
+import unittest
+
+from commands import ProcessWatcher, StartProcess, WaitForProcess
+from commands import StreamBuffer, TRUNCATION_MARKER
+
+def Sleep(seconds):
+  return subprocess.Popen(["sleep", str(seconds)])
+
+class ProcessWatcherTest(unittest.TestCase):
+  def setUp(self):
+    self.watcher = ProcessWatcher()
+
+  def tearDown(self):
+    self.watcher.Stop()
+
+  def testKill(self):
+    process = Sleep(10)
+    start = time.time()
+    watch = self.watcher.Watch(process, 0.1)
+    self.assertNotEquals(0, process.wait())
+    self.watcher.Unwatch(watch)
+    self.assertTrue(watch.timed_out)
+    self.assertTrue(time.time() - start < 5)
+
+  def testNoTimeout(self):
+    process = Sleep(0)
+    watch = self.watcher.Watch(process, None)
+    self.assertEquals(0, process.wait())
+    self.watcher.Unwatch(watch)
+    self.assertFalse(watch.timed_out)
+    self.assertEquals([], self.watcher.deadlines)
+
+  def testEarlierDeadline(self):
+    # The thread sleeps until the later deadline unless the earlier one
+    # wakes it up.
+    late = self.watcher.Watch(Sleep(10), 10)
+    process = Sleep(10)
+    start = time.time()
+    early = self.watcher.Watch(process, 0.1)
+    process.wait()
+    self.assertTrue(early.timed_out)
+    self.assertTrue(time.time() - start < 5)
+    self.assertFalse(late.timed_out)
+    self.assertEquals(late, self.watcher.deadlines[0][2])
+    late.process.kill()
+    late.process.wait()
+    self.watcher.Unwatch(late)
+
+  def testFinishedNotKilled(self):
+    process = Sleep(0)
+    watch = self.watcher.Watch(process, 0.1)
+    self.assertEquals(0, process.wait())
+    self.watcher.Unwatch(watch)
+    time.sleep(0.3)
+    # The entry is dropped when its deadline comes up.
+    self.assertFalse(watch.timed_out)
+    self.assertEquals([], self.watcher.deadlines)
+
+
+class StreamBufferTest(unittest.TestCase):
+  def testBelowLimit(self):
+    buf = StreamBuffer(10)
+    buf.Add("abc")
+    buf.Add("defghij")
+    self.assertEquals("abcdefghij", buf.GetValue())
+
+  def testHeadAndTail(self):
+    buf = StreamBuffer(10)
+    for data in ["abc", "defghi", "jklm", "nop", "qrstuvwxyz"]:
+      buf.Add(data)
+    self.assertEquals("abcde" + TRUNCATION_MARKER % 16 + "vwxyz",
+                      buf.GetValue())
+    self.assertEquals(5, buf.tail_length)
+
+  def testLargeChunk(self):
+    buf = StreamBuffer(7)
+    buf.Add("x" * 100 + "end")
+    self.assertEquals("xxxx" + TRUNCATION_MARKER % 96 + "end",
+                      buf.GetValue())
+
+
+class WaitForProcessTest(unittest.TestCase):
+  def _GetMaxRss(self):
+    (exit_code, usage) = WaitForProcess(StartProcess(False, ["true"]))
+    self.assertEquals(0, exit_code)
+    return usage.max_rss
+
+  @unittest.skipUnless(hasattr(os, "wait4"), "needs wait4")
+  def testInheritedRss(self):
+    small = self._GetMaxRss()
+    # The child would report the resident set of its parent as its own.
+    ballast = "x" * (200 << 20)
+    self.assertEquals(small, self._GetMaxRss())
+    del ballast
+
+
+if __name__ == '__main__':
+  unittest.main()
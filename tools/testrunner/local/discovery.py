@@ -0,0 +1,163 @@
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import cPickle
+import hashlib
+import os
+import stat
+
+
+# Bump when the format of the index changes.
+VERSION = 2
+
+READ_SIZE = 1024 * 1024
+
+
+class DiscoveryIndex(object):
+  """Remembers what test suites found when listing their tests, so that the
+  next run only redoes the work for what changed.
+
+  Directory listings are reused while the mtime of the directory is the same,
+  which changes whenever an entry is added, removed or renamed. Other listings
+  (e.g. the output of "cctest --list") are stored with the files they depend
+  on and reused while the contents of these files are the same. Records
+  parsed from test sources are reused while the mtime and size of the source
+  are the same."""
+
+  def __init__(self, datadir):
+    self.filename = os.path.join(datadir, "discovery.index")
+    self.directories = {}  # Path -> (mtime, subdirectories, files).
+    self.files = {}  # Path -> (mtime, size, SHA-1 of the contents).
+    self.listings = {}  # Key -> (file versions, value).
+    self.records = {}  # Path -> (mtime, size, record), see GetFileRecord.
+    self.changed = False
+    self._Load()
+
+  def _Load(self):
+    try:
+      with open(self.filename, "rb") as f:
+        data = cPickle.load(f)
+    except Exception:
+      return  # Missing or unreadable, start over.
+    if not isinstance(data, dict) or data.get("version") != VERSION:
+      return
+    self.directories = data["directories"]
+    self.files = data["files"]
+    self.listings = data["listings"]
+    self.records = data["records"]
+
+  def Save(self):
+    if not self.changed:
+      return
+    data = {
+      "version": VERSION,
+      "directories": self.directories,
+      "files": self.files,
+      "listings": self.listings,
+      "records": self.records,
+    }
+    # Write to a temporary file first, so concurrent runs never read a
+    # partially written index.
+    datadir = os.path.dirname(self.filename)
+    if not os.path.exists(datadir):
+      os.makedirs(datadir)
+    temp_filename = "%s.%d" % (self.filename, os.getpid())
+    with open(temp_filename, "wb") as f:
+      cPickle.dump(data, f, cPickle.HIGHEST_PROTOCOL)
+    os.rename(temp_filename, self.filename)
+    self.changed = False
+
+  def _ListDirectory(self, path):
+    try:
+      mtime = os.stat(path).st_mtime
+    except OSError:
+      return ([], [])
+    entry = self.directories.get(path)
+    if entry and entry[0] == mtime:
+      return entry[1:]
+    dirs = []
+    files = []
+    try:
+      names = os.listdir(path)
+    except OSError:
+      return ([], [])
+    for name in names:
+      if os.path.isdir(os.path.join(path, name)):
+        dirs.append(name)
+      else:
+        files.append(name)
+    # The mtime is taken before listing, a change in between is seen by the
+    # next run.
+    self.directories[path] = (mtime, dirs, files)
+    self.changed = True
+    return (dirs, files)
+
+  def Walk(self, top):
+    """Like os.walk(top). As with os.walk, callers can remove entries from
+    the list of subdirectories to not descend into them."""
+    pending = [top]
+    while pending:
+      dirname = pending.pop()
+      (dirs, files) = self._ListDirectory(dirname)
+      dirs = list(dirs)
+      yield (dirname, dirs, list(files))
+      for name in reversed(dirs):
+        path = os.path.join(dirname, name)
+        if not os.path.islink(path):
+          pending.append(path)
+
+  def _GetVersion(self, path):
+    """Returns the version of the file or directory at |path|: the mtime of
+    directories and the hash of the contents of files, None if it doesn't
+    exist. Files are only hashed again if their mtime or size changed."""
+    try:
+      st = os.stat(path)
+    except OSError:
+      return None
+    if stat.S_ISDIR(st.st_mode):
+      return st.st_mtime
+    entry = self.files.get(path)
+    if entry and entry[:2] == (st.st_mtime, st.st_size):
+      return entry[2]
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+      while True:
+        data = f.read(READ_SIZE)
+        if not data:
+          break
+        digest.update(data)
+    self.files[path] = (st.st_mtime, st.st_size, digest.hexdigest())
+    self.changed = True
+    return self.files[path][2]
+
+  def Lookup(self, key, paths):
+    """Returns the value stored for |key| if none of |paths| changed since,
+    or None."""
+    entry = self.listings.get(tuple(key))
+    if entry is None:
+      return None
+    (versions, value) = entry
+    if [ p for (p, _) in versions ] != list(paths):
+      return None
+    for (path, version) in versions:
+      if self._GetVersion(path) != version:
+        return None
+    return value
+
+  def Store(self, key, paths, value):
+    versions = [ (p, self._GetVersion(p)) for p in paths ]
+    self.listings[tuple(key)] = (versions, value)
+    self.changed = True
+
+  def GetFileRecord(self, path, parse_fun):
+    """Returns parse_fun(path), or its result from an earlier run if the mtime
+    and size of the file are the same. Holds one record per file."""
+    st = os.stat(path)
+    entry = self.records.get(path)
+    if entry and entry[:2] == (st.st_mtime, st.st_size):
+      return entry[2]
+    record = parse_fun(path)
+    self.records[path] = (st.st_mtime, st.st_size, record)
+    self.changed = True
+    return record
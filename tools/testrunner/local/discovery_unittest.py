@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from discovery import DiscoveryIndex
+
+class DiscoveryIndexTest(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.datadir = os.path.join(self.root, "data")
+    self.tests = os.path.join(self.root, "tests")
+    os.makedirs(os.path.join(self.tests, "a"))
+    os.makedirs(os.path.join(self.tests, "skipped"))
+    self._Write(os.path.join(self.tests, "a", "one.js"), "")
+    self._Write(os.path.join(self.tests, "skipped", "two.js"), "")
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def _Write(self, path, contents):
+    with open(path, "w") as f:
+      f.write(contents)
+
+  def _ListFiles(self, index):
+    result = []
+    for (dirname, dirs, files) in index.Walk(self.tests):
+      if "skipped" in dirs:
+        dirs.remove("skipped")
+      result += [ os.path.join(dirname, f) for f in files ]
+    return [ os.path.relpath(f, self.tests) for f in result ]
+
+  def testWalk(self):
+    index = DiscoveryIndex(self.datadir)
+    self.assertEquals([os.path.join("a", "one.js")], self._ListFiles(index))
+    index.Save()
+    index = DiscoveryIndex(self.datadir)
+    self.assertEquals(2, len(index.directories))
+    # The skipped directory was never listed.
+    self.assertFalse(os.path.join(self.tests, "skipped") in index.directories)
+    self.assertEquals([os.path.join("a", "one.js")], self._ListFiles(index))
+    self.assertFalse(index.changed)
+
+  def testLookup(self):
+    shell = os.path.join(self.root, "shell")
+    self._Write(shell, "v1")
+    index = DiscoveryIndex(self.datadir)
+    self.assertEquals(None, index.Lookup(["--list"], [shell]))
+    index.Store(["--list"], [shell], ["test1"])
+    index.Save()
+    index = DiscoveryIndex(self.datadir)
+    self.assertEquals(["test1"], index.Lookup(["--list"], [shell]))
+    self._Write(shell, "v2-new")
+    self.assertEquals(None, index.Lookup(["--list"], [shell]))
+
+  def testGetFileRecord(self):
+    source = os.path.join(self.tests, "a", "one.js")
+    parsed = []
+    def Parse(path):
+      parsed.append(path)
+      return len(parsed)
+    index = DiscoveryIndex(self.datadir)
+    self.assertEquals(1, index.GetFileRecord(source, Parse))
+    index.Save()
+    index = DiscoveryIndex(self.datadir)
+    self.assertEquals(1, index.GetFileRecord(source, Parse))
+    self._Write(source, "// Flags: --foo")
+    self.assertEquals(2, index.GetFileRecord(source, Parse))
@@ -0,0 +1,270 @@
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import collections
+import errno
+import heapq
+import itertools
+import os
+import select
+import signal
+import subprocess
+import time
+
+try:
+  import fcntl
+except ImportError:
+  fcntl = None  # Not available on Windows, where the event loop isn't used.
+
+from . import commands
+from ..objects import output
+
+
+# Timer kinds.
+DEADLINE = 0
+GRACE = 1
+
+
+class RunningProcess(object):
+  def __init__(self, task, command, process):
+    self.task = task
+    self.command = command
+    self.process = process
+    self.stdout_fd = process.stdout.fileno()
+    self.stderr_fd = process.stderr.fileno()
+    self.buffers = {
+      self.stdout_fd: commands.StreamBuffer(command.max_output_size),
+      self.stderr_fd: commands.StreamBuffer(command.max_output_size),
+    }
+    self.pipes = {
+      process.stdout.fileno(): process.stdout,
+      process.stderr.fileno(): process.stderr,
+    }
+    self.exit_code = None
+    self.usage = None
+    self.timed_out = False
+
+  def IsDone(self):
+    return self.exit_code is not None and not self.pipes
+
+  def GetOutput(self):
+    stdout = self.buffers[self.stdout_fd].GetValue()
+    stderr = self.buffers[self.stderr_fd].GetValue()
+    return output.Output(self.exit_code, self.timed_out, stdout, stderr,
+                         self.usage)
+
+
+class EventLoopPool(object):
+  """Runs tasks concurrently on an event loop in the current process.
+
+  Instead of a function, imap_unordered takes a step function that returns a
+  generator. The generator yields commands.Command objects and gets the
+  output of each command sent back once its process has finished. The first
+  item that is not a command is the result of the task (see
+  commands.RunSteps for the synchronous equivalent).
+
+  At most num_workers tasks run at the same time. Processes are supervised
+  without a thread or process per task: their pipes are watched with poll(),
+  exits are signaled through SIGCHLD and timeouts are kept in a heap. Only
+  available on POSIX systems and in the main thread."""
+
+  def __init__(self, num_workers, cancel=None):
+    # |cancel| is accepted for compatibility with pool.Pool, terminate kills
+    # the running processes anyway.
+    self.num_workers = num_workers
+    self.pending = collections.deque()
+    self.running = {}  # Keyed by pid.
+    self.fds = {}  # Maps pipe fds to their RunningProcess.
+    self.timers = []  # Heap of (time, sequence number, kind, RunningProcess).
+    self.sequence = itertools.count()
+    self.active = 0  # Number of started, unfinished tasks.
+    self.results = collections.deque()
+    self.poller = None
+    self.wakeup_pipe = None
+    self.old_sigchld_handler = None
+    self.old_wakeup_fd = None
+    self.terminated = False
+
+  def imap_unordered(self, fn, gen):
+    """Maps step function "fn" to items in generator "gen" in an arbitrary
+    order. The items are expected to be lists of arguments to the function.
+    Returns a results iterator."""
+    try:
+      self._Setup()
+      gen = iter(gen)
+      self._Advance(fn, gen)
+      while self.active > 0:
+        self._RunOnce()
+        while self.results:
+          yield self.results.popleft()
+        self._Advance(fn, gen)
+    finally:
+      self.terminate()
+
+  def add(self, args):
+    """Adds an item to the work queue. Can be called dynamically while
+    processing the results from imap_unordered."""
+    self.pending.append(args)
+
+  def _Setup(self):
+    self.poller = select.poll()
+    self.wakeup_pipe = os.pipe()
+    for fd in self.wakeup_pipe:
+      flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+      fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+    self.poller.register(self.wakeup_pipe[0], select.POLLIN)
+    # SIGCHLD needs a Python handler for the wakeup fd to be written.
+    self.old_sigchld_handler = signal.signal(signal.SIGCHLD,
+                                             lambda signum, frame: None)
+    if self.old_sigchld_handler is None:
+      # The previous handler was not installed from Python.
+      self.old_sigchld_handler = signal.SIG_DFL
+    signal.siginterrupt(signal.SIGCHLD, False)
+    self.old_wakeup_fd = signal.set_wakeup_fd(self.wakeup_pipe[1])
+
+  def _Advance(self, fn, gen):
+    while self.active < self.num_workers:
+      if self.pending:
+        args = self.pending.popleft()
+      else:
+        try:
+          args = gen.next()
+        except StopIteration:
+          return
+      self.active += 1
+      self._StepTask(fn(*args), None, True)
+
+  def _StepTask(self, task, value, first=False):
+    try:
+      if first:
+        item = task.next()
+      else:
+        item = task.send(value)
+      if isinstance(item, commands.Command):
+        self._StartProcess(task, item)
+        return
+      self.results.append(item)
+    except Exception, e:
+      # Ignore items with unexpected exceptions.
+      print(">>> EXCEPTION: %s" % e)
+    self.active -= 1
+    task.close()
+
+  def _StartProcess(self, task, command):
+    process = commands.StartProcess(command.verbose, command.args,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+    running = RunningProcess(task, command, process)
+    self.running[process.pid] = running
+    for fd in running.pipes:
+      self.fds[fd] = running
+      self.poller.register(fd, select.POLLIN)
+    if command.timeout is not None:
+      self._AddTimer(command.timeout, DEADLINE, running)
+    # The process might have exited before the handler saw it.
+    self._Reap(running)
+
+  def _AddTimer(self, delay, kind, running):
+    heapq.heappush(self.timers, (time.time() + delay,
+                                 self.sequence.next(), kind, running))
+
+  def _RunOnce(self):
+    timeout = None
+    if self.timers:
+      timeout = max(0, self.timers[0][0] - time.time()) * 1000
+    try:
+      events = self.poller.poll(timeout)
+    except select.error, e:
+      if e.args[0] != errno.EINTR:
+        raise
+      events = []
+    for (fd, _) in events:
+      if fd == self.wakeup_pipe[0]:
+        self._DrainWakeupPipe()
+        for running in self.running.values():
+          self._Reap(running)
+      elif fd in self.fds:
+        self._Read(fd)
+    self._RunTimers()
+
+  def _DrainWakeupPipe(self):
+    try:
+      while os.read(self.wakeup_pipe[0], 4096):
+        pass
+    except OSError, e:
+      if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+        raise
+
+  def _Read(self, fd):
+    running = self.fds[fd]
+    data = os.read(fd, commands.READ_SIZE)
+    if data:
+      running.buffers[fd].Add(data)
+      return
+    self._ClosePipe(running, fd)
+    self._MaybeFinish(running)
+
+  def _ClosePipe(self, running, fd):
+    self.poller.unregister(fd)
+    del self.fds[fd]
+    running.pipes.pop(fd).close()
+
+  def _Reap(self, running):
+    try:
+      (pid, status, rusage) = os.wait4(running.process.pid, os.WNOHANG)
+    except OSError, e:
+      if e.errno != errno.EINTR:
+        raise
+      return
+    if pid == 0:
+      return
+    running.exit_code = commands.GetExitCode(status)
+    running.usage = output.ResourceUsage.FromRusage(
+        rusage, running.process.inherited_rss)
+    # Keep Popen from waiting for the process again.
+    running.process.returncode = running.exit_code
+    del self.running[pid]
+    if running.pipes:
+      # Grand children might keep the pipes open.
+      self._AddTimer(commands.KILL_GRACE_TIME, GRACE, running)
+    self._MaybeFinish(running)
+
+  def _RunTimers(self):
+    now = time.time()
+    while self.timers and self.timers[0][0] <= now:
+      (_, _, kind, running) = heapq.heappop(self.timers)
+      if running.IsDone():
+        continue
+      if kind == DEADLINE and running.exit_code is None:
+        running.timed_out = True
+        try:
+          commands.KillProcessWithID(running.process.pid)
+        except OSError:
+          pass  # The process exited in the meantime.
+      elif kind == GRACE:
+        for fd in running.pipes.keys():
+          self._ClosePipe(running, fd)
+        self._MaybeFinish(running)
+
+  def _MaybeFinish(self, running):
+    if running.IsDone():
+      self._StepTask(running.task, running.GetOutput())
+
+  def terminate(self):
+    if self.terminated or self.poller is None:
+      return
+    self.terminated = True
+    for running in self.running.values():
+      try:
+        commands.KillProcessWithID(running.process.pid)
+        running.process.wait()
+      except OSError:
+        pass
+    for running in set(self.fds.values()):
+      for pipe in running.pipes.values():
+        pipe.close()
+    signal.set_wakeup_fd(self.old_wakeup_fd)
+    signal.signal(signal.SIGCHLD, self.old_sigchld_handler)
+    for fd in self.wakeup_pipe:
+      os.close(fd)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest
+
+from commands import Command
+from eventloop import EventLoopPool
+
+def Run(x):
+  if x == 10:
+    raise Exception("Expected exception triggered by test.")
+  output = yield Command(["sh", "-c", "echo %d; exit %d" % (x, x % 2)])
+  yield (x, output.stdout.strip(), output.exit_code)
+
+def RunTwice(x):
+  first = yield Command(["echo", "first"])
+  second = yield Command(["echo", str(x)])
+  yield first.stdout + second.stdout
+
+def Sleep(timeout):
+  output = yield Command(["sleep", "10"], timeout=timeout)
+  yield output.timed_out
+
+class EventLoopPoolTest(unittest.TestCase):
+  def testNormal(self):
+    results = set()
+    pool = EventLoopPool(3)
+    for result in pool.imap_unordered(Run, [[x] for x in range(0, 10)]):
+      results.add(result)
+    self.assertEquals(set((x, str(x), x % 2) for x in range(0, 10)), results)
+
+  def testException(self):
+    results = set()
+    pool = EventLoopPool(3)
+    for result in pool.imap_unordered(Run, [[x] for x in range(0, 12)]):
+      # Item 10 will not appear in results due to an internal exception.
+      results.add(result[0])
+    expect = set(range(0, 12))
+    expect.remove(10)
+    self.assertEquals(expect, results)
+
+  def testAdd(self):
+    results = set()
+    pool = EventLoopPool(3)
+    for result in pool.imap_unordered(Run, [[x] for x in range(0, 10)]):
+      results.add(result[0])
+      if result[0] < 30:
+        pool.add([result[0] + 20])
+    self.assertEquals(set(range(0, 10) + range(20, 30) + range(40, 50)),
+                      results)
+
+  def testSteps(self):
+    pool = EventLoopPool(2)
+    results = list(pool.imap_unordered(RunTwice, [[1], [2]]))
+    self.assertEquals(["first\n1\n", "first\n2\n"], sorted(results))
+
+  def testTimeout(self):
+    pool = EventLoopPool(2)
+    results = list(pool.imap_unordered(Sleep, [[0.1], [0.2]]))
+    self.assertEquals([True, True], results)
@@ -26,51 +26,117 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
+import heapq
+import itertools
 import os
-import shutil
 import time
 
-from pool import Pool
+from pool import Pool, ThreadPool
+from . import admission
 from . import commands
+from . import eventloop
 from . import perfdata
+from . import resultcache
+from . import statusfile
 from . import utils
+from ..objects import output
+
+
+# Directory for data kept across runs, relative to the current directory.
+DATA_DIR = os.path.join("out", "testrunner_data")
+
+# Number of tests among which the longest-running is started first.
+PRIORITY_WINDOW = 500
+
+# With --adaptive-timeouts, tests time out after ADAPTIVE_TIMEOUT_FACTOR times
+# the 99th percentile of their recent durations, but not before
+# ADAPTIVE_TIMEOUT_FLOOR seconds. Tests need ADAPTIVE_TIMEOUT_MIN_SAMPLES
+# recorded durations for that.
+ADAPTIVE_TIMEOUT_FACTOR = 5
+ADAPTIVE_TIMEOUT_FLOOR = 5.0
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 5
+
+# With --time-budget, tests that failed within RECENT_FAILURE_TIME seconds
+# run first, then tests whose files changed within RECENT_CHANGE_TIME seconds.
+RECENT_FAILURE_TIME = 7 * 24 * 3600
+RECENT_CHANGE_TIME = 24 * 3600
+
+# Number of tests listed when the run stops early.
+NOT_RUN_LIMIT = 20
 
 
 class Job(object):
-  def __init__(self, command, dep_command, test_id, timeout, verbose):
+  def __init__(self, command, test_id, timeout, verbose, max_output_size,
+               deadline=None):
     self.command = command
-    self.dep_command = dep_command
     self.id = test_id
     self.timeout = timeout
     self.verbose = verbose
+    self.max_output_size = max_output_size
+    self.deadline = deadline  # Time the job is killed at, at the latest.
 
 
-def RunTest(job):
+def RunTestSteps(job):
+  """Step function running |job|, see commands.RunSteps. Yields the commands
+  to execute followed by the result: the job id, the output, the duration
+  and the start time."""
   start_time = time.time()
-  if job.dep_command is not None:
-    dep_output = commands.Execute(job.dep_command, job.verbose, job.timeout)
+  timeout = job.timeout
+  if job.deadline is not None:
+    timeout = max(0, min(timeout, job.deadline - start_time))
+  output = yield commands.Command(job.command, job.verbose, timeout,
+                                  job.max_output_size)
+  yield (job.id, output, time.time() - start_time, start_time)
+
+
+def RunTest(job):
+  return commands.RunSteps(RunTestSteps(job))
+
+
+# Pools that can be chosen to run the tests, see --executor, and the
+# function each of them runs the jobs with.
+EXECUTORS = {
+  "event": (eventloop.EventLoopPool, RunTestSteps),
+  "process": (Pool, RunTest),
+  "thread": (ThreadPool, RunTest),
+}
+
+
+class Dependency(object):
+  """A test that other tests require to have passed before they run, e.g. a
+  cctest writing the snapshot its dependents deserialize. It runs only once
+  per binary and flags and all its dependents share the result."""
+
+  def __init__(self, job_id):
+    self.id = job_id
+    self.output = None
+    self.dependents = []  # Tests waiting for the output.
+
+  def HasFailed(self):
     # TODO(jkummerow): We approximate the test suite specific function
     # IsFailureOutput() by just checking the exit code here. Currently
     # only cctests define dependencies, for which this simplification is
     # correct.
-    if dep_output.exit_code != 0:
-      return (job.id, dep_output, time.time() - start_time)
-  output = commands.Execute(job.command, job.verbose, job.timeout)
-  return (job.id, output, time.time() - start_time)
+    return self.output.exit_code != 0
+
 
 class Runner(object):
 
   def __init__(self, suites, progress_indicator, context):
-    self.datapath = os.path.join("out", "testrunner_data")
+    self.datapath = DATA_DIR
     self.perf_data_manager = perfdata.PerfDataManager(self.datapath)
     self.perfdata = self.perf_data_manager.GetStore(context.arch, context.mode)
-    self.perf_failures = False
     self.tests = [ t for s in suites for t in s.tests ]
-    if not context.no_sorting:
-      for t in self.tests:
-        t.duration = self.perfdata.FetchPerfData(t) or 1.0
-      self.tests.sort(key=lambda t: t.duration, reverse=True)
     self._CommonInit(len(self.tests), progress_indicator, context)
+    if context.result_cache:
+      self.result_cache = resultcache.ResultCache(self.datapath, context.arch,
+                                                  context.mode)
+      # Component builds load the library next to the shell.
+      self.shared_libraries = [
+          path for path in [
+              os.path.join(context.shell_dir, "lib", "libv8.so"),
+              os.path.join(context.shell_dir, "lib.target", "libv8.so")]
+          if os.path.exists(path) ]
 
   def _CommonInit(self, num_tests, progress_indicator, context):
     self.indicator = progress_indicator
@@ -82,26 +148,87 @@ class Runner(object):
     self.failed = []
     self.crashed = 0
     self.reran_tests = 0
+    self.result_cache = None
+    self.admission = None
+    self.adaptive_kills = 0  # Runs killed by the adaptive timeout.
+    self.adaptive_false_kills = 0  # Retried tests that finished after all.
+    self.adaptive_kill_time = 0.0  # Worker time spent in the killed runs.
+    self.deadline = None  # End of the --time-budget.
+    self.stop_reason = None  # Why the run stopped early, if it did.
+    self.not_run = []  # Tests without a result when the run stopped.
+    self.flakiness = None  # stress.FlakinessStats per test, if stressed.
+    self.status = None  # telemetry.RunStatus, if the run is monitored.
+    self.timeline = None  # tracing.JobTimeline, if the run is traced.
+    self.combined = None  # CombinedRunner this runner is part of, if any.
 
   def _RunPerfSafe(self, fun):
     try:
-      fun()
+      return fun()
     except Exception, e:
       print("PerfData exception: %s" % e)
-      self.perf_failures = True
 
-  def _GetJob(self, test):
-    command = self.GetCommand(test)
+  def _GetTimeout(self, test):
     timeout = self.context.timeout
     if ("--stress-opt" in test.flags or
         "--stress-opt" in self.context.mode_flags or
         "--stress-opt" in self.context.extra_flags):
       timeout *= 4
-    if test.dependency is not None:
-      dep_command = [ c.replace(test.path, test.dependency) for c in command ]
-    else:
-      dep_command = None
-    return Job(command, dep_command, test.id, timeout, self.context.verbose)
+    return timeout
+
+  def _GetPerfDataEntry(self, test):
+    if test.id not in self.perf_data_entries:
+      self.perf_data_entries[test.id] = self._RunPerfSafe(
+          lambda: self.perfdata.FetchPerfDataEntry(test))
+    return self.perf_data_entries[test.id]
+
+  def _GetAdaptiveTimeout(self, test, timeout):
+    """Returns the timeout derived from the durations of |test| in the perf
+    data, never more than |timeout|."""
+    entry = self._GetPerfDataEntry(test)
+    if not entry or len(entry.samples) < ADAPTIVE_TIMEOUT_MIN_SAMPLES:
+      return timeout
+    return min(timeout, max(ADAPTIVE_TIMEOUT_FLOOR,
+                            ADAPTIVE_TIMEOUT_FACTOR * entry.GetPercentile(99)))
+
+  def _GetJob(self, test, full_timeout=False):
+    timeout = self._GetTimeout(test)
+    # Reruns of failed tests always get the full timeout.
+    if self.context.adaptive_timeouts and not full_timeout and test.run == 1:
+      adaptive_timeout = self._GetAdaptiveTimeout(test, timeout)
+      if adaptive_timeout < timeout:
+        self.adaptive_timeouts[test.id] = (adaptive_timeout, timeout)
+        timeout = adaptive_timeout
+    return Job(self.GetCommand(test), test.id, timeout, self.context.verbose,
+               self.context.max_output_size, self.deadline)
+
+  def _RetryAfterAdaptiveTimeout(self, pool, test, output, duration):
+    """Runs |test| again with the full timeout if the adaptive timeout killed
+    it. Returns whether it did, in which case the result is not reported.
+    The result of the retry is reported whether or not it times out again.
+    The time of the killed run is what the retry costs on top of running
+    with the full timeout right away."""
+    if self.adaptive_timeouts.pop(test.id, None) and output.HasTimedOut():
+      self.adaptive_kills += 1
+      self.adaptive_kill_time += duration
+      self.adaptive_retries.add(test.id)
+      self._AddJob(pool, self._GetJob(test, full_timeout=True))
+      return True
+    if test.id in self.adaptive_retries:
+      self.adaptive_retries.remove(test.id)
+      if not output.HasTimedOut():
+        self.adaptive_false_kills += 1
+    return False
+
+  def _GetDependencyJob(self, test, job_id):
+    """Job running the dependency of |test| on its own, for when the test
+    producing it is not part of this run."""
+    command = [ c.replace(test.path, test.dependency)
+                for c in self.GetCommand(test) ]
+    return Job(command, job_id, self._GetTimeout(test), self.context.verbose,
+               self.context.max_output_size, self.deadline)
+
+  def _DependencyKey(self, test, path):
+    return (test.suite.name, path, tuple(test.flags))
 
   def _MaybeRerun(self, pool, test):
     if test.run <= self.context.rerun_failures_count + 1:
@@ -119,69 +246,481 @@ class Runner(object):
         # Rerun slow tests at most once.
         return
 
-      # Rerun this test.
-      test.duration = None
-      test.output = None
+      # Rerun this test. The result of the failed run is kept until the rerun
+      # finishes, in case the run stops before that.
       test.run += 1
-      pool.add([self._GetJob(test)])
+      self._AddJob(pool, self._GetJob(test))
       self.remaining += 1
 
   def Run(self, jobs):
     self.indicator.Starting()
     self._RunInternal(jobs)
+    exit_code = self._Done()
+    if self.admission:
+      self.admission.PrintSummary()
+    return exit_code
+
+  def _Done(self):
+    """Reports the end of the run. Returns the exit code."""
+    # Reruns of failed tests are not counted, the tests have a result.
+    self.not_run = [ t for t in self.tests if t.output is None and t.run == 1 ]
     self.indicator.Done()
-    if self.failed or self.remaining:
+    if self.not_run:
+      self._PrintNotRun()
+    if self.result_cache:
+      print("Result cache: %d hits, %d misses" %
+            (self.result_cache.hits, self.result_cache.misses))
+    if self.context.adaptive_timeouts:
+      print("Adaptive timeouts: %d runs killed early, %d tests finished "
+            "when retried with the full timeout, %.1fs spent in the killed "
+            "runs" %
+            (self.adaptive_kills, self.adaptive_false_kills,
+             self.adaptive_kill_time))
+    if self.failed or (self.remaining and not self.context.time_budget):
       return 1
     return 0
 
-  def _RunInternal(self, jobs):
-    pool = Pool(jobs)
-    test_map = {}
-    # TODO(machenbach): Instead of filling the queue completely before
-    # pool.imap_unordered, make this a generator that already starts testing
-    # while the queue is filled.
-    queue = []
-    queued_exception = None
+  def _PrintNotRun(self):
+    print("=== %d tests were not run: %s" %
+          (len(self.not_run), self.stop_reason))
+    for test in self.not_run[:NOT_RUN_LIMIT]:
+      print("  %s" % test.GetLabel())
+    if len(self.not_run) > NOT_RUN_LIMIT:
+      print("  ... %d more" % (len(self.not_run) - NOT_RUN_LIMIT))
+
+  def _PrioritizedTests(self):
+    """Yields the tests longest first according to the perf data. To not
+    delay the start of the first test, the order is only established within
+    a sliding window of PRIORITY_WINDOW tests."""
+    if self.context.no_sorting:
+      for test in self.tests:
+        yield test
+      return
+    window = []
     for test in self.tests:
+      if test.duration is None:
+        test.duration = self.perfdata.FetchPerfData(test) or 1.0
+      self.priorities[test.id] = (-test.duration,)
+      heapq.heappush(window, (-test.duration, test.id, test))
+      if len(window) >= PRIORITY_WINDOW:
+        yield heapq.heappop(window)[2]
+    while window:
+      yield heapq.heappop(window)[2]
+
+  def _GetSuiteLastChange(self, suite):
+    """Returns the last modification time of the files in the directory of
+    |suite|, which is read once per run."""
+    if suite.root not in self.suite_changes:
+      last_change = 0
+      for (dirpath, _, filenames) in os.walk(suite.root):
+        for filename in filenames:
+          try:
+            last_change = max(last_change,
+                              os.path.getmtime(os.path.join(dirpath, filename)))
+          except OSError:
+            pass  # Removed in the meantime.
+      self.suite_changes[suite.root] = last_change
+    return self.suite_changes[suite.root]
+
+  def _GetLastChange(self, test):
+    """Returns the last modification time of the files |test| reads, not
+    counting the shell. In a suite without recent changes, that's not
+    worked out per test."""
+    suite_change = self._GetSuiteLastChange(test.suite)
+    if time.time() - suite_change >= RECENT_CHANGE_TIME:
+      return suite_change
+    try:
+      files = [ arg for arg in test.suite.GetFlagsForTestCase(test,
+                                                              self.context)
+                if os.path.isfile(arg) ]
+      files += test.suite.GetInputFilesForTestCase(test)
+      return max([ os.path.getmtime(f) for f in files ] or [0])
+    except Exception:
+      # Reported once the job for the test is built.
+      return 0
+
+  def _ValuedTests(self):
+    """Yields the tests most likely to find a problem first: tests that failed
+    recently, then tests whose files changed recently, then the others. Each
+    group is ordered fastest first, as more tests in less time cover more.
+    Tests not expected to finish before the end of the time budget are
+    skipped."""
+    now = time.time()
+    # The perf data of all tests is read at once.
+    durations = self._RunPerfSafe(self.perfdata.FetchDurations) or {}
+    failures = self._RunPerfSafe(
+        lambda: self.perfdata.FetchRecentFailures(
+            now - RECENT_FAILURE_TIME)) or set()
+    order = []
+    for test in self.tests:
+      key = self.perfdata.GetKey(test)
+      test.duration = durations.get(key) or 1.0
+      if key in failures:
+        group = 0
+      elif now - self._GetLastChange(test) < RECENT_CHANGE_TIME:
+        group = 1
+      else:
+        group = 2
+      order.append((group, test.duration, test.id, test))
+    order.sort()
+    for (group, duration, _, test) in order:
+      self.priorities[test.id] = (group, duration)
+      if time.time() + duration > self.deadline:
+        self.stop_reason = ("time budget of %ds used up" %
+                            self.context.time_budget)
+        continue
+      yield test
+
+  def _Jobs(self):
+    """Generator feeding the pool. Commands are only constructed when the pool
+    asks for more work, so the first tests start while the jobs for the rest
+    are still being built.
+
+    A test with a dependency is held back until the dependency has passed. The
+    dependency is started when the first of its dependents comes up; the held
+    tests are added to the pool once its result arrives."""
+    if self.context.time_budget:
+      tests = self._ValuedTests()
+    else:
+      tests = self._PrioritizedTests()
+    for test in tests:
       assert test.id >= 0
-      test_map[test.id] = test
-      try:
-        queue.append([self._GetJob(test)])
-      except Exception, e:
-        # If this failed, save the exception and re-raise it later (after
-        # all other tests have had a chance to run).
-        queued_exception = e
+      self.test_map[test.id] = test
+      key = self._DependencyKey(test, test.path)
+      if key in self.producers and key in self.dependencies:
+        # Already started on behalf of a dependent test.
         continue
-    try:
-      it = pool.imap_unordered(RunTest, queue)
-      for result in it:
-        test = test_map[result[0]]
-        self.indicator.AboutToRun(test)
-        test.output = result[1]
-        test.duration = result[2]
-        has_unexpected_output = test.suite.HasUnexpectedOutput(test)
-        if has_unexpected_output:
-          self.failed.append(test)
-          if test.output.HasCrashed():
-            self.crashed += 1
+      if self._ReplayCachedResult(test):
+        # Dependents run the dependency on their own.
+        self.producers.pop(key, None)
+        continue
+      if test.dependency is not None:
+        key = self._DependencyKey(test, test.dependency)
+        dependency = self.dependencies.get(key)
+        if dependency is None:
+          job = self._StartDependency(key, test)
+          if job is not None:
+            yield [job]
+          dependency = self.dependencies[key]
+        if dependency.output is None:
+          dependency.dependents.append(test)
+        elif dependency.HasFailed():
+          self.failed_dependents.append((test, dependency))
         else:
-          self._RunPerfSafe(lambda: self.perfdata.UpdatePerfData(test))
-          self.succeeded += 1
-        self.remaining -= 1
-        self.indicator.HasRun(test, has_unexpected_output)
-        if has_unexpected_output:
-          # Rerun test failures after the indicator has processed the results.
-          self._MaybeRerun(pool, test)
+          job = self._GetJobSafe(test)
+          if job is not None:
+            yield [job]
+        continue
+      job = self._GetJobSafe(test)
+      if key in self.producers:
+        dependency = Dependency(test.id)
+        self.dependencies[key] = dependency
+        if job is None:
+          self._FailDependency(dependency, str(self.queued_exceptions[-1]))
+      if job is not None:
+        yield [job]
+
+  def _PredictMemory(self, job):
+    test = self.test_map.get(job.id)
+    if test is not None:
+      entry = self._GetPerfDataEntry(test)
+      if entry and entry.usage and entry.usage.max_rss is not None:
+        return entry.usage.max_rss
+    return admission.DEFAULT_MAX_RSS
+
+  def _Owner(self, job_id):
+    """Returns the runner the job |job_id| belongs to."""
+    if self.combined is None:
+      return self
+    return self.combined._GetRunner(job_id)
+
+  def _Admit(self, job):
+    """Returns whether |job| fits into the memory budget, see
+    admission.AdmissionControl. Jobs that don't are added to the pool
+    later."""
+    return (self.admission is None or
+            self.admission.Admit(job, self._Owner(job.id)._PredictMemory(job)))
+
+  def _AdmittedJobs(self):
+    """Generator feeding the pool with the jobs from self.pending_jobs. It
+    stops at the first job admission control holds back, so that no further
+    jobs are built while it waits. _JobFinished adds that job and the ones
+    after it to the pool. On a new pool, the held jobs come first, see
+    _RunPool."""
+    if self.admission:
+      for job in self.admission.Release():
+        self._Owner(job.id)._Dispatched(job)
+        yield [job]
+      if self.admission.held:
+        return
+    for args in self.pending_jobs:
+      if not self._Admit(args[0]):
+        return
+      self._Owner(args[0].id)._Dispatched(args[0])
+      yield args
+
+  def _AddJob(self, pool, job):
+    if self._Admit(job):
+      self._Owner(job.id)._Dispatched(job)
+      pool.add([job])
+
+  def _JobFinished(self, pool, job_id):
+    if self.admission is None:
+      return
+    self.admission.Finished(job_id)
+    for job in self.admission.Release():
+      self._Owner(job.id)._Dispatched(job)
+      pool.add([job])
+    # Resume where _AdmittedJobs stopped.
+    while not self.admission.held:
+      args = next(self.pending_jobs, None)
+      if args is None:
+        break
+      self._AddJob(pool, args[0])
+
+  def _Dispatched(self, job):
+    """Reports |job| as handed to the pool to the run status."""
+    if self.status:
+      self.status.Dispatched(job.id, self._GetJobLabel(job.id))
+
+  def _GetJobLabel(self, job_id):
+    test = self.test_map.get(job_id)
+    if test is not None:
+      return test.GetLabel()
+    return "(dependency)"
+
+  def _ReplayCachedResult(self, test):
+    """Reports |test| as passed without running it if it passed before with
+    the same inputs. Returns whether it did."""
+    if self.result_cache is None:
+      return False
+    try:
+      key = self.result_cache.GetKey(
+          self.GetCommand(test),
+          test.suite.GetInputFilesForTestCase(test) + self.shared_libraries,
+          test.outcomes)
+    except Exception:
+      # Reported once the job for the test is built.
+      return False
+    entry = self.result_cache.Lookup(key)
+    if entry is None:
+      self.cache_keys[test.id] = key
+      return False
+    self.indicator.AboutToRun(test)
+    test.output = output.Output(entry[1], False, "", "")
+    test.duration = entry[0]
+    self.succeeded += 1
+    self.remaining -= 1
+    self.indicator.HasRun(test, False)
+    return True
+
+  def _GetJobSafe(self, test):
+    try:
+      return self._GetJob(test)
+    except Exception, e:
+      # If this failed, save the exception and re-raise it later (after
+      # all other tests have had a chance to run).
+      self.queued_exceptions.append(e)
+      return None
+
+  def _StartDependency(self, key, test):
+    """Registers the dependency of |test| and returns the job producing it.
+    That is the job of the producing test if it is part of this run."""
+    producer = self.producers.get(key)
+    if producer is not None:
+      dependency = Dependency(producer.id)
+      self.dependencies[key] = dependency
+      self.test_map[producer.id] = producer
+      job = self._GetJobSafe(producer)
+      if job is None:
+        self._FailDependency(dependency, str(self.queued_exceptions[-1]))
+      return job
+    dependency = Dependency(self.dependency_ids.next())
+    self.dependencies[key] = dependency
+    self.dependency_jobs[dependency.id] = dependency
+    try:
+      return self._GetDependencyJob(test, dependency.id)
+    except Exception, e:
+      self.queued_exceptions.append(e)
+      self._FailDependency(dependency, str(e))
+      return None
+
+  def _FailDependency(self, dependency, message):
+    """Gives |dependency| a failed output with |message|, so that its
+    dependents fail instead of waiting for it forever."""
+    dependency.output = output.Output(1, False, "", message)
+    for test in dependency.dependents:
+      self.failed_dependents.append((test, dependency))
+    dependency.dependents = []
+
+  def _FailWaitingDependents(self):
+    """Fails the tests still waiting for a dependency after the pool ran out
+    of jobs. That happens if the job producing the dependency raised in the
+    worker, the pools drop such results."""
+    for dependency in self.dependencies.values():
+      if dependency.output is None and dependency.dependents:
+        self._FailDependency(dependency, "The dependency produced no result.")
+
+  def _ResolveDependency(self, pool, dependency, output):
+    if dependency.output is not None:
+      # The producing test is being rerun.
+      return
+    dependency.output = output
+    for test in dependency.dependents:
+      if dependency.HasFailed():
+        self.failed_dependents.append((test, dependency))
+      else:
+        job = self._GetJobSafe(test)
+        if job is not None:
+          self._AddJob(pool, job)
+    dependency.dependents = []
+
+  def _ProcessFailedDependents(self):
+    """Fails tests whose dependency failed with the output of the dependency,
+    without running them."""
+    while self.failed_dependents:
+      (test, dependency) = self.failed_dependents.pop(0)
+      self._ProcessResult(None, test, dependency.output, 0.0)
+
+  def _ProcessResult(self, pool, test, output, duration):
+    self.indicator.AboutToRun(test)
+    test.output = output
+    test.duration = duration
+    has_unexpected_output = test.suite.HasUnexpectedOutput(test)
+    if has_unexpected_output:
+      self.failed.append(test)
+      self._RunPerfSafe(lambda: self.perfdata.RecordFailure(test))
+      if test.output.HasCrashed():
+        self.crashed += 1
+    else:
+      self._RunPerfSafe(lambda: self.perfdata.UpdatePerfData(test))
+      self.succeeded += 1
+    cache_key = self.cache_keys.pop(test.id, None)
+    if (cache_key and test.run == 1 and not has_unexpected_output and
+        test.suite.GetOutcome(test) == statusfile.PASS):
+      self.result_cache.Store(cache_key, test.duration, test.output.exit_code)
+    self.remaining -= 1
+    self.indicator.HasRun(test, has_unexpected_output)
+    if has_unexpected_output and pool is not None:
+      # Rerun test failures after the indicator has processed the results.
+      self._MaybeRerun(pool, test)
+
+  def _FailedFast(self):
+    """Returns whether the run should stop because of --fail-fast."""
+    if self.context.fail_fast and len(self.failed) >= self.context.fail_fast:
+      self.stop_reason = "stopped after %d failures" % len(self.failed)
+      return True
+    return False
+
+  def _Setup(self, jobs):
+    """Initializes the state of a run on |jobs| workers."""
+    self.test_map = {}
+    self.queued_exceptions = []
+    self.dependencies = {}  # Keyed by _DependencyKey.
+    self.dependency_jobs = {}  # Dependencies run without their test.
+    # Dependency jobs don't belong to a test and use negative ids.
+    self.dependency_ids = itertools.count(-1, -1)
+    self.failed_dependents = []
+    self.cache_keys = {}  # Result cache keys of the tests to run.
+    self.perf_data_entries = {}  # Keyed by test id.
+    self.priorities = {}  # Test id -> sort key, lower keys run first.
+    self.suite_changes = {}  # Suite root -> last modification time.
+    # Test id -> (adaptive timeout, full timeout) of the running tests.
+    self.adaptive_timeouts = {}
+    self.adaptive_retries = set()  # Tests rerun with the full timeout.
+    if self.context.memory_budget:
+      self.admission = admission.AdmissionControl(self.context.memory_budget,
+                                                  jobs)
+    if self.context.time_budget:
+      self.deadline = time.time() + self.context.time_budget
+    self.pending_jobs = self._Jobs()  # Not yet handed to the pool.
+    required = set(self._DependencyKey(t, t.dependency)
+                   for t in self.tests if t.dependency is not None)
+    self.producers = {}  # Tests in this run that others depend on.
+    for test in self.tests:
+      key = self._DependencyKey(test, test.path)
+      if key in required:
+        self.producers[key] = test
+    if self.status:
+      # The run status predicts the remaining time from all durations.
+      for test in self.tests:
+        if test.duration is None:
+          test.duration = self._RunPerfSafe(
+              lambda: self.perfdata.FetchPerfData(test)) or 1.0
+
+  def _ProcessPoolResult(self, pool, result):
+    """Handles a result from the pool. Returns whether the run goes on."""
+    if self.status:
+      self.status.Finished(result[0])
+    if self.timeline is None:
+      return self._HandlePoolResult(pool, result)
+    self.timeline.Finished(self._GetJobLabel(result[0]), result[3], result[2],
+                           {"exit_code": result[1].exit_code,
+                            "timed_out": result[1].timed_out})
+    with self.timeline.writer.Phase("process result"):
+      return self._HandlePoolResult(pool, result)
+
+  def _HandlePoolResult(self, pool, result):
+    self._JobFinished(pool, result[0])
+    self._ProcessFailedDependents()
+    if result[0] in self.dependency_jobs:
+      self._ResolveDependency(
+          pool, self.dependency_jobs[result[0]], result[1])
+      return True
+    test = self.test_map[result[0]]
+    if self.deadline and time.time() >= self.deadline:
+      # Everything still running is cancelled. Tests killed because the
+      # time was up have no result.
+      self.stop_reason = ("time budget of %ds used up" %
+                          self.context.time_budget)
+      if not result[1].HasTimedOut():
+        self._ProcessResult(None, test, result[1], result[2])
+      return False
+    if self._RetryAfterAdaptiveTimeout(pool, test, result[1], result[2]):
+      return True
+    self._ProcessResult(pool, test, result[1], result[2])
+    key = self._DependencyKey(test, test.path)
+    if key in self.dependencies:
+      self._ResolveDependency(pool, self.dependencies[key], result[1])
+    return not self._FailedFast()
+
+  def _Cleanup(self):
+    self._RunPerfSafe(lambda: self.perf_data_manager.close())
+    if self.result_cache:
+      self.result_cache.Save()
+
+  def _RunPool(self, jobs, process_result):
+    """Runs the admitted jobs on a pool with |jobs| workers and passes each
+    result to |process_result| until it returns False. Returns whether the
+    pool ran out of work.
+
+    Pools drop the results of jobs that raise, so admission control would
+    count these jobs as running forever and eventually hold back all the
+    others. Once the pool has run out of work, such jobs are forgotten and
+    the held jobs run on a new pool."""
+    (pool_class, run_test) = EXECUTORS[self.context.executor]
+    while True:
+      pool = pool_class(jobs, cancel=commands.KillRunningProcesses)
+      try:
+        for result in pool.imap_unordered(run_test, self._AdmittedJobs()):
+          if not process_result(pool, result):
+            return False
+      finally:
+        pool.terminate()
+      if not self.admission or not self.admission.held:
+        return True
+      self.admission.ForgetInFlight()
+
+  def _RunInternal(self, jobs):
+    self._Setup(jobs)
+    try:
+      if self._RunPool(jobs, self._ProcessPoolResult):
+        self._FailWaitingDependents()
+      self._ProcessFailedDependents()
     finally:
-      pool.terminate()
-      self._RunPerfSafe(lambda: self.perf_data_manager.close())
-      if self.perf_failures:
-        # Nuke perf data in case of failures. This might not work on windows as
-        # some files might still be open.
-        print "Deleting perf test data due to db corruption."
-        shutil.rmtree(self.datapath)
-    if queued_exception:
-      raise queued_exception
+      self._Cleanup()
+    if self.queued_exceptions:
+      raise self.queued_exceptions[-1]
 
 
   def GetCommand(self, test):
@@ -200,6 +739,93 @@ class Runner(object):
     return cmd
 
 
+class CombinedRunner(object):
+  """Runs the tests of several Runners, typically one per arch and mode, on
+  one shared pool. The jobs of all runners are merged into one queue ordered
+  by their priority (see Runner.priorities), so that the pool stays busy
+  until the last configuration is done. Each runner keeps its own context,
+  progress indicator and results; the memory budget is shared."""
+
+  def __init__(self, runners):
+    self.runners = runners
+    # Test ids have to be unique across the runners to route the results.
+    test_id = 0
+    for runner in runners:
+      for test in runner.tests:
+        test.id = test_id
+        test_id += 1
+
+  def _GetRunner(self, job_id):
+    for runner in self.runners:
+      if job_id in runner.test_map or job_id in runner.dependency_jobs:
+        return runner
+
+  def _Jobs(self):
+    """Merges the jobs of the runners, taking the one with the lowest
+    priority key first. The jobs are admitted by the runners, see
+    Runner._AdmittedJobs."""
+    heads = []  # Heap of (priority, runner index, job, jobs).
+    def Advance(index, jobs):
+      for args in jobs:
+        runner = self.runners[index]
+        # Dependencies come first, their dependents wait for them.
+        priority = runner.priorities.get(args[0].id, ())
+        heapq.heappush(heads, (priority, index, args, jobs))
+        return
+    for (index, runner) in enumerate(self.runners):
+      Advance(index, runner._Jobs())
+    while heads:
+      (_, index, args, jobs) = heapq.heappop(heads)
+      yield args
+      Advance(index, jobs)
+
+  def Run(self, jobs):
+    first = self.runners[0]
+    for runner in self.runners:
+      runner.indicator.Starting()
+      runner._Setup(jobs)
+      runner.admission = first.admission
+      runner.dependency_ids = first.dependency_ids
+      runner.combined = self
+    # The runners take turns in pulling jobs from the merged queue.
+    pending_jobs = self._Jobs()
+    for runner in self.runners:
+      runner.pending_jobs = pending_jobs
+    def ProcessResult(pool, result):
+      runner = self._GetRunner(result[0])
+      if runner._ProcessPoolResult(pool, result):
+        return True
+      self._StopOthers(runner)
+      return False
+    try:
+      if first._RunPool(jobs, ProcessResult):
+        for runner in self.runners:
+          runner._FailWaitingDependents()
+      for runner in self.runners:
+        runner._ProcessFailedDependents()
+    finally:
+      for runner in self.runners:
+        runner._Cleanup()
+    for runner in self.runners:
+      if runner.queued_exceptions:
+        raise runner.queued_exceptions[-1]
+    exit_code = 0
+    for runner in self.runners:
+      print(">>> Results for %s.%s" % (runner.context.arch,
+                                       runner.context.mode))
+      exit_code = runner._Done() or exit_code
+    if first.admission:
+      first.admission.PrintSummary()
+    return exit_code
+
+  def _StopOthers(self, stopped):
+    for runner in self.runners:
+      if runner.stop_reason is None:
+        runner.stop_reason = ("%s in %s.%s" %
+                              (stopped.stop_reason, stopped.context.arch,
+                               stopped.context.mode))
+
+
 class BreakNowException(Exception):
   def __init__(self, value):
     self.value = value
@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import collections
+import shutil
+import tempfile
+import time
+import unittest
+
+import execution
+import statusfile
+from execution import Runner
+from progress import ProgressIndicator
+from stress import StressRunner
+from testsuite import TestSuite
+from ..objects.context import Context
+from ..objects.output import Output
+from ..objects.testcase import TestCase
+
+class FakeSuite(TestSuite):
+  def __init__(self, name):
+    super(FakeSuite, self).__init__(name, "/" + name)
+    self.built = []  # Paths of the tests commands were built for.
+    self.broken = set()  # Paths of the tests whose commands can't be built.
+
+  def GetFlagsForTestCase(self, testcase, context):
+    if testcase.path in self.broken:
+      raise Exception("Broken test %s" % testcase.path)
+    self.built.append(testcase.path)
+    return testcase.flags + [testcase.path]
+
+
+class FakePool(object):
+  """Runs one job at a time, jobs added by the runner before the next one
+  pulled from the generator. Like Pool, it drops the results of jobs that
+  raise."""
+
+  def __init__(self, num_workers, cancel=None):
+    self.added = collections.deque()
+
+  def add(self, args):
+    self.added.append(args)
+
+  def imap_unordered(self, fn, gen):
+    gen = iter(gen)
+    while True:
+      if self.added:
+        args = self.added.popleft()
+      else:
+        args = next(gen, None)
+        if args is None:
+          return
+      try:
+        result = fn(*args)
+      except Exception:
+        continue
+      yield result
+
+  def terminate(self):
+    pass
+
+
+class RunnerTest(unittest.TestCase):
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+    self.data_dir = execution.DATA_DIR
+    self.priority_window = execution.PRIORITY_WINDOW
+    execution.DATA_DIR = self.tempdir
+    execution.EXECUTORS["fake"] = (FakePool, self._Run)
+    self.runners = []
+    self.jobs = []  # Jobs in the order they ran.
+    self.outputs = {}  # Path -> list of outputs of the next runs.
+    self.raising = set()  # Paths of the tests whose jobs raise.
+
+  def tearDown(self):
+    for runner in self.runners:
+      runner._Cleanup()
+    execution.DATA_DIR = self.data_dir
+    execution.PRIORITY_WINDOW = self.priority_window
+    del execution.EXECUTORS["fake"]
+    shutil.rmtree(self.tempdir)
+
+  def _Run(self, job):
+    self.jobs.append(job)
+    if job.command[-1] in self.raising:
+      raise Exception("Worker failed")
+    outputs = self.outputs.get(job.command[-1])
+    output = Output(0, False, "", "")
+    if outputs:
+      output = outputs.pop(0)
+    return (job.id, output, 0.1, time.time())
+
+  def _Runner(self, tests, arch="x64", mode="release", no_sorting=False,
+              stress_runs=None, **options):
+    context = Context(arch, mode, "/out", [], False, 60, False, [], [], False,
+                      123, no_sorting, 0, 0, 1024, "fake", False, None, False,
+                      0, 0)
+    for (name, value) in options.items():
+      setattr(context, name, value)
+    suite = FakeSuite("fake")
+    suite.tests = tests
+    for (test_id, test) in enumerate(tests):
+      test.suite = suite
+      test.id = test_id
+    if stress_runs:
+      runner = StressRunner([suite], ProgressIndicator(), context, stress_runs)
+    else:
+      runner = Runner([suite], ProgressIndicator(), context)
+    self.runners.append(runner)
+    return runner
+
+  def testLazyOrder(self):
+    execution.PRIORITY_WINDOW = 3
+    tests = [ TestCase(None, "t%d" % d) for d in [1, 5, 2, 8, 3, 4] ]
+    for test in tests:
+      test.duration = float(test.path[1:])
+    runner = self._Runner(tests)
+    runner._Setup(1)
+    # Longest first within the window of the next three tests.
+    self.assertEquals(["t5", "t8", "t3", "t4", "t2", "t1"],
+                      [ args[0].command[-1] for args in runner._Jobs() ])
+
+  def testFirstJobBuiltFirst(self):
+    tests = [ TestCase(None, "t%d" % i) for i in range(10) ]
+    runner = self._Runner(tests)
+    runner._Setup(1)
+    jobs = runner._Jobs()
+    next(jobs)
+    # Only the command of the first job is built before it starts.
+    self.assertEquals(1, len(tests[0].suite.built))
+    self.assertEquals(9, len(list(jobs)))
+    self.assertEquals(10, len(tests[0].suite.built))
+
+  def testValuedOrder(self):
+    tests = [ TestCase(None, "t%d" % i) for i in range(3) ]
+    runner = self._Runner(tests, time_budget=1000)
+    for (path, duration) in [("t0", 3.0), ("t1", 1.0), ("t2", 2.0)]:
+      runner.perfdata.RawUpdatePerfData("fake.%s." % path, duration)
+    runner.perfdata.pending_failures["fake.t2."] = time.time()
+    runner.perfdata.Flush()
+    runner._Setup(1)
+    jobs = runner._Jobs()
+    # The recent failure first, then fastest first.
+    self.assertEquals("t2", next(jobs)[0].command[-1])
+    # The files of the tests are not looked at in an unchanged suite.
+    self.assertEquals(["t2"], tests[0].suite.built)
+    self.assertEquals(["t1", "t0"], [ args[0].command[-1] for args in jobs ])
+
+  def testAdmissionStopsPulling(self):
+    tests = [ TestCase(None, "t%d" % i) for i in range(10) ]
+    runner = self._Runner(tests, memory_budget=1024 * 1024)
+    runner._Setup(2)
+    jobs = [ args[0] for args in runner._AdmittedJobs() ]
+    # The third job waits for a free worker, the rest are not built yet.
+    self.assertEquals(["t0", "t1"], [ job.command[-1] for job in jobs ])
+    self.assertEquals(3, len(tests[0].suite.built))
+    pool = FakePool(2)
+    runner._JobFinished(pool, jobs[0].id)
+    self.assertEquals(["t2"], [ args[0].command[-1] for args in pool.added ])
+    self.assertEquals(4, len(tests[0].suite.built))
+
+  def testAdmissionRunsAll(self):
+    tests = [ TestCase(None, "t%d" % i) for i in range(10) ]
+    runner = self._Runner(tests, memory_budget=1024 * 1024)
+    self.assertEquals(0, runner.Run(2))
+    self.assertEquals(10, runner.succeeded)
+
+  def testAdmissionAfterRaise(self):
+    self.raising.update(["t0", "t1"])
+    tests = [ TestCase(None, "t%d" % i) for i in range(10) ]
+    runner = self._Runner(tests, memory_budget=1024 * 1024)
+    runner.Run(2)
+    # The jobs that raised don't hold back the others forever.
+    self.assertEquals(10, len(self.jobs))
+    self.assertEquals(8, runner.succeeded)
+    self.assertEquals(0, runner.admission.memory)
+
+  def _RunAdaptive(self, outputs, samples=5):
+    """Runs test "t" with adaptive timeouts, |samples| recorded durations of
+    0.1s and the given outputs of its runs. Returns the runner."""
+    self.outputs["t"] = outputs
+    runner = self._Runner([TestCase(None, "t")], adaptive_timeouts=True,
+                          rerun_failures_max=10)
+    for _ in range(samples):
+      runner.perfdata.RawUpdatePerfData("fake.t.", 0.1)
+    runner.perfdata.Flush()
+    runner.Run(1)
+    return runner
+
+  def _Timeouts(self):
+    return [ job.timeout for job in self.jobs ]
+
+  def testAdaptiveTimeoutFalseKill(self):
+    runner = self._RunAdaptive([Output(-15, True, "", ""),
+                                Output(0, False, "", "")])
+    # Killed at the floor, then retried with the full timeout.
+    self.assertEquals([execution.ADAPTIVE_TIMEOUT_FLOOR, 60], self._Timeouts())
+    self.assertEquals((1, 1), (runner.adaptive_kills,
+                               runner.adaptive_false_kills))
+    # The killed run took the 0.1s every fake run takes.
+    self.assertAlmostEquals(0.1, runner.adaptive_kill_time)
+    self.assertEquals(1, runner.succeeded)
+    self.assertEquals([], runner.failed)
+
+  def testAdaptiveTimeoutConfirmed(self):
+    runner = self._RunAdaptive([Output(-15, True, "", "")] * 3)
+    # The retry times out as well and is reported. The rerun of the failed
+    # test gets the full timeout.
+    self.assertEquals([execution.ADAPTIVE_TIMEOUT_FLOOR, 60, 60],
+                      self._Timeouts())
+    self.assertEquals((1, 0), (runner.adaptive_kills,
+                               runner.adaptive_false_kills))
+    self.assertEquals(2, len(runner.failed))
+    self.assertTrue(runner.tests[0].output.HasTimedOut())
+
+  def testAdaptiveTimeoutWithoutSamples(self):
+    runner = self._RunAdaptive([Output(-15, True, "", "")] * 2, samples=4)
+    self.assertEquals([60, 60], self._Timeouts())
+    self.assertEquals(0, runner.adaptive_kills)
+
+  def _RunDependencies(self, paths, **options):
+    """Runs tests "a" and "b" depending on "p", and those of |paths|. Returns
+    the runner."""
+    tests = [ TestCase(None, "a", dependency="p"),
+              TestCase(None, "b", dependency="p") ]
+    tests += [ TestCase(None, path) for path in paths ]
+    runner = self._Runner(tests, no_sorting=True, **options)
+    runner.Run(1)
+    return runner
+
+  def _Ran(self):
+    return [ job.command[-1] for job in self.jobs ]
+
+  def testSharedProducer(self):
+    runner = self._RunDependencies(["p"])
+    self.assertEquals(["p", "a", "b"], self._Ran())
+    self.assertEquals(3, runner.succeeded)
+    self.assertEquals(0, runner.remaining)
+
+  def testFailingProducer(self):
+    self.outputs["p"] = [Output(1, False, "", "")]
+    runner = self._RunDependencies(["p"])
+    # The dependents fail with the output of the producer, without running.
+    self.assertEquals(["p"], self._Ran())
+    self.assertEquals(["a", "b", "p"],
+                      sorted(t.path for t in runner.failed))
+    self.assertEquals(0, runner.remaining)
+
+  def testProducerNotSelected(self):
+    runner = self._RunDependencies([])
+    # The dependency runs on its own with the flags of the first dependent.
+    self.assertEquals(["p", "a", "b"], self._Ran())
+    self.assertTrue(self.jobs[0].id < 0)
+    self.assertEquals(2, runner.succeeded)
+    self.assertEquals(0, runner.remaining)
+
+  def testProducerNotBuilt(self):
+    tests = [ TestCase(None, "a", dependency="p"), TestCase(None, "p") ]
+    runner = self._Runner(tests, no_sorting=True)
+    tests[0].suite.broken.add("p")
+    self.assertRaises(Exception, runner.Run, 1)
+    self.assertEquals(["a"], [ t.path for t in runner.failed ])
+    self.assertEquals("Broken test p", tests[0].output.stderr)
+    self.assertEquals(1, runner.remaining)
+
+  def testProducerRaises(self):
+    self.raising.add("p")
+    runner = self._RunDependencies(["p"])
+    self.assertEquals(["p"], self._Ran())
+    self.assertEquals(["a", "b"], sorted(t.path for t in runner.failed))
+    # The producer itself has no result.
+    self.assertEquals(1, runner.remaining)
+
+  def _Combined(self, tests_a, tests_b, **options):
+    """Returns a CombinedRunner for two runners with the tests named in
+    |tests_a| and |tests_b|, and the given durations."""
+    runners = []
+    for (arch, tests) in [("x64", tests_a), ("ia32", tests_b)]:
+      cases = []
+      for (path, duration) in tests:
+        cases.append(TestCase(None, path))
+        cases[-1].duration = duration
+      runners.append(self._Runner(cases, arch=arch, **options))
+    return execution.CombinedRunner(runners)
+
+  def testCombinedOrder(self):
+    combined = self._Combined([("a1", 1.0), ("a3", 3.0)],
+                              [("b2", 2.0), ("b4", 4.0)])
+    self.assertEquals(0, combined.Run(1))
+    # Longest first across both configurations.
+    self.assertEquals(["b4", "a3", "b2", "a1"], self._Ran())
+
+  def testCombinedResults(self):
+    self.outputs["b2"] = [Output(1, False, "", "")]
+    combined = self._Combined([("a1", 1.0), ("a2", 2.0)],
+                              [("b1", 1.0), ("b2", 2.0)])
+    self.assertEquals(1, combined.Run(1))
+    (runner_a, runner_b) = combined.runners
+    self.assertEquals((2, []), (runner_a.succeeded, runner_a.failed))
+    self.assertEquals(1, runner_b.succeeded)
+    self.assertEquals(["b2"], [ t.path for t in runner_b.failed ])
+
+  def testCombinedStop(self):
+    self.outputs["b4"] = [Output(1, False, "", "")]
+    combined = self._Combined([("a1", 1.0), ("a3", 3.0)],
+                              [("b2", 2.0), ("b4", 4.0)], fail_fast=1)
+    combined.Run(1)
+    # The first failure stops all configurations.
+    self.assertEquals(["b4"], self._Ran())
+    (runner_a, runner_b) = combined.runners
+    self.assertEquals("stopped after 1 failures", runner_b.stop_reason)
+    self.assertEquals("stopped after 1 failures in ia32.release",
+                      runner_a.stop_reason)
+    self.assertEquals(2, runner_a.remaining)
+
+  def testStressExpectedFailures(self):
+    self.outputs["t"] = [Output(1, False, "", ""), Output(0, False, "", ""),
+                         Output(1, False, "", "")]
+    test = TestCase(None, "t")
+    test.outcomes = [statusfile.PASS, statusfile.FAIL]
+    runner = self._Runner([test], stress_runs=3)
+    self.assertEquals(0, runner.Run(1))
+    # The failures are counted although the status file allows them.
+    self.assertEquals((3, 2), (runner.flakiness[0].runs,
+                               runner.flakiness[0].failures))
+
+  def testStressDependencies(self):
+    tests = [ TestCase(None, "a", dependency="p"), TestCase(None, "p"),
+              TestCase(None, "c") ]
+    runner = self._Runner(tests, stress_runs=2)
+    runner.Run(1)
+    # Neither the producer nor its dependents are stressed.
+    self.assertEquals(["c", "c"], self._Ran())
+    self.assertEquals(["c"], [ stats.test.path for stats in runner.flakiness ])
+    self.assertEquals(2, runner.not_stressed)
+
+
+if __name__ == '__main__':
+  unittest.main()
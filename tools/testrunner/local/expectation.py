@@ -0,0 +1,91 @@
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Expected output of the message and webkit tests. Expectation files are
+read and compiled once per run, while the output of every variant and rerun
+of a test is compared against them."""
+
+import os
+
+
+_expectations = {}  # Path -> ((mtime, size), Expectation).
+
+
+# Prefixes of lines that are not test output.
+IGNORED_PREFIXES = ("==", "**", "ANDROID",
+                    # These two and the three patterns below appear in
+                    # normal Native Client output.
+                    "DEBUG MODE ENABLED", "tools/nacl-run.py")
+
+
+def IgnoreLine(string):
+  """Ignore empty lines, valgrind output, Android output."""
+  if not string: return True
+  return (string.startswith(IGNORED_PREFIXES) or
+          string.find("BYPASSING ALL ACL CHECKS") > 0 or
+          string.find("Native Client module will be loaded") > 0 or
+          string.find("NaClHostDescOpen:") > 0)
+
+
+def _WildcardMatcher(segments):
+  """Returns a function matching lines that consist of |segments| in order,
+  separated by anything."""
+  first = segments[0]
+  last = segments[-1]
+  middle = segments[1:-1]
+  min_length = len(first) + len(last)
+  def Match(line):
+    if (len(line) < min_length or not line.startswith(first) or
+        not line.endswith(last)):
+      return False
+    # The leftmost occurrence of each segment leaves the most room for the
+    # rest.
+    position = len(first)
+    end = len(line) - len(last)
+    for segment in middle:
+      position = line.find(segment, position, end)
+      if position < 0:
+        return False
+      position += len(segment)
+    return True
+  return Match
+
+
+class Expectation(object):
+  """Expected output lines, each compiled into a function that matches an
+  actual line. With a |wildcard|, expected lines match any text in its
+  place; other lines are compared literally."""
+
+  def __init__(self, lines, wildcard=None):
+    self.matchers = []
+    for line in lines:
+      if wildcard and wildcard in line:
+        self.matchers.append(_WildcardMatcher(line.split(wildcard)))
+      else:
+        self.matchers.append(line.__eq__)
+
+  def Matches(self, actual_lines):
+    """Returns whether the iterable |actual_lines| matches the expected lines
+    one by one, consuming it only up to the first mismatch."""
+    matchers = self.matchers
+    count = len(matchers)
+    index = 0
+    for line in actual_lines:
+      if index == count or not matchers[index](line):
+        return False
+      index += 1
+    return index == count
+
+
+def GetExpectation(path, parse_fun):
+  """Returns the Expectation |parse_fun| compiles from the file at |path|,
+  calling it only once while the file is unchanged."""
+  st = os.stat(path)
+  version = (st.st_mtime, st.st_size)
+  entry = _expectations.get(path)
+  if entry and entry[0] == version:
+    return entry[1]
+  expectation = parse_fun(path)
+  _expectations[path] = (version, expectation)
+  return expectation
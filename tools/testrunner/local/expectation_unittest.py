@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest
+
+from expectation import Expectation, IgnoreLine
+
+class ExpectationTest(unittest.TestCase):
+  def testWildcards(self):
+    expected = Expectation(["a.js:1: *Error: *", "  foo(*);", "*"],
+                           wildcard="*")
+    self.assertTrue(expected.Matches(
+        ["a.js:1: TypeError: x", "  foo(1, 2);", ""]))
+    self.assertTrue(expected.Matches(["a.js:1: Error: ", "  foo();", "x"]))
+    self.assertFalse(expected.Matches(["a.js:1: Error:", "  foo();", "x"]))
+    self.assertFalse(expected.Matches(["b.js:1: Error: x", "  foo();", "x"]))
+    # Segments must not overlap.
+    self.assertFalse(Expectation(["ab*ba"], wildcard="*").Matches(["aba"]))
+    self.assertFalse(expected.Matches(["a.js:1: Error: x", "  foo();"]))
+
+  def testLiteral(self):
+    expected = Expectation(["PASS *"])
+    self.assertTrue(expected.Matches(iter(["PASS *"])))
+    self.assertFalse(expected.Matches(["PASS x"]))
+    self.assertFalse(expected.Matches(["PASS *", "PASS *"]))
+
+  def testEarlyExit(self):
+    lines = iter(["a", "b", "c"])
+    self.assertFalse(Expectation(["x", "b", "c"]).Matches(lines))
+    self.assertEquals(["b", "c"], list(lines))
+
+  def testIgnoreLine(self):
+    self.assertTrue(IgnoreLine(""))
+    self.assertTrue(IgnoreLine("==123== valgrind"))
+    self.assertTrue(IgnoreLine("x NaClHostDescOpen: y"))
+    self.assertFalse(IgnoreLine("NaClHostDescOpen: y"))
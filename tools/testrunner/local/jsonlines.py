@@ -0,0 +1,102 @@
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Test results as JSON lines, one record per line. Unlike the JSON list
+written by --json-test-results, the file is appended to as results arrive,
+so neither the writer nor the reader needs to keep all of it in memory.
+
+Each record belongs to a section, the results of one arch and mode in one
+run:
+  {"section": <id>, "start": {"arch": <arch>, "mode": <mode>}}  first,
+  {"section": <id>, "result": <result>}  for each result, and
+  {"section": <id>, "summary": <the other fields of the section>}  at the end.
+"""
+
+import itertools
+import json
+import os
+import socket
+import time
+
+
+# Makes the section ids of one process unique.
+_section_numbers = itertools.count()
+
+
+class JsonLinesWriter(object):
+  """Appends the records of one section to |filename|. Every record is
+  written right away, so the file is complete up to the last result even if
+  the run is interrupted."""
+
+  def __init__(self, filename, arch, mode):
+    self.fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0666)
+    self.section = "%s-%d-%d-%d" % (socket.gethostname(), os.getpid(),
+                                    int(time.time()),
+                                    _section_numbers.next())
+    self._Write({"start": {"arch": arch, "mode": mode}})
+
+  def _Write(self, record):
+    record["section"] = self.section
+    # Unbuffered writes to a descriptor opened with O_APPEND always go to the
+    # end of the file, also with other processes appending. A line is only
+    # guaranteed to be written in one piece up to PIPE_BUF bytes though;
+    # longer ones may be split and mixed with lines of other writers, which
+    # readers then skip as broken.
+    data = json.dumps(record) + "\n"
+    while data:
+      data = data[os.write(self.fd, data):]
+
+  def WriteResult(self, result):
+    self._Write({"result": result})
+
+  def Close(self, summary):
+    self._Write({"summary": summary})
+    os.close(self.fd)
+
+
+def ReadSections(filenames):
+  """Returns the sections in the JSON lines files |filenames| in the format
+  of --json-test-results, i.e. a list of dicts with the results of each
+  section under "results". Sections are ordered by the time they ended;
+  those of interrupted runs come last and are marked "incomplete". Broken
+  lines, e.g. a partially written last line, are skipped."""
+  starts = []  # (Section id, start) in the order they were written.
+  results = {}  # Section id -> list of results.
+  summaries = []  # (Section id, summary) in the order they were written.
+  for filename in filenames:
+    with open(filename) as f:
+      for line in f:
+        try:
+          record = json.loads(line)
+        except ValueError:
+          continue
+        section = record.get("section")
+        if "start" in record:
+          starts.append((section, record["start"]))
+        elif "result" in record:
+          results.setdefault(section, []).append(record["result"])
+        elif "summary" in record:
+          summaries.append((section, record["summary"]))
+  sections = []
+  complete = set()
+  for (section, summary) in summaries:
+    summary["results"] = results.get(section, [])
+    sections.append(summary)
+    complete.add(section)
+  for (section, start) in starts:
+    if section not in complete:
+      start["results"] = results.get(section, [])
+      start["incomplete"] = True
+      sections.append(start)
+  return sections
+
+
+def LoadResults(filename):
+  """Returns the sections in a file written by --json-test-results, either
+  in JSON or in JSON lines."""
+  if filename.endswith(".jsonl"):
+    return ReadSections([filename])
+  with open(filename) as f:
+    # Buildbot might start out with an empty file.
+    return json.loads(f.read() or "[]")
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from jsonlines import JsonLinesWriter, LoadResults
+
+class JsonLinesTest(unittest.TestCase):
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def testSections(self):
+    filename = os.path.join(self.tempdir, "results.jsonl")
+    interrupted = JsonLinesWriter(filename, "ia32", "debug")
+    interrupted.WriteResult({"name": "mjsunit/b"})
+    writer = JsonLinesWriter(filename, "x64", "release")
+    writer.WriteResult({"name": "mjsunit/a"})
+    interrupted.WriteResult({"name": "mjsunit/c"})
+    writer.Close({"arch": "x64", "mode": "release", "max_rss_tests": []})
+    with open(filename, "a") as f:
+      f.write('{"section": "partial", "res')
+    sections = LoadResults(filename)
+    self.assertEquals(2, len(sections))
+    self.assertEquals({"arch": "x64", "mode": "release", "max_rss_tests": [],
+                       "results": [{"name": "mjsunit/a"}]}, sections[0])
+    self.assertEquals({"arch": "ia32", "mode": "debug", "incomplete": True,
+                       "results": [{"name": "mjsunit/b"},
+                                   {"name": "mjsunit/c"}]}, sections[1])
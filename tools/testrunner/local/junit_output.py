@@ -26,13 +26,82 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
+import atexit
+import shutil
+import tempfile
 import xml.etree.ElementTree as xml
 
 
 class JUnitTestOutput:
-  def __init__(self, test_suite_name):
-    self.root = xml.Element("testsuite")
-    self.root.attrib["name"] = test_suite_name
+  """Writes a JUnit XML document to |file| one test case at a time, so that
+  memory use doesn't grow with the number of tests and the results so far
+  survive if the runner dies. Each configuration gets its own <testsuite>
+  element, see AddSuite. The document is closed by Finish or, if the run is
+  interrupted, when the process exits."""
+
+  def __init__(self, file):
+    self.file = file
+    self.finished = False
+    self.suites = []  # JUnitTestSuites not completely written to the file.
+    self.file.write("<?xml version='1.0' encoding='UTF-8'?>\n<testsuites>\n")
+    self.file.flush()
+    atexit.register(self.Finish)
+
+  def AddSuite(self, name):
+    """Returns a JUnitTestSuite named |name|. The test cases of the first
+    unfinished suite go to the file right away. Suites run at the same time
+    are spooled to a temporary file until the suites before them are
+    finished."""
+    out = self.file
+    if self.suites:
+      out = tempfile.TemporaryFile()
+    suite = JUnitTestSuite(self, name, out)
+    self.suites.append(suite)
+    return suite
+
+  def _SuiteFinished(self):
+    """Copies the spooled suites to the file that are next in line."""
+    while self.suites and self.suites[0].finished:
+      self.suites.pop(0)
+      if self.suites:
+        self.suites[0].StartStreaming(self.file)
+
+  def Finish(self):
+    if self.finished:
+      return
+    for suite in list(self.suites):
+      suite.Finish()
+    self.finished = True
+    self.file.write("</testsuites>\n")
+    self.file.flush()
+
+
+class JUnitTestSuite:
+  """The <testsuite> element of one configuration, written to |out|. See
+  JUnitTestOutput.AddSuite."""
+
+  def __init__(self, output, name, out):
+    self.output = output
+    self.out = out
+    self.finished = False
+    root = xml.Element("testsuite")
+    root.attrib["name"] = name
+    # The opening tag, without the XML declaration and the closing tag.
+    start = xml.tostring(root, "UTF-8").split("?>\n", 1)[-1]
+    self._Write(start.rsplit(" />", 1)[0] + ">\n")
+
+  def _Write(self, text):
+    self.out.write(text)
+    self.out.flush()
+
+  def StartStreaming(self, file):
+    """Moves the test cases spooled so far to |file| and writes the next
+    ones there."""
+    self.out.seek(0)
+    shutil.copyfileobj(self.out, file)
+    self.out.close()
+    self.out = file
+    self.out.flush()
 
   def HasRunTest(self, test_name, test_duration, test_failure):
     testCaseElement = xml.Element("testcase")
@@ -42,7 +111,13 @@ class JUnitTestOutput:
       failureElement = xml.Element("failure")
       failureElement.text = test_failure
       testCaseElement.append(failureElement)
-    self.root.append(testCaseElement)
+    # Without the XML declaration, it starts the document only.
+    self._Write(xml.tostring(testCaseElement, "UTF-8").split("?>\n", 1)[-1] +
+                "\n")
 
-  def FinishAndWrite(self, file):
-    xml.ElementTree(self.root).write(file, "UTF-8")
+  def Finish(self):
+    if self.finished:
+      return
+    self.finished = True
+    self._Write("</testsuite>\n")
+    self.output._SuiteFinished()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import StringIO
+import unittest
+import xml.etree.ElementTree as xml
+
+from junit_output import JUnitTestOutput
+
+class JUnitTestOutputTest(unittest.TestCase):
+  def testStreaming(self):
+    out = StringIO.StringIO()
+    output = JUnitTestOutput(out)
+    suite = output.AddSuite("v8tests")
+    suite.HasRunTest(["mjsunit/a", "--flag"], 1.23456, "")
+    # The test case is written right away.
+    self.assertTrue(out.getvalue().endswith(
+        '<testcase name="mjsunit/a --flag" time="1.235" />\n'))
+    suite.HasRunTest(["mjsunit/b"], 0.5, "stdout:\n<&>")
+    suite.Finish()
+    output.Finish()
+    output.Finish()
+    root = xml.fromstring(out.getvalue())
+    self.assertEquals(1, len(root))
+    self.assertEquals("v8tests", root[0].attrib["name"])
+    self.assertEquals(2, len(root[0]))
+    self.assertEquals("stdout:\n<&>", root[0][1].find("failure").text)
+
+  def testSuitesRunTogether(self):
+    out = StringIO.StringIO()
+    output = JUnitTestOutput(out)
+    suites = [ output.AddSuite("v8tests %s" % c) for c in ["x64", "ia32"] ]
+    for i in range(3):
+      suites[i % 2].HasRunTest(["t%d" % i], 0.1, "")
+    # The second suite waits for the first one.
+    self.assertFalse("ia32" in out.getvalue())
+    suites[1].Finish()
+    suites[0].HasRunTest(["t3"], 0.1, "")
+    suites[0].Finish()
+    self.assertTrue(out.getvalue().endswith("</testsuite>\n"))
+    output.Finish()
+    root = xml.fromstring(out.getvalue())
+    self.assertEquals(["v8tests x64", "v8tests ia32"],
+                      [ suite.attrib["name"] for suite in root ])
+    self.assertEquals([["t0", "t2", "t3"], ["t1"]],
+                      [ [ t.attrib["name"] for t in suite ]
+                        for suite in root ])
+
+  def testInterrupted(self):
+    out = StringIO.StringIO()
+    output = JUnitTestOutput(out)
+    suites = [ output.AddSuite("v8tests %s" % c) for c in ["x64", "ia32"] ]
+    suites[1].HasRunTest(["t0"], 0.1, "")
+    output.Finish()
+    root = xml.fromstring(out.getvalue())
+    self.assertEquals([0, 1], [ len(suite) for suite in root ])
@@ -26,39 +26,185 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
+
+import math
 import os
 import shelve
+import sqlite3
+import subprocess
 import threading
+import time
+
+from ..objects import output
+
+
+# Pending results are written at most this many seconds apart.
+FLUSH_INTERVAL = 10.0
+
+# Number of most recent durations kept per test for percentiles.
+MAX_SAMPLES = 100
+
+# Columns holding the output.ResourceUsage of the last result.
+USAGE_COLUMNS = [
+  ("max_rss", "INTEGER"),
+  ("user_time", "REAL"),
+  ("system_time", "REAL"),
+  ("minor_faults", "INTEGER"),
+  ("major_faults", "INTEGER"),
+]
+
+# Seconds to wait for another process writing the same database.
+LOCK_TIMEOUT = 60.0
+
+# Parts of the messages of the sqlite3.DatabaseErrors raised for a corrupt
+# file. Other errors, e.g. a database locked by another process, are not
+# fixed by discarding the file.
+CORRUPTION_MESSAGES = ("not a database", "malformed")
+
+BASE_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
+        __file__)))))
+
+revision = None
+
+
+def GetRevision():
+  """Returns the revision of the checkout the tests run from, if known."""
+  global revision
+  if revision is None:
+    try:
+      with open(os.devnull, "w") as devnull:
+        process = subprocess.Popen(["git", "rev-parse", "--short", "HEAD"],
+                                   cwd=BASE_DIR, stdout=subprocess.PIPE,
+                                   stderr=devnull)
+        revision = process.communicate()[0].strip()
+    except OSError:
+      revision = ""
+  return revision or None
 
 
 class PerfDataEntry(object):
   def __init__(self):
     self.avg = 0.0
     self.count = 0
+    self.variance = 0.0
+    self.samples = []  # The most recent durations, oldest first.
+    self.revision = None  # Revision the last result was seen at.
+    self.usage = None  # output.ResourceUsage of the last result, if known.
 
   def AddResult(self, result):
     kLearnRateLimiter = 99  # Greater value means slower learning.
     # We use an approximation of the average of the last 100 results here:
     # The existing average is weighted with kLearnRateLimiter (or less
-    # if there are fewer data points).
+    # if there are fewer data points). The variance is weighted likewise.
     effective_count = min(self.count, kLearnRateLimiter)
-    self.avg = self.avg * effective_count + result
+    weight = 1.0 / (effective_count + 1)
+    delta = result - self.avg
+    self.avg += weight * delta
+    self.variance = (1 - weight) * (self.variance + weight * delta * delta)
     self.count = effective_count + 1
-    self.avg /= self.count
+    self.samples = (self.samples + [result])[-MAX_SAMPLES:]
+
+  def GetPercentile(self, percent):
+    """Returns the duration that |percent| percent of the recent results
+    didn't exceed."""
+    if not self.samples:
+      return self.avg
+    samples = sorted(self.samples)
+    index = int(math.ceil(percent / 100.0 * len(samples))) - 1
+    return samples[max(0, index)]
+
+  @property
+  def p95(self):
+    return self.GetPercentile(95)
 
 
 class PerfDataStore(object):
+  """Durations of the tests for one arch and mode, kept in an SQLite
+  database. Results are collected in memory and written in batches. Several
+  processes can read and update the same database at the same time."""
+
   def __init__(self, datadir, arch, mode):
-    filename = os.path.join(datadir, "%s.%s.perfdata" % (arch, mode))
-    self.database = shelve.open(filename, protocol=2)
-    self.closed = False
+    filename = os.path.join(datadir, "%s.%s.perfdb" % (arch, mode))
     self.lock = threading.Lock()
+    # Maps keys to the (duration, usage) pairs not yet written.
+    self.pending = {}
+    self.pending_failures = {}  # Maps keys to the time of the last failure.
+    self.last_flush = time.time()
+    self.closed = False
+    try:
+      self.database = self._Open(filename)
+    except sqlite3.DatabaseError, e:
+      if not any(message in str(e) for message in CORRUPTION_MESSAGES):
+        raise
+      # Only drop the broken database, other data is kept.
+      print("Discarding broken perf data %s: %s" % (filename, e))
+      # On Windows, rename fails if the target exists.
+      if os.path.exists(filename + ".broken"):
+        os.remove(filename + ".broken")
+      os.rename(filename, filename + ".broken")
+      self.database = self._Open(filename)
+    self._Migrate(os.path.join(datadir, "%s.%s.perfdata" % (arch, mode)))
+
+  def _Open(self, filename):
+    # Transactions are started explicitly, see _Transaction.
+    database = sqlite3.connect(filename, timeout=LOCK_TIMEOUT,
+                               isolation_level=None, check_same_thread=False)
+    # Readers don't block the writer and vice versa.
+    database.execute("PRAGMA journal_mode=WAL")
+    database.execute("CREATE TABLE IF NOT EXISTS durations ("
+                     "key TEXT PRIMARY KEY, count INTEGER, avg REAL, "
+                     "variance REAL, samples TEXT, revision TEXT)")
+    columns = [ row[1] for row in
+                database.execute("PRAGMA table_info(durations)") ]
+    for (name, column_type) in USAGE_COLUMNS:
+      if name not in columns:
+        database.execute("ALTER TABLE durations ADD COLUMN %s %s" %
+                         (name, column_type))
+    database.execute("CREATE TABLE IF NOT EXISTS failures ("
+                     "key TEXT PRIMARY KEY, time REAL)")
+    return database
+
+  def _Transaction(self, fun):
+    # Take the write lock before reading, so that no other process can
+    # update the entries in between.
+    self.database.execute("BEGIN IMMEDIATE")
+    try:
+      fun()
+    except:
+      self.database.execute("ROLLBACK")
+      raise
+    self.database.execute("COMMIT")
+
+  def _Migrate(self, filename):
+    """Imports the averages from the shelve file used before, unless the
+    database already has data."""
+    if self.database.execute("SELECT 1 FROM durations LIMIT 1").fetchone():
+      return
+    try:
+      old_database = shelve.open(filename, flag="r", protocol=2)
+    except Exception:
+      return  # Nothing to migrate.
+    def Import():
+      for key in old_database.keys():
+        old_entry = old_database[key]
+        entry = PerfDataEntry()
+        entry.avg = old_entry.avg
+        entry.count = old_entry.count
+        self._Write(key, entry, "INSERT OR IGNORE")
+    try:
+      self._Transaction(Import)
+    except Exception, e:
+      print("Could not migrate perf data %s: %s" % (filename, e))
+    finally:
+      old_database.close()
 
   def __del__(self):
     self.close()
 
   def close(self):
     if self.closed: return
+    self.Flush()
     self.database.close()
     self.closed = True
 
@@ -67,26 +213,97 @@ class PerfDataStore(object):
     flags = "".join(test.flags)
     return str("%s.%s.%s" % (test.suitename(), test.path, flags))
 
+  def _Read(self, key):
+    row = self.database.execute(
+        "SELECT count, avg, variance, samples, revision, %s FROM durations "
+        "WHERE key = ?" % ", ".join(name for (name, _) in USAGE_COLUMNS),
+        (key,)).fetchone()
+    if row is None:
+      return None
+    entry = PerfDataEntry()
+    (entry.count, entry.avg, entry.variance, samples, entry.revision) = row[:5]
+    entry.samples = [ float(s) for s in samples.split(",") if s ]
+    if any(value is not None for value in row[5:]):
+      entry.usage = output.ResourceUsage.Unpack(row[5:])
+    return entry
+
+  def _Write(self, key, entry, statement="INSERT OR REPLACE"):
+    usage = [None] * len(USAGE_COLUMNS)
+    if entry.usage:
+      usage = entry.usage.Pack()
+    self.database.execute(
+        "%s INTO durations (key, count, avg, variance, samples, revision, %s) "
+        "VALUES (%s)" % (statement,
+                         ", ".join(name for (name, _) in USAGE_COLUMNS),
+                         ", ".join(["?"] * (6 + len(USAGE_COLUMNS)))),
+        [key, entry.count, entry.avg, entry.variance,
+         ",".join("%.4f" % s for s in entry.samples), entry.revision] + usage)
+
+  def FetchPerfDataEntry(self, test):
+    """Returns the PerfDataEntry for |test| as read from the store."""
+    with self.lock:
+      return self._Read(self.GetKey(test))
+
   def FetchPerfData(self, test):
     """Returns the observed duration for |test| as read from the store."""
-    key = self.GetKey(test)
-    if key in self.database:
-      return self.database[key].avg
+    entry = self.FetchPerfDataEntry(test)
+    if entry is not None:
+      return entry.avg
     return None
 
+  def FetchDurations(self):
+    """Returns the observed durations of all tests in the store, keyed like
+    GetKey."""
+    with self.lock:
+      return dict(self.database.execute("SELECT key, avg FROM durations"))
+
+  def FetchRecentFailures(self, since):
+    """Returns the keys of the tests that failed at or after |since|."""
+    with self.lock:
+      return set(row[0] for row in self.database.execute(
+          "SELECT key FROM failures WHERE time >= ?", (since,)))
+
+  def RecordFailure(self, test):
+    """Remembers that |test| failed just now."""
+    with self.lock:
+      self.pending_failures[self.GetKey(test)] = time.time()
+
   def UpdatePerfData(self, test):
     """Updates the persisted value in the store with test.duration."""
     testkey = self.GetKey(test)
-    self.RawUpdatePerfData(testkey, test.duration)
+    self.RawUpdatePerfData(testkey, test.duration, test.output.usage)
 
-  def RawUpdatePerfData(self, testkey, duration):
+  def RawUpdatePerfData(self, testkey, duration, usage=None):
     with self.lock:
-      if testkey in self.database:
-        entry = self.database[testkey]
-      else:
-        entry = PerfDataEntry()
-      entry.AddResult(duration)
-      self.database[testkey] = entry
+      self.pending.setdefault(testkey, []).append((duration, usage))
+    if time.time() - self.last_flush >= FLUSH_INTERVAL:
+      self.Flush()
+
+  def Flush(self):
+    """Writes the pending results. Entries are read again within the write
+    transaction, so results written by other processes are kept."""
+    with self.lock:
+      self.last_flush = time.time()
+      if not self.pending and not self.pending_failures:
+        return
+      pending = self.pending
+      self.pending = {}
+      failures = self.pending_failures
+      self.pending_failures = {}
+      # Runs git, which must not happen while the database is locked.
+      revision = GetRevision()
+      def Update():
+        for (key, results) in pending.iteritems():
+          entry = self._Read(key) or PerfDataEntry()
+          for (duration, usage) in results:
+            entry.AddResult(duration)
+            entry.usage = usage or entry.usage
+          entry.revision = revision
+          self._Write(key, entry)
+        self.database.executemany(
+            "INSERT OR REPLACE INTO failures (key, time) VALUES (?, ?)",
+            failures.iteritems())
+      self._Transaction(Update)
 
 
 class PerfDataManager(object):
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import shelve
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from perfdata import PerfDataEntry, PerfDataStore
+from ..objects.output import ResourceUsage
+
+class PerfDataEntryTest(unittest.TestCase):
+  def testStats(self):
+    entry = PerfDataEntry()
+    for duration in range(1, 101):
+      entry.AddResult(float(duration))
+    self.assertAlmostEquals(50.5, entry.avg)
+    self.assertTrue(entry.variance > 0)
+    self.assertEquals(95.0, entry.p95)
+    self.assertEquals(100.0, entry.GetPercentile(100))
+
+class PerfDataStoreTest(unittest.TestCase):
+  def setUp(self):
+    self.datadir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.datadir)
+
+  def testBatchedWrites(self):
+    store = PerfDataStore(self.datadir, "x64", "release")
+    other = PerfDataStore(self.datadir, "x64", "release")
+    store.RawUpdatePerfData("mjsunit.a.", 1.0)
+    other.RawUpdatePerfData("mjsunit.a.", 3.0,
+                            ResourceUsage(2048, 2.5, 0.5, 100, 0))
+    self.assertEquals(None, other._Read("mjsunit.a."))
+    store.close()
+    other.close()
+    store = PerfDataStore(self.datadir, "x64", "release")
+    entry = store._Read("mjsunit.a.")
+    self.assertEquals(2, entry.count)
+    self.assertEquals(2.0, entry.avg)
+    self.assertEquals([1.0, 3.0], entry.samples)
+    self.assertEquals(2048, entry.usage.max_rss)
+    store.close()
+
+  def testFetchAll(self):
+    store = PerfDataStore(self.datadir, "x64", "release")
+    store.RawUpdatePerfData("mjsunit.a.", 1.0)
+    store.RawUpdatePerfData("mjsunit.b.--opt", 2.0)
+    store.pending_failures["mjsunit.a."] = 100.0
+    store.pending_failures["mjsunit.b.--opt"] = 200.0
+    store.Flush()
+    self.assertEquals({"mjsunit.a.": 1.0, "mjsunit.b.--opt": 2.0},
+                      store.FetchDurations())
+    self.assertEquals(set(["mjsunit.b.--opt"]),
+                      store.FetchRecentFailures(150.0))
+    store.close()
+
+  def testMigration(self):
+    old_database = shelve.open(
+        os.path.join(self.datadir, "x64.release.perfdata"), protocol=2)
+    old_entry = PerfDataEntry()
+    old_entry.AddResult(4.0)
+    old_database["mjsunit.a."] = old_entry
+    old_database.close()
+    store = PerfDataStore(self.datadir, "x64", "release")
+    self.assertEquals(4.0, store._Read("mjsunit.a.").avg)
+    store.close()
+
+  def testLockedDatabase(self):
+    store = PerfDataStore(self.datadir, "x64", "release")
+    store.RawUpdatePerfData("mjsunit.a.", 1.0)
+    store.close()
+    class LockedStore(PerfDataStore):
+      def _Open(self, filename):
+        raise sqlite3.OperationalError("database is locked")
+    self.assertRaises(sqlite3.OperationalError, LockedStore, self.datadir,
+                      "x64", "release")
+    # A locked database is not mistaken for a broken one.
+    self.assertFalse(os.path.exists(
+        os.path.join(self.datadir, "x64.release.perfdb.broken")))
+    store = PerfDataStore(self.datadir, "x64", "release")
+    self.assertEquals(1.0, store._Read("mjsunit.a.").avg)
+    store.close()
+
+  def testBrokenDatabase(self):
+    for content in ["garbage", "more garbage"]:
+      # A database broken in an earlier run is replaced.
+      with open(os.path.join(self.datadir, "x64.release.perfdb"), "w") as f:
+        f.write(content * 100)
+      store = PerfDataStore(self.datadir, "x64", "release")
+      store.RawUpdatePerfData("mjsunit.a.", 1.0)
+      store.close()
+      with open(os.path.join(self.datadir, "x64.release.perfdb.broken")) as f:
+        self.assertEquals(content * 100, f.read())
@@ -4,6 +4,13 @@
 # found in the LICENSE file.
 
 from multiprocessing import Event, Process, Queue
+import Queue as queue
+import threading
+import time
+
+# Seconds between calls to the cancel function of a terminated pool. It is
+# called repeatedly in case a worker started a new task in the meantime.
+CANCEL_INTERVAL = 0.1
 
 class NormalResult():
   def __init__(self, result):
@@ -24,10 +31,26 @@ class BreakResult():
     self.break_now = True
 
 
-def Worker(fn, work_queue, done_queue, done):
+def StartCanceller(done, cancel):
+  """Calls |cancel| in a background thread once the event "done" is set, and
+  again every CANCEL_INTERVAL seconds until the process exits."""
+  def Run():
+    done.wait()
+    while True:
+      cancel()
+      time.sleep(CANCEL_INTERVAL)
+  thread = threading.Thread(target=Run)
+  thread.daemon = True
+  thread.start()
+
+
+def Worker(fn, work_queue, done_queue, done, cancel=None):
   """Worker to be run in a child process.
   The worker stops on two conditions. 1. When the poison pill "STOP" is
-  reached or 2. when the event "done" is set."""
+  reached or 2. when the event "done" is set. In the latter case, the
+  optional function "cancel" is called to abort the task in progress."""
+  if cancel is not None:
+    StartCanceller(done, cancel)
   try:
     for args in iter(work_queue.get, "STOP"):
       if done.is_set():
@@ -45,14 +68,17 @@ class Pool():
   """Distributes tasks to a number of worker processes.
   New tasks can be added dynamically even after the workers have been started.
   Requirement: Tasks can only be added from the parent process, e.g. while
-  consuming the results generator."""
+  consuming the results generator.
+  If given, the function "cancel" is called in each worker on terminate to
+  make the task in progress return early."""
 
   # Factor to calculate the maximum number of items in the work/done queue.
   # Necessary to not overflow the queue's pipe if a keyboard interrupt happens.
   BUFFER_FACTOR = 4
 
-  def __init__(self, num_workers):
+  def __init__(self, num_workers, cancel=None):
     self.num_workers = num_workers
+    self.cancel = cancel
     self.processes = []
     self.terminated = False
 
@@ -64,9 +90,22 @@ class Pool():
     # allowed to remove items from the done_queue and to add items to the
     # work_queue.
     self.count = 0
-    self.work_queue = Queue()
-    self.done_queue = Queue()
-    self.done = Event()
+    self.work_queue = self._NewQueue()
+    self.done_queue = self._NewQueue()
+    self.done = self._NewEvent()
+
+  def _NewQueue(self):
+    return Queue()
+
+  def _NewEvent(self):
+    return Event()
+
+  def _NewWorker(self, fn):
+    return Process(target=Worker, args=(fn,
+                                        self.work_queue,
+                                        self.done_queue,
+                                        self.done,
+                                        self.cancel))
 
   def imap_unordered(self, fn, gen):
     """Maps function "fn" to items in generator "gen" on the worker processes
@@ -77,10 +116,7 @@ class Pool():
       self.advance = self._advance_more
 
       for w in xrange(self.num_workers):
-        p = Process(target=Worker, args=(fn,
-                                         self.work_queue,
-                                         self.done_queue,
-                                         self.done))
+        p = self._NewWorker(fn)
         self.processes.append(p)
         p.start()
 
@@ -118,6 +154,10 @@ class Pool():
     self.work_queue.put(args)
     self.count += 1
 
+  def _JoinWorkers(self):
+    for p in self.processes:
+      p.join()
+
   def terminate(self):
     if self.terminated:
       return
@@ -132,8 +172,7 @@ class Pool():
       # per worker to make them stop.
       self.work_queue.put("STOP")
 
-    for p in self.processes:
-      p.join()
+    self._JoinWorkers()
 
     # Drain the queues to prevent failures when queues are garbage collected.
     try:
@@ -144,3 +183,33 @@ class Pool():
       while True: self.done_queue.get(False)
     except:
       pass
+
+
+class ThreadPool(Pool):
+  """Distributes tasks to a number of worker threads in the current process.
+  Suited for tasks that mostly wait for subprocesses: tasks and results are
+  passed by reference instead of being pickled and sent through pipes. The
+  same requirements as for Pool apply."""
+
+  def _NewQueue(self):
+    return queue.Queue()
+
+  def _NewEvent(self):
+    return threading.Event()
+
+  def _NewWorker(self, fn):
+    # Tasks are cancelled from _JoinWorkers. A canceller thread per worker
+    # would outlive the pool.
+    thread = threading.Thread(target=Worker, args=(fn,
+                                                   self.work_queue,
+                                                   self.done_queue,
+                                                   self.done))
+    thread.daemon = True
+    return thread
+
+  def _JoinWorkers(self):
+    for thread in self.processes:
+      while thread.is_alive():
+        if self.cancel is not None:
+          self.cancel()
+        thread.join(CANCEL_INTERVAL)
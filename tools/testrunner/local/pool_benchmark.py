@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Compares the test throughput of the executors selectable with --executor.
+
+Runs short-lived commands through execution.RunTest, like run-tests.py does,
+at different levels of parallelism. Run from the tools directory:
+
+  python -m testrunner.local.pool_benchmark
+"""
+
+import optparse
+import time
+
+from . import execution
+
+
+def Measure(executor, jobs, command, count):
+  (pool_class, run_test) = execution.EXECUTORS[executor]
+  pool = pool_class(jobs)
+  work = [[execution.Job(command, i, 60, False, 1024 * 1024)]
+          for i in xrange(count)]
+  start_time = time.time()
+  for _ in pool.imap_unordered(run_test, work):
+    pass
+  return count / (time.time() - start_time)
+
+
+def Main():
+  parser = optparse.OptionParser()
+  parser.add_option("-n", "--count", help="Number of tests per measurement",
+                    default=2000, type="int")
+  parser.add_option("--output-size",
+                    help="Number of bytes each test writes to stdout",
+                    default=4096, type="int")
+  parser.add_option("-j", help="Comma-separated levels of parallelism",
+                    default="8,32,128")
+  (options, _) = parser.parse_args()
+
+  command = ["head", "-c", str(options.output_size), "/dev/zero"]
+  executors = sorted(execution.EXECUTORS)
+  print "%-6s" % "-j" + "".join("%16s" % e for e in executors)
+  for jobs in [int(j) for j in options.j.split(",")]:
+    results = [Measure(e, jobs, command, options.count) for e in executors]
+    print "%-6d" % jobs + "".join("%11.1f t/s" % r for r in results)
+
+
+if __name__ == "__main__":
+  Main()
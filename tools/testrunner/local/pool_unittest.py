@@ -3,26 +3,42 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+import subprocess
+import time
 import unittest
 
-from pool import Pool
+from pool import Pool, ThreadPool
 
 def Run(x):
   if x == 10:
     raise Exception("Expected exception triggered by test.")
   return x
 
+sleeping = []  # Processes started by Sleep in this process.
+
+def Sleep(seconds):
+  process = subprocess.Popen(["sleep", str(seconds)])
+  sleeping.append(process)
+  return process.wait()
+
+def KillSleeping():
+  for process in sleeping:
+    if process.poll() is None:
+      process.kill()
+
 class PoolTest(unittest.TestCase):
+  POOL = Pool
+
   def testNormal(self):
     results = set()
-    pool = Pool(3)
+    pool = self.POOL(3)
     for result in pool.imap_unordered(Run, [[x] for x in range(0, 10)]):
       results.add(result)
     self.assertEquals(set(range(0, 10)), results)
 
   def testException(self):
     results = set()
-    pool = Pool(3)
+    pool = self.POOL(3)
     for result in pool.imap_unordered(Run, [[x] for x in range(0, 12)]):
       # Item 10 will not appear in results due to an internal exception.
       results.add(result)
@@ -32,10 +48,23 @@ class PoolTest(unittest.TestCase):
 
   def testAdd(self):
     results = set()
-    pool = Pool(3)
+    pool = self.POOL(3)
     for result in pool.imap_unordered(Run, [[x] for x in range(0, 10)]):
       results.add(result)
       if result < 30:
         pool.add([result + 20])
     self.assertEquals(set(range(0, 10) + range(20, 30) + range(40, 50)),
                       results)
+
+  def testCancel(self):
+    start = time.time()
+    pool = self.POOL(2, cancel=KillSleeping)
+    for result in pool.imap_unordered(Sleep, [[0], [30], [30]]):
+      self.assertEquals(0, result)
+      break
+    pool.terminate()
+    self.assertTrue(time.time() - start < 10)
+
+
+class ThreadPoolTest(PoolTest):
+  POOL = ThreadPool
@@ -26,16 +26,20 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
+import heapq
 import json
 import os
 import sys
 import time
 
-from . import junit_output
+from . import jsonlines
 
 
 ABS_PATH_PREFIX = os.getcwd() + os.sep
 
+# Number of tests with the largest memory use listed in the json output.
+MAX_RSS_TESTS = 20
+
 
 def EscapeCommand(command):
   parts = []
@@ -241,13 +245,11 @@ class MonochromeProgressIndicator(CompactProgressIndicator):
 
 class JUnitTestProgressIndicator(ProgressIndicator):
 
-  def __init__(self, progress_indicator, junitout, junittestsuite):
+  def __init__(self, progress_indicator, junit_writer, junittestsuite):
+    """|junit_writer| is the JUnitTestOutput shared by all configurations,
+    each adds its own test suite."""
     self.progress_indicator = progress_indicator
-    self.outputter = junit_output.JUnitTestOutput(junittestsuite)
-    if junitout:
-      self.outfile = open(junitout, "w")
-    else:
-      self.outfile = sys.stdout
+    self.outputter = junit_writer.AddSuite(junittestsuite)
 
   def Starting(self):
     self.progress_indicator.runner = self.runner
@@ -255,9 +257,7 @@ class JUnitTestProgressIndicator(ProgressIndicator):
 
   def Done(self):
     self.progress_indicator.Done()
-    self.outputter.FinishAndWrite(self.outfile)
-    if self.outfile != sys.stdout:
-      self.outfile.close()
+    self.outputter.Finish()
 
   def AboutToRun(self, test):
     self.progress_indicator.AboutToRun(test)
@@ -291,6 +291,11 @@ class JsonTestProgressIndicator(ProgressIndicator):
     self.arch = arch
     self.mode = mode
     self.results = []
+    self.max_rss_tests = []  # Heap of (max RSS, test result).
+    # Results are streamed to JSON lines files instead of being collected.
+    self.stream = None
+    if json_test_results.endswith(".jsonl"):
+      self.stream = jsonlines.JsonLinesWriter(json_test_results, arch, mode)
 
   def Starting(self):
     self.progress_indicator.runner = self.runner
@@ -298,17 +303,41 @@ class JsonTestProgressIndicator(ProgressIndicator):
 
   def Done(self):
     self.progress_indicator.Done()
+    section = {
+      "arch": self.arch,
+      "mode": self.mode,
+      "max_rss_tests": [ r for (_, r) in sorted(self.max_rss_tests,
+                                                reverse=True) ],
+    }
+    if self.runner.context.adaptive_timeouts:
+      section["adaptive_timeouts"] = {
+        "killed": self.runner.adaptive_kills,
+        "finished_on_retry": self.runner.adaptive_false_kills,
+        "killed_run_time": self.runner.adaptive_kill_time,
+      }
+    if self.runner.not_run:
+      section["not_run"] = [ test.GetLabel() for test in self.runner.not_run ]
+      section["stop_reason"] = self.runner.stop_reason
+    if self.runner.flakiness:
+      section["flakiness"] = [ {
+        "name": stats.test.GetLabel(),
+        "flags": stats.test.flags,
+        "runs": stats.runs,
+        "failures": stats.failures,
+        "interval": stats.GetInterval(),
+        "failing_seeds": stats.failing_seeds,
+      } for stats in self.runner.flakiness ]
+    if self.stream:
+      self.stream.Close(section)
+      return
+
     complete_results = []
     if os.path.exists(self.json_test_results):
       with open(self.json_test_results, "r") as f:
         # Buildbot might start out with an empty file.
         complete_results = json.loads(f.read() or "[]")
-
-    complete_results.append({
-      "arch": self.arch,
-      "mode": self.mode,
-      "results": self.results,
-    })
+    section["results"] = self.results
+    complete_results.append(section)
 
     with open(self.json_test_results, "w") as f:
       f.write(json.dumps(complete_results))
@@ -316,14 +345,37 @@ class JsonTestProgressIndicator(ProgressIndicator):
   def AboutToRun(self, test):
     self.progress_indicator.AboutToRun(test)
 
+  def _GetUsage(self, test):
+    usage = test.output.usage
+    if not usage:
+      return {}
+    return {
+      "max_rss": usage.max_rss,
+      "user_time": usage.user_time,
+      "system_time": usage.system_time,
+      "minor_faults": usage.minor_faults,
+      "major_faults": usage.major_faults,
+    }
+
   def HasRun(self, test, has_unexpected_output):
     self.progress_indicator.HasRun(test, has_unexpected_output)
+    if test.output.usage and test.output.usage.max_rss is not None:
+      entry = (test.output.usage.max_rss, {
+        "name": test.GetLabel(),
+        "flags": test.flags,
+        "duration": test.duration,
+      })
+      entry[1].update(self._GetUsage(test))
+      if len(self.max_rss_tests) < MAX_RSS_TESTS:
+        heapq.heappush(self.max_rss_tests, entry)
+      else:
+        heapq.heappushpop(self.max_rss_tests, entry)
     if test.run == 1 and not has_unexpected_output:
       # Omit tests that pass on the first run, but collect output of tests
       # that pass when rerun.
       return
 
-    self.results.append({
+    result = {
       "name": test.GetLabel(),
       "flags": test.flags,
       "command": EscapeCommand(self.runner.GetCommand(test)).replace(
@@ -333,7 +385,13 @@ class JsonTestProgressIndicator(ProgressIndicator):
       "stderr": test.output.stderr,
       "exit_code": test.output.exit_code,
       "result": test.suite.GetOutcome(test),
-    })
+      "duration": test.duration,
+    }
+    result.update(self._GetUsage(test))
+    if self.stream:
+      self.stream.WriteResult(result)
+    else:
+      self.results.append(result)
 
 
 PROGRESS_INDICATORS = {
@@ -0,0 +1,57 @@
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import re
+
+from . import jsonlines
+
+
+SEED_PATTERN = re.compile(r"--random-seed=(-?\d+)")
+
+
+class Failure(object):
+  """A test that failed in an earlier run."""
+  def __init__(self, name, flags, seed):
+    self.name = name  # Label of the test, e.g. "mjsunit/foo".
+    self.flags = flags  # Test case flags, including the variant flags.
+    self.seed = seed  # Random seed of the failed run, or None.
+    self.runs = 0  # Highest run number seen, counting reruns.
+
+  def suitename(self):
+    return self.name.split("/", 1)[0]
+
+
+def ReadFailures(filename):
+  """Returns a dict mapping (arch, mode) to the Failure objects in the file
+  written by --json-test-results, in JSON or JSON lines, in the order they
+  were recorded. Results are only recorded for tests that failed on their
+  first run and for the reruns of these, so every test in the file counts."""
+  sections = jsonlines.LoadResults(filename)
+  failures = {}
+  for section in sections:
+    config = (section["arch"], section["mode"])
+    tests = failures.setdefault(config, [])
+    by_key = dict(((t.name, tuple(t.flags)), t) for t in tests)
+    for result in section["results"]:
+      flags = [ str(flag) for flag in result["flags"] ]
+      key = (str(result["name"]), tuple(flags))
+      failure = by_key.get(key)
+      if failure is None:
+        match = SEED_PATTERN.search(result["command"])
+        seed = int(match.group(1)) if match else None
+        failure = Failure(key[0], flags, seed)
+        by_key[key] = failure
+        tests.append(failure)
+      failure.runs = max(failure.runs, result["run"])
+  return failures
+
+
+def GetSeed(failures):
+  """Returns the random seed the failures in |failures|, a dict as returned
+  by ReadFailures, were found with, or None."""
+  for tests in failures.itervalues():
+    for failure in tests:
+      if failure.seed is not None:
+        return failure.seed
+  return None
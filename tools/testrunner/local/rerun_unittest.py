@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from rerun import GetSeed, ReadFailures
+
+def Result(name, flags, run):
+  return {
+    "name": name,
+    "flags": flags,
+    "command": "out/x64.release/d8 --random-seed=-123 %s" % " ".join(flags),
+    "run": run,
+  }
+
+class ReadFailuresTest(unittest.TestCase):
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def testRead(self):
+    filename = os.path.join(self.tempdir, "results.json")
+    with open(filename, "w") as f:
+      f.write(json.dumps([
+        {"arch": "x64", "mode": "release", "results": [
+          Result("mjsunit/a", [], 1),
+          Result("mjsunit/a", ["--stress-opt"], 1),
+          Result("mjsunit/a", [], 2),
+          Result("mjsunit/a", [], 3),
+        ]},
+        {"arch": "ia32", "mode": "debug", "results": []},
+      ]))
+    failures = ReadFailures(filename)
+    self.assertEquals([], failures[("ia32", "debug")])
+    tests = failures[("x64", "release")]
+    self.assertEquals([([], 3), (["--stress-opt"], 1)],
+                      [ (f.flags, f.runs) for f in tests ])
+    self.assertEquals("mjsunit", tests[0].suitename())
+    self.assertEquals(-123, GetSeed(failures))
@@ -0,0 +1,114 @@
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import hashlib
+import json
+import os
+import time
+
+from . import utils
+
+
+# Number of results kept, the least recently used ones are dropped first.
+MAX_ENTRIES = 100000
+
+READ_SIZE = 1024 * 1024
+
+
+class ResultCache(object):
+  """Remembers which tests passed with exactly the same inputs before.
+
+  Results are keyed by a hash over everything that determines them, see
+  GetKey. Only passing results are stored, as the duration and the exit code
+  of the test."""
+
+  def __init__(self, datadir, arch, mode, max_entries=MAX_ENTRIES):
+    self.filename = os.path.join(datadir, "%s.%s.resultcache" % (arch, mode))
+    self.max_entries = max_entries
+    self.entries = self._Load()  # Maps keys to [last use, duration, exit code].
+    self.file_hashes = {}  # Maps paths to ((mtime, size), digest).
+    self.now = time.time()
+    self.dirty = False
+    self.hits = 0
+    self.misses = 0
+
+  def _Load(self):
+    try:
+      with open(self.filename) as f:
+        entries = json.load(f)
+    except (IOError, ValueError):
+      return {}
+    if not isinstance(entries, dict):
+      return {}
+    return entries
+
+  def _HashFile(self, path):
+    stat = os.stat(path)
+    version = (stat.st_mtime, stat.st_size)
+    cached = self.file_hashes.get(path)
+    if cached and cached[0] == version:
+      return cached[1]
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+      while True:
+        data = f.read(READ_SIZE)
+        if not data:
+          break
+        digest.update(data)
+    self.file_hashes[path] = (version, digest.hexdigest())
+    return self.file_hashes[path][1]
+
+  def GetKey(self, command, input_files, outcomes):
+    """Hashes the command line, the contents of the files on it (the shell,
+    the test source and its includes) and of |input_files|, and the expected
+    outcomes. The random seed is left out, as it changes with every run."""
+    digest = hashlib.sha1()
+    files = list(input_files)
+    for arg in command:
+      if arg.startswith("--random-seed="):
+        continue
+      digest.update(arg + "\0")
+      if os.path.isfile(arg):
+        files.append(arg)
+    for path in files:
+      digest.update("%s\0%s\0" % (path, self._HashFile(path)))
+    digest.update(" ".join(sorted(outcomes or [])))
+    return digest.hexdigest()
+
+  def Lookup(self, key):
+    """Returns (duration, exit code) of the passed run with |key| or None."""
+    entry = self.entries.get(key)
+    if entry is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    entry[0] = self.now
+    self.dirty = True
+    return (entry[1], entry[2])
+
+  def Store(self, key, duration, exit_code):
+    self.entries[key] = [self.now, duration, exit_code]
+    self.dirty = True
+
+  def Save(self):
+    if not self.dirty:
+      return
+    if len(self.entries) > self.max_entries:
+      keys = sorted(self.entries, key=lambda k: self.entries[k][0],
+                    reverse=True)
+      for key in keys[self.max_entries:]:
+        del self.entries[key]
+    # Write a new file and move it into place, so that an interrupted run
+    # doesn't leave a truncated cache behind.
+    temp_filename = self.filename + ".tmp"
+    try:
+      with open(temp_filename, "w") as f:
+        json.dump(self.entries, f)
+      if utils.IsWindows() and os.path.exists(self.filename):
+        os.remove(self.filename)
+      os.rename(temp_filename, self.filename)
+    except (IOError, OSError), e:
+      print("Could not save the result cache: %s" % e)
+      return
+    self.dirty = False
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from resultcache import ResultCache
+
+class ResultCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.datadir = tempfile.mkdtemp()
+    self.source = os.path.join(self.datadir, "test.js")
+    with open(self.source, "w") as f:
+      f.write("assertTrue(true);")
+
+  def tearDown(self):
+    shutil.rmtree(self.datadir)
+
+  def testKey(self):
+    cache = ResultCache(self.datadir, "x64", "release")
+    command = ["d8", "--random-seed=123", self.source]
+    key = cache.GetKey(command, [], ["PASS"])
+    self.assertEquals(
+        key, cache.GetKey(["d8", "--random-seed=456", self.source], [],
+                          ["PASS"]))
+    self.assertNotEquals(key, cache.GetKey(command, [], ["PASS", "FAIL"]))
+    self.assertNotEquals(key, cache.GetKey(command + ["--nocrankshaft"], [],
+                                           ["PASS"]))
+    with open(self.source, "w") as f:
+      f.write("assertTrue(false);")
+    cache = ResultCache(self.datadir, "x64", "release")
+    self.assertNotEquals(key, cache.GetKey(command, [], ["PASS"]))
+
+  def testPersistence(self):
+    cache = ResultCache(self.datadir, "x64", "release")
+    self.assertEquals(None, cache.Lookup("a"))
+    cache.Store("a", 1.5, 0)
+    cache.Save()
+    cache = ResultCache(self.datadir, "x64", "release")
+    self.assertEquals((1.5, 0), cache.Lookup("a"))
+    cache = ResultCache(self.datadir, "x64", "debug")
+    self.assertEquals(None, cache.Lookup("a"))
+
+  def testEviction(self):
+    cache = ResultCache(self.datadir, "x64", "release", max_entries=2)
+    cache.Store("a", 1.0, 0)
+    cache.Store("b", 1.0, 0)
+    cache.Save()
+    cache = ResultCache(self.datadir, "x64", "release", max_entries=2)
+    cache.now += 1
+    cache.Lookup("a")
+    cache.now += 1
+    cache.Store("c", 1.0, 0)
+    cache.Save()
+    cache = ResultCache(self.datadir, "x64", "release", max_entries=2)
+    self.assertEquals(["a", "c"], sorted(cache.entries))
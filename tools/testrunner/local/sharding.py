@@ -0,0 +1,77 @@
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import hashlib
+import heapq
+
+
+class Shard(object):
+  def __init__(self, index):
+    self.index = index  # 0-based, --shard-run is index + 1.
+    self.tests = []
+    self.duration = 0.0  # Predicted from the perf data.
+    self.unknown = 0  # Number of tests without perf data.
+
+
+def GetTestKey(test):
+  return "%s/%s %s" % (test.suitename(), test.path, " ".join(test.flags))
+
+
+def _StableHash(key):
+  # Unlike hash(), the same on all machines and Python versions.
+  return int(hashlib.md5(key).hexdigest()[:8], 16)
+
+
+def SplitTests(test_lists, shard_count):
+  """Splits each list of tests in |test_lists| into |shard_count| shards by
+  giving each shard every shard_count-th test. The result only depends on
+  the tests, so it is the same on all machines."""
+  shards = [ Shard(i) for i in range(shard_count) ]
+  for tests in test_lists:
+    for (index, test) in enumerate(tests):
+      shard = shards[index % shard_count]
+      shard.tests.append(test)
+      shard.unknown += 1
+  return shards
+
+
+def DistributeTests(tests, shard_count, get_duration):
+  """Splits |tests| into |shard_count| shards that take about equally long.
+
+  get_duration returns the expected duration of a test or None if it is
+  unknown. Tests with a known duration are assigned longest first to the
+  shard with the least work so far. The others are spread by a hash of their
+  name. The result only depends on the tests and their durations, so shards
+  computed on different machines from the same perf data fit together, but
+  not shards computed from different perf data. Each shard keeps the tests
+  in their original order."""
+  shards = [ Shard(i) for i in range(shard_count) ]
+  known = []
+  for (index, test) in enumerate(tests):
+    key = GetTestKey(test)
+    duration = get_duration(test)
+    if duration is None:
+      shard = shards[_StableHash(key) % shard_count]
+      shard.tests.append((index, test))
+      shard.unknown += 1
+    else:
+      known.append((-duration, key, index, test))
+  known.sort()
+  loads = [ (0.0, i) for i in range(shard_count) ]
+  for (negative_duration, _, index, test) in known:
+    (load, i) = heapq.heappop(loads)
+    shards[i].tests.append((index, test))
+    shards[i].duration = load - negative_duration
+    heapq.heappush(loads, (shards[i].duration, i))
+  for shard in shards:
+    shard.tests = [ test for (_, test) in sorted(shard.tests) ]
+  return shards
+
+
+def PrintShards(shards):
+  print "%-8s %8s %14s %10s" % ("shard", "tests", "predicted", "unknown")
+  for shard in shards:
+    print "%-8d %8d %13.1fs %10d" % (shard.index + 1, len(shard.tests),
+                                     shard.duration, shard.unknown)
+  print "Predicted makespan: %.1fs" % max(s.duration for s in shards)
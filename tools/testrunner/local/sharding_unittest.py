@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest
+
+from sharding import DistributeTests, SplitTests
+
+class FakeTest(object):
+  def __init__(self, path, duration):
+    self.path = path
+    self.flags = []
+    self.duration = duration
+
+  def suitename(self):
+    return "mjsunit"
+
+def GetDuration(test):
+  return test.duration
+
+class ShardingTest(unittest.TestCase):
+  def testBalanced(self):
+    tests = [ FakeTest("t%d" % i, d)
+              for (i, d) in enumerate([7, 5, 4, 3, 3, 2, 1, 1]) ]
+    shards = DistributeTests(tests, 2, GetDuration)
+    self.assertEquals([13, 13], [s.duration for s in shards])
+    self.assertEquals(sorted(tests),
+                      sorted(shards[0].tests + shards[1].tests))
+    for shard in shards:
+      # The original order is kept.
+      self.assertEquals(sorted(shard.tests, key=tests.index), shard.tests)
+
+  def testDeterministic(self):
+    tests = [ FakeTest("t%d" % i, 1.0) for i in range(20) ]
+    tests += [ FakeTest("u%d" % i, None) for i in range(20) ]
+    shards = DistributeTests(tests, 3, GetDuration)
+    reversed_shards = DistributeTests(tests[::-1], 3, GetDuration)
+    for (shard, reversed_shard) in zip(shards, reversed_shards):
+      self.assertEquals(set(shard.tests), set(reversed_shard.tests))
+    self.assertEquals(20, sum(s.unknown for s in shards))
+
+  def testSplit(self):
+    suites = [ [ FakeTest("%s%d" % (name, i), None) for i in range(count) ]
+               for (name, count) in [("a", 5), ("b", 2)] ]
+    shards = SplitTests(suites, 2)
+    # Every second test of each suite, independent of the perf data.
+    self.assertEquals(["a0", "a2", "a4", "b0"],
+                      [ t.path for t in shards[0].tests ])
+    self.assertEquals(["a1", "a3", "b1"], [ t.path for t in shards[1].tests ])
+    self.assertEquals([4, 3], [ s.unknown for s in shards ])
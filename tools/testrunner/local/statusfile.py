@@ -25,6 +25,10 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import os
+
+from . import trie
+
 
 # These outcomes can occur in a TestCase's outcomes list:
 SKIP = "SKIP"
@@ -58,6 +62,12 @@ for var in ["debug", "release", "android_arm", "android_arm64", "android_ia32",
   VARIABLES[var] = var
 
 
+# Caches, see CompileStatusFile.
+_contents = {}  # Path -> ((mtime, size), evaluated contents).
+_compiled = {}  # (path, variables) -> (contents, StatusFileRules).
+_conditions = {}  # Condition -> code object.
+
+
 def DoSkip(outcomes):
   return SKIP in outcomes
 
@@ -96,6 +106,14 @@ def _AddOutcome(result, new):
     result.add(new)
 
 
+def _Eval(condition, variables):
+  code = _conditions.get(condition)
+  if code is None:
+    code = compile(condition, "<status file condition>", "eval")
+    _conditions[condition] = code
+  return eval(code, variables)
+
+
 def _ParseOutcomeList(rule, outcomes, target_dict, variables):
   result = set([])
   if type(outcomes) == str:
@@ -104,7 +122,7 @@ def _ParseOutcomeList(rule, outcomes, target_dict, variables):
     if type(item) == str:
       _AddOutcome(result, item)
     elif type(item) == list:
-      if not eval(item[0], variables): continue
+      if not _Eval(item[0], variables): continue
       for outcome in item[1:]:
         assert type(outcome) == str
         _AddOutcome(result, outcome)
@@ -117,24 +135,81 @@ def _ParseOutcomeList(rule, outcomes, target_dict, variables):
     target_dict[rule] = result
 
 
-def ReadStatusFile(path, variables):
+def _ValidateOutcomes(path, rule, outcomes):
+  if type(outcomes) == str:
+    outcomes = [outcomes]
+  assert type(outcomes) == list, "%s: bad outcomes for %s" % (path, rule)
+  for item in outcomes:
+    if type(item) == list:
+      assert item and type(item[0]) == str, (
+          "%s: bad condition for %s" % (path, rule))
+      item = item[1:]
+    else:
+      item = [item]
+    for outcome in item:
+      assert outcome in KEYWORDS, (
+          "%s: unknown outcome %s for %s" % (path, outcome, rule))
+
+
+def _ReadContents(path):
+  """Returns the evaluated and validated contents of the status file at
+  |path|, reading it only once while it is unchanged."""
+  st = os.stat(path)
+  version = (st.st_mtime, st.st_size)
+  entry = _contents.get(path)
+  if entry and entry[0] == version:
+    return entry[1]
   with open(path) as f:
-    global KEYWORDS
-    contents = eval(f.read(), KEYWORDS)
+    contents = eval(f.read(), dict(KEYWORDS))
+  assert type(contents) == list, "%s: expected a list of sections" % path
+  for section in contents:
+    assert type(section) == list and len(section) == 2, (
+        "%s: sections are [condition, rules]" % path)
+    assert type(section[0]) == str and type(section[1]) == dict, (
+        "%s: sections are [condition, rules]" % path)
+    for rule in section[1]:
+      assert type(rule) == str, "%s: bad rule %r" % (path, rule)
+      _ValidateOutcomes(path, rule, section[1][rule])
+  _contents[path] = (version, contents)
+  return contents
+
+
+class StatusFileRules(object):
+  """The rules of a status file for one configuration."""
+  def __init__(self, rules, wildcards):
+    self.rules = rules  # Test name -> set of outcomes.
+    self.wildcards = wildcards  # Rule ending in '*' -> set of outcomes.
+    # Prefix -> wildcard rule, to find the matching ones quickly.
+    self.wildcard_trie = trie.PrefixTrie()
+    for rule in wildcards:
+      self.wildcard_trie.Add(rule[:-1], rule)
+
+
+def CompileStatusFile(path, variables):
+  """Returns the StatusFileRules of the status file at |path| for
+  |variables|. The result is cached, don't modify it."""
+  variables.update(VARIABLES)
+  key = (path, tuple(sorted((k, v) for (k, v) in variables.iteritems()
+                            if k != "__builtins__")))
+  contents = _ReadContents(path)
+  entry = _compiled.get(key)
+  if entry and entry[0] is contents:
+    return entry[1]
 
   rules = {}
   wildcards = {}
-  variables.update(VARIABLES)
-  for section in contents:
-    assert type(section) == list
-    assert len(section) == 2
-    if not eval(section[0], variables): continue
-    section = section[1]
-    assert type(section) == dict
+  for (condition, section) in contents:
+    if not _Eval(condition, variables): continue
     for rule in section:
-      assert type(rule) == str
       if rule[-1] == '*':
         _ParseOutcomeList(rule, section[rule], wildcards, variables)
       else:
         _ParseOutcomeList(rule, section[rule], rules, variables)
-  return rules, wildcards
+  compiled = StatusFileRules(rules, wildcards)
+  _compiled[key] = (contents, compiled)
+  return compiled
+
+
+def ReadStatusFile(path, variables):
+  compiled = CompileStatusFile(path, variables)
+  return compiled.rules, compiled.wildcards
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import statusfile
+from trie import PrefixTrie
+
+STATUS_FILE = """[
+[ALWAYS, {
+  'a/b': [PASS, FAIL],
+  'a/*': [SKIP],
+  'a/b*': [PASS, ['mode == debug', SLOW]],
+}],
+['arch == arm', {
+  'c': [FAIL_OK],
+}],
+]
+"""
+
+class PrefixTrieTest(unittest.TestCase):
+  def testMatch(self):
+    trie = PrefixTrie()
+    trie.Add("a/b", 2)
+    trie.Add("", 0)
+    trie.Add("a/", 1)
+    trie.Add("a/c", 3)
+    self.assertEquals([0, 1, 2], list(trie.Match("a/bc")))
+    self.assertEquals([0], list(trie.Match("b")))
+
+
+class CompileStatusFileTest(unittest.TestCase):
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+    self.path = os.path.join(self.tempdir, "test.status")
+    with open(self.path, "w") as f:
+      f.write(STATUS_FILE)
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def testCompile(self):
+    compiled = statusfile.CompileStatusFile(
+        self.path, {"arch": "arm", "mode": "debug"})
+    self.assertEquals(set(["PASS", "FAIL"]), compiled.rules["a/b"])
+    self.assertEquals(set(["FAIL", "OKAY"]), compiled.rules["c"])
+    self.assertEquals(set(["PASS", "SLOW"]), compiled.wildcards["a/b*"])
+    self.assertEquals(["a/*", "a/b*"],
+                      list(compiled.wildcard_trie.Match("a/bc")))
+
+  def testCache(self):
+    release = statusfile.CompileStatusFile(
+        self.path, {"arch": "x64", "mode": "release"})
+    debug = statusfile.CompileStatusFile(
+        self.path, {"arch": "x64", "mode": "debug"})
+    self.assertEquals(set(["PASS"]), release.wildcards["a/b*"])
+    self.assertFalse("c" in release.rules)
+    self.assertTrue(release is statusfile.CompileStatusFile(
+        self.path, {"arch": "x64", "mode": "release"}))
+    self.assertFalse(debug is release)
+
+  def testUnknownOutcome(self):
+    with open(self.path, "w") as f:
+      f.write("[[ALWAYS, {'a': ['PASSS']}]]")
+    self.assertRaises(AssertionError, statusfile.CompileStatusFile,
+                      self.path, {})
@@ -0,0 +1,158 @@
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import math
+import random
+
+from . import execution
+from . import statusfile
+
+
+# Two-sided 95% confidence.
+CONFIDENCE = 95
+Z = 1.96
+
+# A test is stressed until the confidence interval of its failure
+# probability is at most this wide.
+SETTLED_WIDTH = 0.2
+
+# Runs before a test can be settled.
+MIN_RUNS = 10
+
+# Number of failing seeds listed per test.
+SEEDS_LIMIT = 10
+
+
+def WilsonInterval(failures, runs, z=Z):
+  """Returns the Wilson score interval of the failure probability after
+  |failures| failing of |runs| runs. Unlike the normal approximation it is
+  useful for probabilities close to 0 and 1 and for few runs."""
+  if runs == 0:
+    return (0.0, 1.0)
+  p = float(failures) / runs
+  z2 = z * z
+  center = (p + z2 / (2 * runs)) / (1 + z2 / runs)
+  margin = (z * math.sqrt(p * (1 - p) / runs + z2 / (4 * runs * runs)) /
+            (1 + z2 / runs))
+  return (max(0.0, center - margin), min(1.0, center + margin))
+
+
+class FlakinessStats(object):
+  """The results of the stress runs of one test case, i.e. test and
+  variant."""
+
+  def __init__(self, test):
+    self.test = test
+    self.runs = 0
+    self.failures = 0
+    self.failing_seeds = []
+
+  def AddResult(self, failed, seed):
+    self.runs += 1
+    if failed:
+      self.failures += 1
+      self.failing_seeds.append(seed)
+
+  def GetInterval(self):
+    return WilsonInterval(self.failures, self.runs)
+
+  def IsSettled(self):
+    """Whether more runs are unlikely to change the picture."""
+    (low, high) = self.GetInterval()
+    return self.runs >= MIN_RUNS and high - low <= SETTLED_WIDTH
+
+  def GetLabel(self):
+    return " ".join([self.test.GetLabel()] + self.test.flags)
+
+
+class StressRunner(execution.Runner):
+  """Runs each test up to |runs| times, each time with a different random
+  seed, and reports how likely each test is to fail. All runs of all tests
+  share the pool; the runs of a test stop once its failure probability is
+  known precisely enough, see FlakinessStats.IsSettled. Failures are not
+  rerun, every run is a sample.
+
+  Tests with dependencies are not stressed: the runs of a test would share
+  the files its dependency produces."""
+
+  def __init__(self, suites, progress_indicator, context, runs):
+    super(StressRunner, self).__init__(suites, progress_indicator, context)
+    dependencies = set((t.suite.name, t.dependency) for t in self.tests
+                       if t.dependency is not None)
+    self.originals = [ t for t in self.tests
+                       if t.dependency is None and
+                       (t.suite.name, t.path) not in dependencies ]
+    self.not_stressed = len(self.tests) - len(self.originals)
+    self.runs = runs
+    # The seeds follow from the seed of the run, so they can be reproduced.
+    seeds = random.Random(context.random_seed)
+    self.stress_runs = []  # (stats, test, seed) in the order to run them.
+    self.flakiness = [ FlakinessStats(t) for t in self.originals ]
+    self.tests = []
+    for _ in range(runs):
+      for stats in self.flakiness:
+        seed = 0
+        while seed == 0:
+          seed = seeds.randint(-2147483648, 2147483647)
+        test = stats.test.CopyAddingFlags([])
+        test.id = len(self.tests)
+        self.stress_runs.append((stats, test, seed))
+        self.tests.append(test)
+    self.total = len(self.tests)
+    self.remaining = self.total
+    # Test id -> (FlakinessStats, seed) of each run.
+    self.stats = dict((test.id, (stats, seed))
+                      for (stats, test, seed) in self.stress_runs)
+    self.skipped = set()  # Test ids of runs not needed in the end.
+
+  def _PrioritizedTests(self):
+    for (stats, test, _) in self.stress_runs:
+      if stats.IsSettled():
+        self.skipped.add(test.id)
+        self.remaining -= 1
+        continue
+      yield test
+
+  def GetCommand(self, test):
+    command = super(StressRunner, self).GetCommand(test)
+    entry = self.stats.get(test.id)
+    if entry is None:
+      return command
+    seed_flag = "--random-seed=%s" % self.context.random_seed
+    return [ "--random-seed=%d" % entry[1] if arg == seed_flag else arg
+             for arg in command ]
+
+  def _MaybeRerun(self, pool, test):
+    pass
+
+  def _ProcessResult(self, pool, test, output, duration):
+    super(StressRunner, self)._ProcessResult(pool, test, output, duration)
+    entry = self.stats.get(test.id)
+    if entry is not None:
+      # Runs of tests expected to be flaky or to fail count all the same.
+      failed = test.suite.GetOutcome(test) != statusfile.PASS
+      entry[0].AddResult(failed, entry[1])
+
+  def _Done(self):
+    self.tests = [ t for t in self.tests if t.id not in self.skipped ]
+    exit_code = super(StressRunner, self)._Done()
+    self._PrintFlakiness()
+    return exit_code
+
+  def _PrintFlakiness(self):
+    print("=== Failure probability of %d tests in up to %d runs "
+          "(%d%% confidence interval):" %
+          (len(self.flakiness), self.runs, CONFIDENCE))
+    if self.not_stressed:
+      print("(%d tests with dependencies not stressed)" % self.not_stressed)
+    for stats in sorted(self.flakiness, key=lambda s: -s.failures):
+      (low, high) = stats.GetInterval()
+      print("%s: %d of %d runs failed, p = %.3f [%.3f, %.3f]" %
+            (stats.GetLabel(), stats.failures, stats.runs,
+             float(stats.failures) / max(1, stats.runs), low, high))
+      if stats.failing_seeds:
+        seeds = stats.failing_seeds[:SEEDS_LIMIT]
+        print("  failing seeds: %s%s" %
+              (" ".join(str(s) for s in seeds),
+               " ..." if len(stats.failing_seeds) > SEEDS_LIMIT else ""))
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest
+
+from stress import FlakinessStats, WilsonInterval
+
+class StressTest(unittest.TestCase):
+  def testWilsonInterval(self):
+    (low, high) = WilsonInterval(10, 100)
+    self.assertAlmostEquals(0.0552, low, places=4)
+    self.assertAlmostEquals(0.1744, high, places=4)
+    self.assertEquals(0.0, WilsonInterval(0, 20)[0])
+    self.assertEquals(1.0, WilsonInterval(20, 20)[1])
+    self.assertEquals((0.0, 1.0), WilsonInterval(0, 0))
+
+  def testSettled(self):
+    stats = FlakinessStats(None)
+    for i in range(15):
+      stats.AddResult(False, i + 1)
+    # A bit more than 15 passing runs are needed to be sure enough.
+    self.assertFalse(stats.IsSettled())
+    stats.AddResult(False, 16)
+    self.assertTrue(stats.IsSettled())
+    # Flaky tests take longer.
+    stats = FlakinessStats(None)
+    for i in range(40):
+      stats.AddResult(i % 2 == 0, i + 1)
+    self.assertFalse(stats.IsSettled())
+    self.assertEquals(range(1, 41, 2), stats.failing_seeds)
@@ -0,0 +1,230 @@
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Live state of a run for dashboards and bots, see --status-file and
+--status-server. The runners report the jobs they hand to the pool and the
+results they get back; snapshots are taken from other threads."""
+
+import BaseHTTPServer
+import collections
+import json
+import os
+import SocketServer
+import stat
+import threading
+import time
+
+
+# Seconds between two rewrites of the status file.
+STATUS_INTERVAL = 2
+
+# Seconds over which the throughput is measured.
+THROUGHPUT_WINDOW = 60
+
+# Number of running tests listed as the slowest.
+SLOWEST_LIMIT = 10
+
+
+class WorkerLanes(object):
+  """Tracks which job runs on which worker. The pools hand out jobs in the
+  order they got them, and a worker takes the next job once it is done with
+  the last one. So the jobs running are the first num_workers jobs without a
+  result, and a job takes over the lane of the job that finished before it
+  started. Jobs handed out ahead of time wait in the queue meanwhile."""
+
+  def __init__(self, num_workers):
+    self.lanes = [None] * num_workers  # (Job id, label, start) per worker.
+    self.lane_of = {}  # Job id -> index of its lane.
+    self.queue = collections.deque()  # (Job id, label) not started yet.
+
+  def Dispatched(self, job_id, label, now):
+    self.queue.append((job_id, label))
+    self._Fill(now)
+
+  def Finished(self, job_id, now):
+    """Returns the lane |job_id| ran on, or None if it never started."""
+    lane = self.lane_of.pop(job_id, None)
+    if lane is not None:
+      self.lanes[lane] = None
+    else:
+      # Should not happen with a FIFO queue, but don't show it forever.
+      self.queue = collections.deque(
+          entry for entry in self.queue if entry[0] != job_id)
+    self._Fill(now)
+    return lane
+
+  def _Fill(self, now):
+    for (lane, entry) in enumerate(self.lanes):
+      if not self.queue:
+        return
+      if entry is None:
+        (job_id, label) = self.queue.popleft()
+        self.lanes[lane] = (job_id, label, now)
+        self.lane_of[job_id] = lane
+
+
+class RunStatus(object):
+  """The state of the runners in |runners| with |num_workers| workers. It
+  attaches itself to the runners, which call Dispatched and Finished from
+  the main thread; GetSnapshot may be called from any thread."""
+
+  def __init__(self, num_workers, runners):
+    self.lock = threading.Lock()
+    self.start_time = time.time()
+    self.runners = runners
+    self.workers = WorkerLanes(num_workers)
+    self.finish_times = collections.deque()  # Within THROUGHPUT_WINDOW.
+    for runner in runners:
+      runner.status = self
+
+  def Dispatched(self, job_id, label):
+    with self.lock:
+      self.workers.Dispatched(job_id, label, time.time())
+
+  def Finished(self, job_id):
+    with self.lock:
+      now = time.time()
+      self.workers.Finished(job_id, now)
+      self.finish_times.append(now)
+
+  def _GetThroughput(self, now):
+    """Returns the jobs finished per second over the last minute."""
+    while self.finish_times and self.finish_times[0] < now - THROUGHPUT_WINDOW:
+      self.finish_times.popleft()
+    window = min(THROUGHPUT_WINDOW, now - self.start_time)
+    if window <= 0:
+      return 0.0
+    return len(self.finish_times) / window
+
+  def _GetRemainingWork(self, running):
+    """Returns the predicted seconds of work left in the tests without a
+    result, counting only the rest of the running ones. Runners predict the
+    durations from the perf data before the run starts."""
+    work = 0.0
+    for runner in self.runners:
+      for test in runner.tests:
+        if test.output is not None:
+          continue
+        duration = test.duration or 0.0
+        elapsed = running.get(test.id)
+        if elapsed is not None:
+          duration = max(0.0, duration - elapsed)
+        work += duration
+    return work
+
+  def GetSnapshot(self):
+    """Returns the state of the run as a dict that can be stored as JSON."""
+    with self.lock:
+      now = time.time()
+      lanes = list(self.workers.lanes)
+      queued = len(self.workers.queue)
+      throughput = self._GetThroughput(now)
+    workers = []
+    running = {}  # Job id -> elapsed seconds.
+    for (lane, entry) in enumerate(lanes):
+      if entry is None:
+        workers.append({"worker": lane, "test": None})
+        continue
+      (job_id, label, start) = entry
+      running[job_id] = now - start
+      workers.append({"worker": lane, "test": label,
+                      "elapsed": round(now - start, 3)})
+    remaining_work = self._GetRemainingWork(running)
+    slowest = sorted([ w for w in workers if w["test"] is not None ],
+                     key=lambda w: -w["elapsed"])
+    return {
+      "time": now,
+      "elapsed": round(now - self.start_time, 3),
+      "total": sum(r.total for r in self.runners),
+      "passed": sum(r.succeeded for r in self.runners),
+      "failed": sum(len(r.failed) for r in self.runners),
+      "remaining": sum(r.remaining for r in self.runners),
+      "queued": queued,
+      "throughput": round(throughput, 3),
+      "eta": round(remaining_work / max(1, len(lanes)), 1),
+      "workers": workers,
+      "slowest": slowest[:SLOWEST_LIMIT],
+    }
+
+
+class _StatusRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  def do_GET(self):
+    body = json.dumps(self.server.status.GetSnapshot())
+    self.send_response(200)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, format, *args):
+    # Polling must not clutter the output of the run.
+    pass
+
+
+class StatusReporter(object):
+  """Publishes the snapshots of |status|: in the file |filename|, rewritten
+  atomically every STATUS_INTERVAL seconds, and over HTTP at |address|, a
+  port on localhost or the path of a Unix socket. Either may be None."""
+
+  def __init__(self, status, filename, address):
+    self.status = status
+    self.filename = filename
+    self.address = address
+    self.server = None
+    self.threads = []
+    self.stopped = threading.Event()
+
+  def Start(self):
+    if self.address:
+      if self.address.isdigit():
+        self.server = BaseHTTPServer.HTTPServer(
+            ("localhost", int(self.address)), _StatusRequestHandler)
+      else:
+        self._RemoveSocket()
+        self.server = SocketServer.UnixStreamServer(
+            self.address, _StatusRequestHandler)
+      self.server.status = self.status
+      self._StartThread(self.server.serve_forever)
+    if self.filename:
+      self.WriteFile()
+      self._StartThread(self._WriteFilePeriodically)
+
+  def _StartThread(self, target):
+    thread = threading.Thread(target=target)
+    thread.daemon = True
+    thread.start()
+    self.threads.append(thread)
+
+  def _RemoveSocket(self):
+    """Removes the socket left behind by an earlier run."""
+    try:
+      if stat.S_ISSOCK(os.stat(self.address).st_mode):
+        os.unlink(self.address)
+    except OSError:
+      pass
+
+  def _WriteFilePeriodically(self):
+    while not self.stopped.wait(STATUS_INTERVAL):
+      self.WriteFile()
+
+  def WriteFile(self, finished=False):
+    snapshot = self.status.GetSnapshot()
+    snapshot["finished"] = finished
+    # Readers never see a partially written file.
+    temp_filename = "%s.%d" % (self.filename, os.getpid())
+    with open(temp_filename, "w") as f:
+      json.dump(snapshot, f, indent=2)
+    os.rename(temp_filename, self.filename)
+
+  def Stop(self):
+    self.stopped.set()
+    if self.server:
+      self.server.shutdown()
+      self.server.server_close()
+      if not self.address.isdigit():
+        self._RemoveSocket()
+    for thread in self.threads:
+      thread.join()
+    if self.filename:
+      self.WriteFile(finished=True)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest
+
+from telemetry import RunStatus, WorkerLanes
+
+class FakeTest(object):
+  def __init__(self, test_id, duration):
+    self.id = test_id
+    self.duration = duration
+    self.output = None
+
+class FakeRunner(object):
+  def __init__(self, tests):
+    self.tests = tests
+    self.total = len(tests)
+    self.remaining = len(tests)
+    self.succeeded = 0
+    self.failed = []
+
+class TelemetryTest(unittest.TestCase):
+  def testWorkerLanes(self):
+    workers = WorkerLanes(2)
+    for job_id in range(4):
+      workers.Dispatched(job_id, "test%d" % job_id, 1.0)
+    self.assertEquals([(0, "test0", 1.0), (1, "test1", 1.0)], workers.lanes)
+    # The next job in the queue takes over the lane of the finished one.
+    self.assertEquals(1, workers.Finished(1, 2.0))
+    self.assertEquals([(0, "test0", 1.0), (2, "test2", 2.0)], workers.lanes)
+    self.assertEquals([(3, "test3")], list(workers.queue))
+
+  def testSnapshot(self):
+    tests = [ FakeTest(i, 10.0) for i in range(3) ]
+    runner = FakeRunner(tests)
+    status = RunStatus(2, [runner])
+    self.assertTrue(runner.status is status)
+    status.Dispatched(0, "test0")
+    tests[1].output = "done"
+    runner.remaining = 2
+    runner.succeeded = 1
+    snapshot = status.GetSnapshot()
+    self.assertEquals(2, snapshot["remaining"])
+    self.assertEquals("test0", snapshot["workers"][0]["test"])
+    self.assertEquals(None, snapshot["workers"][1]["test"])
+    self.assertEquals(["test0"], [ w["test"] for w in snapshot["slowest"] ])
+    # Almost 10 seconds left of test0 and 10 of test2, on two workers.
+    self.assertTrue(9.0 < snapshot["eta"] <= 10.0)
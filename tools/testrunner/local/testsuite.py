@@ -28,14 +28,85 @@
 
 import imp
 import os
+import re
 
 from . import statusfile
+from . import trie
 from . import utils
 
+
+FLAGS_PATTERN = re.compile(r"//\s+Flags:(.*)")
+FILES_PATTERN = re.compile(r"//\s+Files:(.*)")
+SELF_SCRIPT_PATTERN = re.compile(r"//\s+Env: TEST_FILE_NAME")
+NEGATIVE_MARKER = "@negative"
+
+
+class SourceMetadata(object):
+  """What the test runner needs from the source of a test."""
+  def __init__(self, flags, files, self_script, negative):
+    self.flags = flags  # From "// Flags:" lines.
+    self.files = files  # From "// Files:" lines, relative to the checkout.
+    self.self_script = self_script  # "// Env: TEST_FILE_NAME" is present.
+    self.negative = negative  # The test is marked "@negative".
+
+
+def ParseSourceMetadata(source):
+  flags = []
+  for match in FLAGS_PATTERN.findall(source):
+    flags += match.strip().split()
+  files = []
+  # Accept several lines of 'Files:'.
+  for match in FILES_PATTERN.findall(source):
+    files += match.strip().split()
+  return SourceMetadata(flags, files, bool(SELF_SCRIPT_PATTERN.search(source)),
+                        NEGATIVE_MARKER in source)
+
+
+def _ReadSourceMetadata(filename):
+  # A plain tuple, as stored in the discovery index.
+  with open(filename) as f:
+    metadata = ParseSourceMetadata(f.read())
+  return (metadata.flags, metadata.files, metadata.self_script,
+          metadata.negative)
+
+
+# Marks suites whose tests are all selected, see _CompileArgs.
+ALL_TESTS = object()
+
+_compiled_args = {}
+
+
+def _CompileArgs(args):
+  """Returns a dict mapping suite names to ALL_TESTS or to a trie.PrefixTrie
+  of the test paths selected by the command line arguments |args|, e.g.
+  "mjsunit", "mjsunit/regress/*" or "mjsunit/array-length". Cached, so all
+  suites share the result."""
+  compiled = _compiled_args.get(args)
+  if compiled is not None:
+    return compiled
+  compiled = {}
+  for a in args:
+    argpath = a.split(os.path.sep)
+    suite = argpath[0]
+    if compiled.get(suite) is ALL_TESTS:
+      continue
+    if len(argpath) == 1 or (len(argpath) == 2 and argpath[1] == '*'):
+      compiled[suite] = ALL_TESTS
+      continue
+    path = os.path.sep.join(argpath[1:])
+    if path.endswith('*'):
+      path = path[:-1]
+    compiled.setdefault(suite, trie.PrefixTrie()).Add(path, a)
+  _compiled_args[args] = compiled
+  return compiled
+
+
 class TestSuite(object):
 
   @staticmethod
-  def LoadTestSuite(root):
+  def LoadTestSuite(root, index=None):
+    """Loads the suite in |root|. If given, the discovery.DiscoveryIndex
+    |index| speeds up listing its tests."""
     name = root.split(os.path.sep)[-1]
     f = None
     try:
@@ -45,6 +116,7 @@ class TestSuite(object):
     finally:
       if f:
         f.close()
+    suite.index = index
     return suite
 
   def __init__(self, name, root):
@@ -53,7 +125,10 @@ class TestSuite(object):
     self.tests = None  # list of TestCase objects
     self.rules = None  # dictionary mapping test path to list of outcomes
     self.wildcards = None  # dictionary mapping test paths to list of outcomes
+    self.wildcard_trie = None  # trie.PrefixTrie mapping prefixes to wildcards
     self.total_duration = None  # float, assigned on demand
+    self.index = None  # discovery.DiscoveryIndex, if any
+    self.source_metadata = {}  # Source file name -> SourceMetadata.
 
   def shell(self):
     return "d8"
@@ -74,6 +149,28 @@ class TestSuite(object):
   def ListTests(self, context):
     raise NotImplementedError
 
+  def Walk(self, top):
+    """os.walk for ListTests implementations. Uses the discovery index if
+    there is one."""
+    if self.index is None:
+      return os.walk(top)
+    return self.index.Walk(top)
+
+  def GetCachedListing(self, key, paths, list_fun):
+    """Returns list_fun(), or its result from an earlier run if the files and
+    directories in |paths| are unchanged. For ListTests implementations that
+    run the shell or scripts. A result of None means that listing failed and
+    is not remembered."""
+    if self.index is None:
+      return list_fun()
+    key = [self.name] + list(key)
+    value = self.index.Lookup(key, paths)
+    if value is None:
+      value = list_fun()
+      if value is not None:
+        self.index.Store(key, paths, value)
+    return value
+
   def VariantFlags(self, testcase, default_flags):
     if testcase.outcomes and statusfile.OnlyStandardVariant(testcase.outcomes):
       return [[]]
@@ -83,8 +180,10 @@ class TestSuite(object):
     pass
 
   def ReadStatusFile(self, variables):
-    (self.rules, self.wildcards) = \
-        statusfile.ReadStatusFile(self.status_file(), variables)
+    compiled = statusfile.CompileStatusFile(self.status_file(), variables)
+    self.rules = compiled.rules
+    self.wildcards = compiled.wildcards
+    self.wildcard_trie = compiled.wildcard_trie
 
   def ReadTestCases(self, context):
     self.tests = self.ListTests(context)
@@ -123,17 +222,16 @@ class TestSuite(object):
         slow = statusfile.IsSlow(t.outcomes)
         pass_fail = statusfile.IsPassOrFail(t.outcomes)
       skip = False
-      for rule in self.wildcards:
-        assert rule[-1] == '*'
-        if testname.startswith(rule[:-1]):
-          used_rules.add(rule)
-          t.outcomes = self.wildcards[rule]
-          if statusfile.DoSkip(t.outcomes):
-            skip = True
-            break  # "for rule in self.wildcards"
-          flaky = flaky or statusfile.IsFlaky(t.outcomes)
-          slow = slow or statusfile.IsSlow(t.outcomes)
-          pass_fail = pass_fail or statusfile.IsPassOrFail(t.outcomes)
+      # Most specific wildcard last, its outcomes win.
+      for rule in self.wildcard_trie.Match(testname):
+        used_rules.add(rule)
+        t.outcomes = self.wildcards[rule]
+        if statusfile.DoSkip(t.outcomes):
+          skip = True
+          break  # "for rule in self.wildcard_trie.Match(testname)"
+        flaky = flaky or statusfile.IsFlaky(t.outcomes)
+        slow = slow or statusfile.IsSlow(t.outcomes)
+        pass_fail = pass_fail or statusfile.IsPassOrFail(t.outcomes)
       if (skip or self._FilterFlaky(flaky, flaky_tests)
           or self._FilterSlow(slow, slow_tests)
           or self._FilterPassFail(pass_fail, pass_fail_tests)):
@@ -152,24 +250,14 @@ class TestSuite(object):
         print("Unused rule: %s -> %s" % (rule, self.wildcards[rule]))
 
   def FilterTestCasesByArgs(self, args):
-    filtered = []
-    filtered_args = []
-    for a in args:
-      argpath = a.split(os.path.sep)
-      if argpath[0] != self.name:
-        continue
-      if len(argpath) == 1 or (len(argpath) == 2 and argpath[1] == '*'):
-        return  # Don't filter, run all tests in this suite.
-      path = os.path.sep.join(argpath[1:])
-      if path[-1] == '*':
-        path = path[:-1]
-      filtered_args.append(path)
-    for t in self.tests:
-      for a in filtered_args:
-        if t.path.startswith(a):
-          filtered.append(t)
-          break
-    self.tests = filtered
+    prefixes = _CompileArgs(tuple(args)).get(self.name)
+    if prefixes is ALL_TESTS:
+      return  # Don't filter, run all tests in this suite.
+    if prefixes is None:
+      self.tests = []
+      return
+    self.tests = [ t for t in self.tests
+                   if next(prefixes.Match(t.path), None) is not None ]
 
   def GetFlagsForTestCase(self, testcase, context):
     raise NotImplementedError
@@ -177,6 +265,28 @@ class TestSuite(object):
   def GetSourceForTest(self, testcase):
     return "(no source available)"
 
+  def GetSourceFileForTest(self, testcase):
+    return os.path.join(self.root, testcase.path + self.suffix())
+
+  def GetSourceMetadata(self, testcase):
+    """Returns the SourceMetadata of |testcase|. Each source file is parsed
+    at most once per run, and in later runs only if it changed."""
+    filename = self.GetSourceFileForTest(testcase)
+    metadata = self.source_metadata.get(filename)
+    if metadata is None:
+      if self.index is None:
+        record = _ReadSourceMetadata(filename)
+      else:
+        record = self.index.GetFileRecord(filename, _ReadSourceMetadata)
+      metadata = SourceMetadata(*record)
+      self.source_metadata[filename] = metadata
+    return metadata
+
+  def GetInputFilesForTestCase(self, testcase):
+    """Returns the files the result of |testcase| depends on that are not
+    passed on its command line, e.g. expected output."""
+    return []
+
   def IsFailureOutput(self, output, testpath):
     return output.exit_code != 0
 
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest
+
+from testsuite import ParseSourceMetadata, TestSuite
+
+SOURCE = """// Flags: --allow-natives-syntax --expose-gc
+// Files: test/mjsunit/a.js
+// Files: test/mjsunit/b.js test/mjsunit/c.js
+// Env: TEST_FILE_NAME
+// Flags: --harmony
+"""
+
+class SourceMetadataTest(unittest.TestCase):
+  def testParse(self):
+    metadata = ParseSourceMetadata(SOURCE)
+    self.assertEquals(["--allow-natives-syntax", "--expose-gc", "--harmony"],
+                      metadata.flags)
+    self.assertEquals(["test/mjsunit/a.js", "test/mjsunit/b.js",
+                       "test/mjsunit/c.js"], metadata.files)
+    self.assertTrue(metadata.self_script)
+    self.assertFalse(metadata.negative)
+
+  def testNegative(self):
+    metadata = ParseSourceMetadata("/**\n * @negative\n */\n")
+    self.assertEquals([], metadata.flags)
+    self.assertFalse(metadata.self_script)
+    self.assertTrue(metadata.negative)
+
+
+class FakeTest(object):
+  def __init__(self, path):
+    self.path = path
+
+
+class FilterTestCasesByArgsTest(unittest.TestCase):
+  def _Filter(self, args):
+    suite = TestSuite("mjsunit", "/mjsunit")
+    suite.tests = [ FakeTest(p) for p in
+                    ["array-length", "regress/regress-1", "regress/regress-2",
+                     "string-split"] ]
+    suite.FilterTestCasesByArgs(args)
+    return [ t.path for t in suite.tests ]
+
+  def testFilter(self):
+    self.assertEquals(["array-length", "regress/regress-1"],
+                      self._Filter(["mjsunit/regress/regress-1",
+                                    "mjsunit/array", "webkit/string-split"]))
+    self.assertEquals(["regress/regress-1", "regress/regress-2"],
+                      self._Filter(["mjsunit/regress/*"]))
+    self.assertEquals([], self._Filter(["webkit"]))
+    self.assertEquals(4, len(self._Filter(["mjsunit/array", "mjsunit/*"])))
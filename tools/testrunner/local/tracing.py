@@ -0,0 +1,122 @@
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Timeline of a run in the trace event format of about:tracing, see
+--trace-file. Every test execution is a complete event on the lane of its
+worker, the phases of the runner (test discovery, status filtering, result
+processing) are events on the main lane."""
+
+import atexit
+import contextlib
+import json
+import os
+import time
+
+
+# Lane of the phases run in the main thread. Workers follow.
+MAIN_LANE = 0
+
+
+class TraceWriter(object):
+  """Streams trace events to the file |filename| as a JSON array, which is
+  terminated by Close. The trace of an interrupted run lacks the end of the
+  array, about:tracing still loads it. Without a filename, nothing is
+  recorded."""
+
+  def __init__(self, filename, process_name):
+    self.file = None
+    if not filename:
+      return
+    self.file = open(filename, "w")
+    self.file.write("[")
+    self.separator = "\n"
+    self.start_time = time.time()
+    self.pid = os.getpid()
+    self.named_lanes = set()
+    self._Write({"name": "process_name", "ph": "M", "pid": self.pid,
+                 "args": {"name": process_name}})
+    self.NameLane(MAIN_LANE, "main")
+    atexit.register(self.Close)
+
+  def _Write(self, event):
+    self.file.write(self.separator + json.dumps(event))
+    self.separator = ",\n"
+
+  def NameLane(self, lane, name):
+    if not self.file or lane in self.named_lanes:
+      return
+    self.named_lanes.add(lane)
+    self._Write({"name": "thread_name", "ph": "M", "pid": self.pid,
+                 "tid": lane, "args": {"name": name}})
+
+  def Complete(self, name, category, start, duration, lane, args=None):
+    """Records a complete event with |start| and |duration| in seconds."""
+    if not self.file:
+      return
+    event = {
+      "name": name,
+      "cat": category,
+      "ph": "X",
+      "ts": int((start - self.start_time) * 1000000),
+      "dur": int(duration * 1000000),
+      "pid": self.pid,
+      "tid": lane,
+    }
+    if args:
+      event["args"] = args
+    self._Write(event)
+
+  @contextlib.contextmanager
+  def Phase(self, name, **args):
+    """Records the code run in the with statement as a phase on the main
+    lane."""
+    if not self.file:
+      yield
+      return
+    start = time.time()
+    try:
+      yield
+    finally:
+      self.Complete(name, "phase", start, time.time() - start, MAIN_LANE,
+                    args)
+
+  def Close(self):
+    if not self.file:
+      return
+    self.file.write("\n]\n")
+    self.file.close()
+    self.file = None
+
+
+class JobTimeline(object):
+  """Records the jobs of the runners in |runners| in |writer|, on one lane
+  per worker of a pool with |num_workers| workers. It attaches itself to the
+  runners, which call Finished for every result.
+
+  The pools don't tell which worker ran a job, and results may arrive in a
+  different order than the jobs finished. So each job goes on the lane that
+  became free last before the job started, according to the start time and
+  duration measured by the worker. The lanes show how many workers
+  were busy at any time, not which one ran which job."""
+
+  def __init__(self, writer, num_workers, runners):
+    self.writer = writer
+    self.lane_ends = [0.0] * num_workers  # End of the last job per lane.
+    for runner in runners:
+      runner.timeline = self
+
+  def _GetLane(self, start):
+    free = [ (end, lane) for (lane, end) in enumerate(self.lane_ends)
+             if end <= start ]
+    if free:
+      return max(free)[1]
+    # Only when results arrive out of order.
+    return min((end, lane) for (lane, end) in enumerate(self.lane_ends))[1]
+
+  def Finished(self, label, start, duration, args=None):
+    """Records a job that ran for |duration| seconds from |start| on."""
+    lane = self._GetLane(start)
+    self.lane_ends[lane] = max(self.lane_ends[lane], start + duration)
+    self.writer.NameLane(lane + 1, "worker %d" % lane)
+    self.writer.Complete(label, "test", start, duration, lane + 1, args)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from tracing import JobTimeline, TraceWriter
+
+class FakeRunner(object):
+  pass
+
+class TracingTest(unittest.TestCase):
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def testTimeline(self):
+    filename = os.path.join(self.tempdir, "trace.json")
+    writer = TraceWriter(filename, "run-tests")
+    with writer.Phase("discovery", suite="mjsunit"):
+      pass
+    runner = FakeRunner()
+    timeline = JobTimeline(writer, 2, [runner])
+    self.assertTrue(runner.timeline is timeline)
+    start = writer.start_time
+    timeline.Finished("mjsunit/b", start + 1.5, 1.0)
+    timeline.Finished("mjsunit/c", start + 3.0, 1.0)
+    # Arrives after c, which started once it had finished.
+    timeline.Finished("mjsunit/a", start + 1.0, 2.0)
+    writer.Close()
+    with open(filename) as f:
+      events = json.load(f)
+    phases = [ e for e in events if e.get("cat") == "phase" ]
+    self.assertEquals([("discovery", {"suite": "mjsunit"})],
+                      [ (e["name"], e["args"]) for e in phases ])
+    tests = dict((e["name"], e) for e in events if e.get("cat") == "test")
+    self.assertEquals(1000000, tests["mjsunit/a"]["ts"])
+    self.assertEquals(2000000, tests["mjsunit/a"]["dur"])
+    self.assertEquals(tests["mjsunit/b"]["tid"], tests["mjsunit/c"]["tid"])
+    self.assertNotEquals(tests["mjsunit/a"]["tid"], tests["mjsunit/b"]["tid"])
+
+  def testDisabled(self):
+    writer = TraceWriter(None, "run-tests")
+    with writer.Phase("discovery"):
+      pass
+    writer.Complete("mjsunit/a", "test", 0, 1, 1)
+    writer.Close()
@@ -0,0 +1,35 @@
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+
+# Marks the nodes that end a prefix. Can't clash with the single characters
+# used as keys otherwise.
+_VALUE = None
+
+
+class PrefixTrie(object):
+  """Maps prefixes to values. Finding all prefixes of a string takes time
+  linear in the length of the string, independent of the number of
+  prefixes."""
+
+  def __init__(self):
+    self.root = {}
+
+  def Add(self, prefix, value):
+    node = self.root
+    for c in prefix:
+      node = node.setdefault(c, {})
+    node[_VALUE] = value
+
+  def Match(self, string):
+    """Yields the values of all prefixes of |string|, shortest first."""
+    node = self.root
+    if _VALUE in node:
+      yield node[_VALUE]
+    for c in string:
+      node = node.get(c)
+      if node is None:
+        return
+      if _VALUE in node:
+        yield node[_VALUE]
@@ -116,6 +116,35 @@ def IsWindows():
   return GuessOS() == 'windows'
 
 
+def GetAvailableMemory():
+  """Returns the memory in kilobytes that can be used without swapping, or
+  None if it is not known (only Linux is supported)."""
+  try:
+    with open('/proc/meminfo') as f:
+      meminfo = dict((line.split(':')[0], int(line.split()[1]))
+                     for line in f if len(line.split()) >= 2)
+  except (IOError, ValueError):
+    return None
+  if 'MemAvailable' in meminfo:
+    return meminfo['MemAvailable']
+  # Estimate for kernels before 3.14.
+  if 'MemFree' in meminfo:
+    return (meminfo['MemFree'] + meminfo.get('Buffers', 0) +
+            meminfo.get('Cached', 0))
+  return None
+
+
+def GetResidentMemory():
+  """Returns the resident set size of the current process in kilobytes, or 0
+  if it is not known (only Linux is supported)."""
+  try:
+    with open('/proc/self/statm') as f:
+      pages = int(f.read().split()[1])
+  except (IOError, ValueError, IndexError):
+    return 0
+  return pages * (os.sysconf('SC_PAGE_SIZE') / 1024)
+
+
 def URLRetrieve(source, destination):
   """urllib is broken for SSL connections via a proxy therefore we
   can't use urllib.urlretrieve()."""
@@ -95,5 +95,32 @@ def PrintTestDurations(suites, overall_time):
     index = 1
     for entry in timed_tests[:20]:
       t = FormatTime(entry.duration)
-      sys.stderr.write("%4i (%s) %s\n" % (index, t, entry.GetLabel()))
+      sys.stderr.write("%4i (%s) %s %s\n" %
+                       (index, t, FormatUsage(entry), entry.GetLabel()))
       index += 1
+    measured_tests = [ t for t in timed_tests
+                       if t.output and t.output.usage and
+                          t.output.usage.max_rss is not None ]
+    if not measured_tests:
+      return
+    sys.stderr.write("--- Largest memory use ---\n")
+    measured_tests.sort(
+        lambda a, b: cmp(b.output.usage.max_rss, a.output.usage.max_rss))
+    index = 1
+    for entry in measured_tests[:20]:
+      t = FormatTime(entry.duration)
+      sys.stderr.write("%4i (%s) %s %s\n" %
+                       (index, t, FormatUsage(entry), entry.GetLabel()))
+      index += 1
+
+
+def FormatUsage(test):
+  """Formats the max RSS, the CPU time and the major faults of |test|."""
+  if not test.output or not test.output.usage:
+    return "%30s" % "-"
+  usage = test.output.usage
+  max_rss = "-"
+  if usage.max_rss is not None:
+    max_rss = "%.1fM" % (usage.max_rss / 1024.0)
+  return "%8s %7.2fu %6.2fs %4imf" % (
+      max_rss, usage.user_time, usage.system_time, usage.major_faults)
@@ -53,7 +53,7 @@ class NetworkedRunner(execution.Runner):
   def __init__(self, suites, progress_indicator, context, peers, workspace):
     self.suites = suites
     num_tests = 0
-    datapath = os.path.join("out", "testrunner_data")
+    datapath = execution.DATA_DIR
     # TODO(machenbach): These fields should exist now in the superclass.
     # But there is no super constructor call. Check if this is a problem.
     self.perf_data_manager = perfdata.PerfDataManager(datapath)
@@ -29,7 +29,9 @@
 class Context():
   def __init__(self, arch, mode, shell_dir, mode_flags, verbose, timeout,
                isolates, command_prefix, extra_flags, noi18n, random_seed,
-               no_sorting, rerun_failures_count, rerun_failures_max):
+               no_sorting, rerun_failures_count, rerun_failures_max,
+               max_output_size, executor, result_cache, memory_budget,
+               adaptive_timeouts, fail_fast, time_budget):
     self.arch = arch
     self.mode = mode
     self.shell_dir = shell_dir
@@ -44,16 +46,24 @@ class Context():
     self.no_sorting = no_sorting
     self.rerun_failures_count = rerun_failures_count
     self.rerun_failures_max = rerun_failures_max
+    self.max_output_size = max_output_size
+    self.executor = executor
+    self.result_cache = result_cache
+    self.memory_budget = memory_budget  # Kilobytes, None for no limit.
+    self.adaptive_timeouts = adaptive_timeouts
+    self.fail_fast = fail_fast  # Number of failures to stop at, 0 for all.
+    self.time_budget = time_budget  # Seconds, 0 for no limit.
 
   def Pack(self):
     return [self.arch, self.mode, self.mode_flags, self.timeout, self.isolates,
             self.command_prefix, self.extra_flags, self.noi18n,
             self.random_seed, self.no_sorting, self.rerun_failures_count,
-            self.rerun_failures_max]
+            self.rerun_failures_max, self.max_output_size, self.executor]
 
   @staticmethod
   def Unpack(packed):
     # For the order of the fields, refer to Pack() above.
     return Context(packed[0], packed[1], None, packed[2], False,
                    packed[3], packed[4], packed[5], packed[6], packed[7],
-                   packed[8], packed[9], packed[10], packed[11])
+                   packed[8], packed[9], packed[10], packed[11],
+                   packed[12], packed[13], False, None, False, 0, 0)
@@ -30,13 +30,49 @@ import signal
 
 from ..local import utils
 
+class ResourceUsage(object):
+  """Resources used by a test process, see getrusage(2)."""
+
+  def __init__(self, max_rss, user_time, system_time, minor_faults,
+               major_faults):
+    self.max_rss = max_rss  # Kilobytes, None if not known.
+    self.user_time = user_time  # Seconds.
+    self.system_time = system_time  # Seconds.
+    self.minor_faults = minor_faults
+    self.major_faults = major_faults
+
+  @staticmethod
+  def FromRusage(rusage, inherited_rss=0):
+    """Converts the rusage of a child process. A forked child starts with the
+    resident set of its parent, and keeps that as its max RSS across exec.
+    So a max RSS of at most |inherited_rss|, the kilobytes the parent had
+    resident when it started the child, doesn't tell what the child used."""
+    max_rss = rusage.ru_maxrss
+    if utils.GuessOS() == "macos":
+      max_rss /= 1024  # Reported in bytes.
+    if max_rss <= inherited_rss:
+      max_rss = None
+    return ResourceUsage(max_rss, rusage.ru_utime, rusage.ru_stime,
+                         rusage.ru_minflt, rusage.ru_majflt)
+
+  def Pack(self):
+    return [self.max_rss, self.user_time, self.system_time,
+            self.minor_faults, self.major_faults]
+
+  @staticmethod
+  def Unpack(packed):
+    # For the order of the fields, refer to Pack() above.
+    return ResourceUsage(packed[0], packed[1], packed[2], packed[3], packed[4])
+
+
 class Output(object):
 
-  def __init__(self, exit_code, timed_out, stdout, stderr):
+  def __init__(self, exit_code, timed_out, stdout, stderr, usage=None):
     self.exit_code = exit_code
     self.timed_out = timed_out
     self.stdout = stdout
     self.stderr = stderr
+    self.usage = usage  # ResourceUsage, None if not available.
 
   def HasCrashed(self):
     if utils.IsWindows():
@@ -52,9 +88,15 @@ class Output(object):
     return self.timed_out
 
   def Pack(self):
-    return [self.exit_code, self.timed_out, self.stdout, self.stderr]
+    usage = None
+    if self.usage:
+      usage = self.usage.Pack()
+    return [self.exit_code, self.timed_out, self.stdout, self.stderr, usage]
 
   @staticmethod
   def Unpack(packed):
     # For the order of the fields, refer to Pack() above.
-    return Output(packed[0], packed[1], packed[2], packed[3])
+    usage = None
+    if len(packed) > 4 and packed[4]:
+      usage = ResourceUsage.Unpack(packed[4])
+    return Output(packed[0], packed[1], packed[2], packed[3], usage)
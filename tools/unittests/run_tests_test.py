@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# Copyright 2014 the V8 project authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import imp
+import json
+import os
+from os import path, sys
+import shutil
+import tempfile
+import unittest
+
+BASE_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+run_tests = imp.load_source("run_tests", path.join(BASE_DIR, "run-tests.py"))
+
+
+class ProcessOptionsTest(unittest.TestCase):
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def _ProcessOptions(self, *args):
+    (options, _) = run_tests.BuildOptions().parse_args(list(args))
+    self.assertTrue(run_tests.ProcessOptions(options))
+    return options
+
+  def testArchAndModeDefault(self):
+    options = self._ProcessOptions("--arch=x64,ia32", "--mode=release")
+    # Main counts the configurations before running them.
+    self.assertEquals(2, len(options.arch_and_mode))
+    self.assertEquals([("x64", "release"), ("ia32", "release")],
+                      list(options.arch_and_mode))
+
+  def testArchAndMode(self):
+    options = self._ProcessOptions("--arch-and-mode=x64.release,ia32.debug")
+    self.assertEquals([["x64", "release"], ["ia32", "debug"]],
+                      options.arch_and_mode)
+
+  def _WriteResults(self, configurations):
+    filename = os.path.join(self.tempdir, "results.json")
+    with open(filename, "w") as f:
+      f.write(json.dumps([ {"arch": arch, "mode": mode, "results": []}
+                           for (arch, mode) in configurations ]))
+    return filename
+
+  def testRerunConfigurations(self):
+    filename = self._WriteResults([("x64", "release"), ("ia32", "debug")])
+    options = self._ProcessOptions("--rerun-from=%s" % filename)
+    # The configurations recorded in the file.
+    self.assertEquals([("ia32", "debug"), ("x64", "release")],
+                      options.arch_and_mode)
+    options = self._ProcessOptions("--rerun-from=%s" % filename,
+                                   "--arch=x64", "--mode=release")
+    self.assertEquals([("x64", "release")], options.arch_and_mode)
+
+
+if __name__ == '__main__':
+  unittest.main()